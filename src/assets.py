@@ -0,0 +1,252 @@
+import json
+import os
+import shutil
+import sys
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from manifest import file_hash
+from statefile import write_json
+
+LINK_MODES = ("copy", "reflink", "hardlink")
+
+# Hex digits of the content hash put into fingerprinted file names
+FINGERPRINT_LENGTH = 10
+
+# ioctl request for cloning a file's extents (Linux btrfs/xfs/bcachefs)
+FICLONE = 0x40049409
+
+
+def _reflink(src: str, dst: str) -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def transfer_file(src: str, dst: str, link: str = "reflink") -> str:
+    """
+    Place a copy of src at dst, replacing any existing file atomically.
+    link selects the cheapest acceptable way: "hardlink" shares the inode,
+    "reflink" shares extents copy-on-write, and both fall back to a plain
+    copy across filesystems. Returns the method actually used.
+    """
+    dst_dir = os.path.dirname(dst) or "."
+    os.makedirs(dst_dir, exist_ok=True)
+    tmp = dst + ".sync-tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    method = "copy"
+    same_fs = os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    if same_fs and link == "hardlink":
+        try:
+            os.link(src, tmp)
+            method = "hardlink"
+        except OSError:
+            pass
+    if method == "copy" and same_fs and link in ("reflink", "hardlink") and _reflink(src, tmp):
+        method = "reflink"
+    if method == "copy":
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+    return method
+
+
+def up_to_date(src: str, dst: str, checksum: bool = False) -> bool:
+    """
+    Return True if dst already holds a copy of src, judged by size and
+    mtime (or, with checksum, by content).
+    """
+    try:
+        dst_st = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    src_st = os.stat(src)
+    if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+        return True
+    if src_st.st_size != dst_st.st_size:
+        return False
+    if src_st.st_mtime_ns == dst_st.st_mtime_ns:
+        return True
+    if checksum and file_hash(src) == file_hash(dst):
+        # Same bytes, only the timestamp moved: adopt it instead of copying
+        os.utime(dst, ns=(src_st.st_atime_ns, src_st.st_mtime_ns))
+        return True
+    return False
+
+
+def _load_synced(state_path: Optional[str]) -> Tuple[List[str], Dict[str, List[int]]]:
+    # (synced files, rewritten copies); see sync_directory and record_rewrites
+    if state_path is None:
+        return [], {}
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return [], {}
+    return state.get("files", []), state.get("rewritten", {})
+
+
+def _save_synced(
+    state_path: Optional[str], files: List[str], rewritten: Dict[str, List[int]]
+) -> None:
+    if state_path is None:
+        return
+    write_json(state_path, {"files": files, "rewritten": rewritten}, indent=1)
+
+
+def _pair_state(src: str, dst: str) -> Optional[List[int]]:
+    # [src size, src mtime, dst size, dst mtime], or None if either is missing
+    try:
+        src_st, dst_st = os.stat(src), os.stat(dst)
+    except FileNotFoundError:
+        return None
+    return [src_st.st_size, src_st.st_mtime_ns, dst_st.st_size, dst_st.st_mtime_ns]
+
+
+def sync_directory(
+    src: str,
+    dst: str,
+    state_path: Optional[str] = None,
+    checksum: bool = False,
+    link: str = "reflink",
+    skip: Optional[Callable[[str], bool]] = None,
+) -> dict:
+    """
+    Bring dst up to date with src without wiping it.
+
+    A file is copied only if it is missing or differs in size or mtime
+    (or, with checksum, in content). Files are pruned from dst only if an
+    earlier sync recorded in state_path put them there and their source is
+    gone, so pages generated into dst are never touched. Files whose
+    relative path skip() accepts are left for the caller to place, but are
+    still pruned once their source is gone. Copies that a later build step
+    rewrote in place and recorded with record_rewrites() count as up to
+    date while neither side changes.
+    Returns counts of copied, unchanged and removed files.
+    """
+    if link not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link!r}")
+    previous, rewritten = _load_synced(state_path)
+    kept = {}
+    synced = []
+    copied = unchanged = 0
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for fname in sorted(files):
+            src_file = os.path.join(root, fname)
+            rel_path = os.path.relpath(src_file, src)
+            dst_file = os.path.join(dst, rel_path)
+            synced.append(rel_path)
+            if skip is not None and skip(rel_path):
+                continue
+            if up_to_date(src_file, dst_file, checksum):
+                unchanged += 1
+                continue
+            if rel_path in rewritten and rewritten[rel_path] == _pair_state(src_file, dst_file):
+                kept[rel_path] = rewritten[rel_path]
+                unchanged += 1
+                continue
+            method = transfer_file(src_file, dst_file, link)
+            print(f"Copying {src_file} to {dst_file} ({method})")
+            copied += 1
+
+    removed = 0
+    current = set(synced)
+    for rel_path in previous:
+        if rel_path in current:
+            continue
+        dst_file = os.path.join(dst, rel_path)
+        if os.path.exists(dst_file):
+            print(f"Removing stale asset {dst_file}")
+            os.remove(dst_file)
+            removed += 1
+    _save_synced(state_path, synced, kept)
+    print(f"Synced {src} -> {dst}: {copied} copied, {unchanged} unchanged, {removed} removed")
+    return {"copied": copied, "unchanged": unchanged, "removed": removed}
+
+
+def record_rewrites(src: str, dst: str, state_path: str, checksum: bool = False) -> int:
+    """
+    Record the synced copies in dst that no longer match their source in
+    src, after a build step (such as minification) rewrote them in place,
+    so the next sync_directory() with state_path keeps them instead of
+    copying the source over them again. Returns the number recorded.
+    """
+    files, _ = _load_synced(state_path)
+    if not files:
+        return 0
+    rewritten = {}
+    for rel_path in files:
+        src_file = os.path.join(src, rel_path)
+        dst_file = os.path.join(dst, rel_path)
+        state = _pair_state(src_file, dst_file)
+        if state is not None and not up_to_date(src_file, dst_file, checksum):
+            rewritten[rel_path] = state
+    _save_synced(state_path, files, rewritten)
+    return len(rewritten)
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    """
+    "images/tom.png" -> "images/tom.<hash>.png"
+    """
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def fingerprint_assets(
+    src: str,
+    dst: str,
+    manifest_path: Optional[str] = None,
+    link: str = "reflink",
+    generated: Iterable[str] = (),
+) -> Dict[str, str]:
+    """
+    Give every file copied from src into dst, and every file under dst
+    listed in generated (relative paths such as resized images), a twin
+    named after a hash of its content in dst, so it can be cached forever.
+    Returns the asset manifest mapping site URLs to fingerprinted URLs,
+    also written to manifest_path. Twins listed in the previous manifest
+    that are no longer current are removed.
+    """
+    rel_paths = []
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for fname in sorted(files):
+            rel_paths.append(os.path.relpath(os.path.join(root, fname), src))
+    rel_paths.extend(os.path.join(*rel.split("/")) for rel in generated)
+    mapping = {}
+    for rel_path in rel_paths:
+        dst_file = os.path.join(dst, rel_path)
+        if not os.path.isfile(dst_file):
+            continue
+        hashed = fingerprinted_name(rel_path, file_hash(dst_file))
+        hashed_file = os.path.join(dst, hashed)
+        # Content-addressed: an existing twin already has these bytes
+        if not os.path.exists(hashed_file):
+            transfer_file(dst_file, hashed_file, link)
+        mapping["/" + rel_path.replace(os.sep, "/")] = "/" + hashed.replace(os.sep, "/")
+
+    if manifest_path is not None:
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                previous = json.load(f).get("assets", {})
+        except (OSError, ValueError):
+            previous = {}
+        current = set(mapping.values())
+        for url in set(previous.values()) - current:
+            stale = os.path.join(dst, *url.lstrip("/").split("/"))
+            if os.path.exists(stale):
+                print(f"Removing stale asset {stale}")
+                os.remove(stale)
+        write_json(manifest_path, {"assets": mapping}, indent=1, sort_keys=True)
+    print(f"Fingerprinted {len(mapping)} assets")
+    return mapping
@@ -0,0 +1,373 @@
+"""
+Build benchmark harness.
+
+Generates a synthetic content/ tree and times each build stage, printing a
+summary table and optionally writing machine-readable JSON so results can
+be compared between commits:
+
+    python3 src/benchmark.py --pages 2000 --blocks 40 --json bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Dict, Optional
+
+import markdown_utils
+from htmlnode import HTMLNode, LeafNode, ParentNode
+from main import generate_pages_recursive
+from markdown_utils import extract_title, markdown_to_blocks, markdown_to_html_node
+from template import Template
+from textnode import TextNode
+
+STAGES = ("read", "block_split", "block_parse", "inline_parse", "render", "template", "write")
+
+DEFAULT_MIX = {
+    "paragraph": 5,
+    "heading": 2,
+    "unordered_list": 2,
+    "ordered_list": 1,
+    "code": 1,
+    "quote": 1,
+}
+
+WORDS = (
+    "elf hobbit ring shire mordor wizard palantir mithril lembas ent "
+    "rivendell gondor rohan orc barrow wight dragon gold river mountain"
+).split()
+
+
+def _words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _inline(rng: random.Random, n: int) -> str:
+    # Prose with heavy inline markup: roughly one span every few words
+    parts = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < 0.08:
+            parts.append(f"**{_words(rng, 2)}**")
+        elif roll < 0.16:
+            parts.append(f"_{_words(rng, 2)}_")
+        elif roll < 0.22:
+            parts.append(f"`{rng.choice(WORDS)}()`")
+        elif roll < 0.27:
+            parts.append(f"[{_words(rng, 2)}](/blog/{rng.choice(WORDS)})")
+        elif roll < 0.29:
+            parts.append(f"![{rng.choice(WORDS)}](/images/{rng.choice(WORDS)}.png)")
+        else:
+            parts.append(rng.choice(WORDS))
+    return " ".join(parts)
+
+
+def _block(rng: random.Random, kind: str) -> str:
+    if kind == "heading":
+        return "#" * rng.randint(2, 6) + " " + _inline(rng, 5)
+    if kind == "unordered_list":
+        return "\n".join(f"- {_inline(rng, 8)}" for _ in range(rng.randint(5, 40)))
+    if kind == "ordered_list":
+        return "\n".join(f"{i}. {_inline(rng, 8)}" for i in range(1, rng.randint(5, 40)))
+    if kind == "code":
+        body = "\n".join(f"    {_words(rng, 6)}" for _ in range(rng.randint(10, 120)))
+        return f"```\n{body}\n```"
+    if kind == "quote":
+        return "\n".join(f"> {_inline(rng, 10)}" for _ in range(rng.randint(1, 6)))
+    return "\n".join(_inline(rng, 14) for _ in range(rng.randint(1, 6)))
+
+
+def generate_page_markdown(rng: random.Random, blocks: int, mix: Dict[str, int]) -> str:
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    parts = [f"# {_words(rng, 4).title()}"]
+    parts.extend(_block(rng, kind) for kind in rng.choices(kinds, weights, k=blocks))
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(
+    content_dir: str,
+    pages: int,
+    blocks: int = 30,
+    mix: Optional[Dict[str, int]] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Write a deterministic synthetic content tree of `pages` markdown files,
+    each with a title and `blocks` blocks drawn from mix (block kind ->
+    weight). Returns the total number of bytes written.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    total = 0
+    for i in range(pages):
+        page_dir = os.path.join(content_dir, f"section-{i // 100:03d}", f"page-{i:05d}")
+        os.makedirs(page_dir, exist_ok=True)
+        md = generate_page_markdown(rng, blocks, mix)
+        with open(os.path.join(page_dir, "index.md"), "w", encoding="utf-8") as f:
+            f.write(md)
+        total += len(md.encode("utf-8"))
+    return total
+
+
+def time_stages(content_dir: str, template: Template, out_dir: str) -> Dict[str, float]:
+    """
+    Build every page under content_dir stage by stage and return the total
+    seconds spent in each stage. Inline parsing is measured by wrapping the
+    active inline parser; block_parse is the rest of markdown_to_html_node.
+    """
+    totals = dict.fromkeys(STAGES, 0.0)
+    inline_parser = markdown_utils._inline_parser
+    inline_time = [0.0]
+
+    def timed_inline(text):
+        start = time.perf_counter()
+        try:
+            return inline_parser(text)
+        finally:
+            inline_time[0] += time.perf_counter() - start
+
+    clock = time.perf_counter
+    markdown_utils._inline_parser = timed_inline
+    try:
+        for root, _, files in os.walk(content_dir):
+            for fname in files:
+                if not fname.endswith(".md"):
+                    continue
+                path = os.path.join(root, fname)
+                t0 = clock()
+                with open(path, encoding="utf-8") as f:
+                    md = f.read()
+                t1 = clock()
+                markdown_to_blocks(md)
+                t2 = clock()
+                inline_time[0] = 0.0
+                node = markdown_to_html_node(md)
+                t3 = clock()
+                html = node.to_html()
+                t4 = clock()
+                page = template.render({"Title": extract_title(md), "Content": html})
+                t5 = clock()
+                out_path = os.path.join(out_dir, os.path.relpath(path, content_dir) + ".html")
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(out_path, "w", encoding="utf-8") as f:
+                    f.write(page)
+                t6 = clock()
+                totals["read"] += t1 - t0
+                totals["block_split"] += t2 - t1
+                totals["inline_parse"] += inline_time[0]
+                totals["block_parse"] += (t3 - t2) - inline_time[0]
+                totals["render"] += t4 - t3
+                totals["template"] += t5 - t4
+                totals["write"] += t6 - t5
+    finally:
+        markdown_utils._inline_parser = inline_parser
+    return totals
+
+
+class _DictHTMLNode:
+    # Baseline: the node layout before __slots__, one __dict__ per instance
+    def __init__(self, tag, value, children, props):
+        self.tag = tag
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+class _DictTextNode:
+    def __init__(self, text, text_type, url):
+        self.text = text
+        self.text_type = text_type
+        self.url = url
+
+
+def _mirror(node: HTMLNode, make_leaf, make_parent):
+    if node.children is None:
+        return make_leaf(node)
+    return make_parent(node, [_mirror(child, make_leaf, make_parent) for child in node.children])
+
+
+def _traced_bytes(build) -> int:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        keep = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del keep
+    return after - before
+
+
+def node_memory(md: str) -> dict:
+    """
+    Measure bytes per node for the HTMLNode tree and the inline TextNodes
+    of md, comparing dict-backed baseline classes with the slotted ones.
+    Both layouts share the same strings and props, so only the node
+    objects themselves are counted.
+    """
+    tree = markdown_to_html_node(md)
+    count = [0]
+
+    def count_nodes(node):
+        count[0] += 1
+        for child in node.children or ():
+            count_nodes(child)
+
+    count_nodes(tree)
+    html_before = _traced_bytes(lambda: _mirror(
+        tree,
+        lambda n: _DictHTMLNode(n.tag, n.value, None, n.props),
+        lambda n, children: _DictHTMLNode(n.tag, None, children, n.props),
+    ))
+    html_after = _traced_bytes(lambda: _mirror(
+        tree,
+        lambda n: LeafNode(n.tag, n.value, n.props),
+        lambda n, children: ParentNode(n.tag, children, n.props),
+    ))
+
+    text_nodes = [n for block in markdown_to_blocks(md) for n in markdown_utils._inline_parser(block)]
+    text_before = _traced_bytes(
+        lambda: [_DictTextNode(n.text, n.text_type, n.url) for n in text_nodes]
+    )
+    text_after = _traced_bytes(
+        lambda: [TextNode(n.text, n.text_type, n.url) for n in text_nodes]
+    )
+    return {
+        "html_nodes": count[0],
+        "html_bytes_per_node": {"before": html_before / count[0], "after": html_after / count[0]},
+        "text_nodes": len(text_nodes),
+        "text_bytes_per_node": {
+            "before": text_before / len(text_nodes),
+            "after": text_after / len(text_nodes),
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run_benchmark(
+    pages: int,
+    blocks: int = 30,
+    mix: Optional[Dict[str, int]] = None,
+    seed: int = 0,
+    jobs: int = 1,
+    workdir: Optional[str] = None,
+) -> dict:
+    """
+    Generate a corpus, time each stage and a full generate_pages_recursive
+    run, and return the results as a JSON-serialisable dict.
+    """
+    with tempfile.TemporaryDirectory(dir=workdir) as root:
+        content_dir = os.path.join(root, "content")
+        template_path = os.path.join(root, "template.html")
+        with open(template_path, "w", encoding="utf-8") as f:
+            f.write('<html><head><title>{{ Title }}</title>'
+                    '<link href="/index.css"></head><body>{{ Content }}</body></html>')
+        corpus_bytes = generate_corpus(content_dir, pages, blocks, mix, seed)
+
+        stages = time_stages(content_dir, Template.load(template_path), os.path.join(root, "stages"))
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(
+                content_dir, template_path, os.path.join(root, "docs"), "/", None, jobs
+            )
+        full_build = time.perf_counter() - start
+
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "corpus": {
+            "pages": pages,
+            "blocks": blocks,
+            "mix": mix or DEFAULT_MIX,
+            "seed": seed,
+            "bytes": corpus_bytes,
+        },
+        "stages": stages,
+        "full_build": {"seconds": full_build, "jobs": jobs,
+                       "pages_per_second": pages / full_build if full_build else None},
+    }
+
+
+def _parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown block kind {kind!r}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def print_report(results: dict) -> None:
+    corpus = results["corpus"]
+    print(f"Corpus: {corpus['pages']} pages, {corpus['blocks']} blocks/page, "
+          f"{corpus['bytes'] / 1e6:.1f} MB")
+    total = sum(results["stages"].values()) or 1.0
+    for stage in STAGES:
+        seconds = results["stages"][stage]
+        print(f"  {stage:<13} {seconds:8.3f}s  {100 * seconds / total:5.1f}%")
+    full = results["full_build"]
+    print(f"Full build ({full['jobs']} jobs): {full['seconds']:.3f}s, "
+          f"{full['pages_per_second']:.0f} pages/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the site build on a synthetic corpus.")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--blocks", type=int, default=30, help="blocks per page")
+    parser.add_argument("--mix", type=_parse_mix, default=None,
+                        help="block weights, e.g. paragraph=5,code=1,unordered_list=3")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="jobs for the full build")
+    parser.add_argument("--json", help="write results as JSON to this path ('-' for stdout)")
+    parser.add_argument("--memory", action="store_true",
+                        help="measure node memory on one page of --blocks blocks instead")
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        md = generate_page_markdown(random.Random(args.seed), args.blocks, args.mix or DEFAULT_MIX)
+        results = node_memory(md)
+        if args.json == "-":
+            json.dump(results, sys.stdout, indent=1)
+            print()
+            return
+        for kind in ("html", "text"):
+            per_node = results[f"{kind}_bytes_per_node"]
+            print(f"{results[f'{kind}_nodes']} {kind} nodes: "
+                  f"{per_node['before']:.0f} bytes/node with __dict__, "
+                  f"{per_node['after']:.0f} bytes/node with __slots__")
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=1)
+        return
+
+    results = run_benchmark(args.pages, args.blocks, args.mix, args.seed, args.jobs)
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=1)
+        print()
+        return
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from template import partials_dir
+
+LIVERELOAD_PATH = "/__livereload"
+LIVERELOAD_SCRIPT = (
+    f'<script>new EventSource("{LIVERELOAD_PATH}").onmessage = '
+    '() => location.reload();</script>'
+)
+
+
+class SiteWatcher:
+    """
+    Polls content/, static/, the template and its partials of a
+    SiteBuilder for changes and hands them to builder.update(), which
+    rebuilds only what they affect with the builder's settings, manifest
+    and caches.
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.content_dir = os.path.normpath(builder.content_dir)
+        self.static_dir = os.path.normpath(builder.static_dir)
+        self.template_path = os.path.normpath(builder.template_path)
+        self.partials_dir = os.path.normpath(partials_dir(builder.template_path))
+        self.dest_dir = os.path.normpath(builder.dest_dir)
+        self.snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        paths = [self.template_path]
+        for top in (self.content_dir, self.static_dir, self.partials_dir):
+            for root, _, files in os.walk(top):
+                paths.extend(os.path.join(root, fname) for fname in files)
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self) -> List[str]:
+        """
+        Apply any changes since the last poll. Returns the output paths
+        that were written or removed.
+        """
+        current = self._scan()
+        changed = sorted(p for p in current if self.snapshot.get(p) != current[p])
+        removed = sorted(p for p in self.snapshot if p not in current)
+        self.snapshot = current
+        if not changed and not removed:
+            return []
+        return self.builder.update(changed, removed)
+
+
+class ReloadNotifier:
+    """
+    Version counter that live-reload connections block on.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._cond = threading.Condition()
+
+    def notify(self) -> None:
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the built site, injecting the live-reload script into HTML pages
+    and answering the live-reload event stream.
+    """
+
+    notifier: ReloadNotifier = None
+
+    def do_GET(self):
+        if self.path == LIVERELOAD_PATH:
+            return self._event_stream()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if not path.endswith(".html") or not os.path.isfile(path):
+            return super().do_GET()
+        with open(path, encoding="utf-8") as f:
+            body = inject_livereload(f.read()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _event_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        seen = self.notifier.version
+        try:
+            while True:
+                version = self.notifier.wait(seen, timeout=15)
+                # A comment line keeps idle connections open
+                message = "data: reload\n\n" if version != seen else ": ping\n\n"
+                seen = version
+                self.wfile.write(message.encode("ascii"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def inject_livereload(html: str) -> str:
+    index = html.rfind("</body>")
+    if index == -1:
+        return html + LIVERELOAD_SCRIPT
+    return html[:index] + LIVERELOAD_SCRIPT + html[index:]
+
+
+def make_server(dest_dir: str, port: int, notifier: ReloadNotifier) -> ThreadingHTTPServer:
+    handler = type("Handler", (DevRequestHandler,), {"notifier": notifier})
+    return ThreadingHTTPServer(("127.0.0.1", port), partial(handler, directory=dest_dir))
+
+
+def watch(
+    watcher: SiteWatcher,
+    port: Optional[int] = None,
+    interval: float = 0.2,
+) -> None:
+    """
+    Poll for changes until interrupted. With a port, also serve the output
+    directory there and tell connected browsers to reload after a rebuild.
+    """
+    notifier = ReloadNotifier()
+    server = None
+    if port is not None:
+        server = make_server(watcher.dest_dir, port, notifier)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Serving {watcher.dest_dir} at http://127.0.0.1:{server.server_address[1]}/")
+    print(f"Watching {watcher.content_dir}, {watcher.static_dir} and {watcher.template_path}")
+    try:
+        while True:
+            time.sleep(interval)
+            start = time.perf_counter()
+            try:
+                outputs = watcher.poll()
+            except Exception as e:
+                # Keep watching; the next save will usually fix the page
+                print(f"Rebuild failed: {e}")
+                continue
+            if outputs:
+                print(f"Rebuilt {len(outputs)} file(s) in {time.perf_counter() - start:.3f}s")
+                notifier.notify()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
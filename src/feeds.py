@@ -0,0 +1,196 @@
+import hashlib
+import html
+import json
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+from siteindex import SiteIndex
+from statefile import write_json
+from template import Template, needs_rewrite, rewrite_basepath
+
+# Pages whose output is under this directory are blog posts
+BLOG_DIR = "blog/"
+BLOG_TITLE = "Blog"
+# Newest posts listed in feed.xml
+FEED_ITEMS = 20
+
+
+def page_url(output: str) -> str:
+    """
+    "blog/tom/index.html" -> "/blog/tom/"; other pages keep their name.
+    """
+    if output == "index.html" or output.endswith("/index.html"):
+        output = output[:-len("index.html")]
+    return "/" + output
+
+
+def absolute_url(site_url: str, basepath: str, url: str) -> str:
+    """
+    Join a root-relative URL onto the site's address and BASEPATH.
+    """
+    return site_url.rstrip("/") + basepath + url[1:]
+
+
+def _modified(entry: dict) -> datetime:
+    return datetime.fromtimestamp(entry["mtime_ns"] / 1e9, timezone.utc).replace(microsecond=0)
+
+
+def blog_posts(index: SiteIndex) -> List[dict]:
+    """
+    Return the index entries of the blog posts, newest first. A post's
+    date is the modification time of its source.
+    """
+    posts = [
+        entry for entry in index.pages.values()
+        if entry["output"].startswith(BLOG_DIR) and entry["output"] != BLOG_DIR + "index.html"
+    ]
+    posts.sort(key=lambda entry: (-entry["mtime_ns"], entry["output"]))
+    return posts
+
+
+def render_blog_index(posts: List[dict]) -> str:
+    """
+    Content of the blog listing page: each post's title, date and summary.
+    """
+    items = []
+    for entry in posts:
+        date = _modified(entry).date().isoformat()
+        title = html.escape(entry["title"] or entry["output"])
+        items.append(
+            f'<li><a href="{page_url(entry["output"])}">{title}</a> '
+            f'<time datetime="{date}">{date}</time>{entry.get("summary") or ""}</li>'
+        )
+    return f'<div><h1>{BLOG_TITLE}</h1><ul>{"".join(items)}</ul></div>'
+
+
+def render_feed(posts: List[dict], site_url: str, basepath: str) -> str:
+    """
+    RSS 2.0 feed of the newest posts, with their summaries as descriptions.
+    Root-relative links and images in a summary are made absolute, since
+    feed readers show it away from the site.
+    """
+    site_root = absolute_url(site_url, basepath, "/")
+    items = []
+    for entry in posts[:FEED_ITEMS]:
+        link = escape(absolute_url(site_url, basepath, page_url(entry["output"])))
+        summary = rewrite_basepath(entry.get("summary") or "", site_root)
+        items.append(
+            "<item>"
+            f"<title>{escape(entry['title'] or entry['output'])}</title>"
+            f"<link>{link}</link><guid>{link}</guid>"
+            f"<pubDate>{format_datetime(_modified(entry))}</pubDate>"
+            f"<description>{escape(summary)}</description>"
+            "</item>\n"
+        )
+    blog_url = escape(absolute_url(site_url, basepath, "/" + BLOG_DIR))
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<rss version="2.0"><channel>\n'
+        f"<title>{BLOG_TITLE}</title><link>{blog_url}</link>"
+        f"<description>{BLOG_TITLE}</description>\n"
+        f"{''.join(items)}"
+        "</channel></rss>\n"
+    )
+
+
+def render_sitemap(index: SiteIndex, site_url: str, basepath: str, extra: Dict[str, datetime]) -> str:
+    """
+    sitemap.xml listing every page in the index, plus the generated pages
+    in extra (output path -> last modification).
+    """
+    modified = {entry["output"]: _modified(entry) for entry in index.pages.values()}
+    modified.update(extra)
+    urls = []
+    for output in sorted(modified):
+        loc = escape(absolute_url(site_url, basepath, page_url(output)))
+        urls.append(f"<url><loc>{loc}</loc><lastmod>{modified[output].isoformat()}</lastmod></url>\n")
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        f"{''.join(urls)}"
+        "</urlset>\n"
+    )
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """
+    Write text to path unless the file already holds it. Returns True if
+    the file was written.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+
+def _load_digests(state_path: Optional[str]) -> Dict[str, str]:
+    if state_path is None:
+        return {}
+    try:
+        with open(state_path, encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_digests(state_path: Optional[str], digests: Dict[str, str]) -> None:
+    if state_path is None:
+        return
+    write_json(state_path, {"files": digests}, indent=1, sort_keys=True)
+
+
+def write_feeds(
+    index: SiteIndex,
+    dest_dir: str,
+    template: Template,
+    site_url: str,
+    basepath: str,
+    state_path: Optional[str] = None,
+) -> List[str]:
+    """
+    Write blog/index.html, feed.xml and sitemap.xml into dest_dir from an
+    up-to-date site index, without reading any page source. The listing
+    page is left alone when the content has its own blog/index.md. Files
+    whose content did not change are not rewritten. With state_path, that
+    is judged by a hash of the text last written, kept there, so outputs
+    minified after this step are not taken for changed. Returns the paths
+    written.
+    """
+    posts = blog_posts(index)
+    outputs = {}
+    extra = {}
+    listing = BLOG_DIR + "index.html"
+    if not any(entry["output"] == listing for entry in index.pages.values()):
+        content = render_blog_index(posts)
+        if needs_rewrite(basepath):
+            content = rewrite_basepath(content, basepath)
+        outputs[listing] = template.render({"Title": BLOG_TITLE, "Content": content})
+        if posts:
+            extra[listing] = _modified(posts[0])
+    outputs["feed.xml"] = render_feed(posts, site_url, basepath)
+    outputs["sitemap.xml"] = render_sitemap(index, site_url, basepath, extra)
+    digests = _load_digests(state_path)
+    written = []
+    for rel, text in outputs.items():
+        path = os.path.join(dest_dir, *rel.split("/"))
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if state_path is not None and digests.get(rel) == digest and os.path.exists(path):
+            continue
+        if write_if_changed(path, text):
+            written.append(path)
+        digests[rel] = digest
+    _save_digests(state_path, digests)
+    print(
+        f"Wrote blog index, feed and sitemap for {len(posts)} posts "
+        f"({len(written)} of {len(outputs)} files changed)"
+    )
+    return written
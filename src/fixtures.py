@@ -0,0 +1,48 @@
+"""
+File helpers shared by the test modules.
+"""
+import os
+from typing import List, Optional, Tuple, Union
+
+from images import encode_png
+
+
+def write(path: str, data: Union[str, bytes], mtime: Optional[float] = None) -> None:
+    """
+    Create path, and any missing parent directories, holding data. With
+    mtime, also set its access and modification times.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(data, bytes):
+        with open(path, "wb") as f:
+            f.write(data)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def touch(path: str, text: str) -> None:
+    """
+    Write text to path and move its mtime a second forward, so the change
+    is visible even on filesystems with coarse timestamps.
+    """
+    write(path, text)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def gradient_png(width: int, height: int, extra: bytes = b"") -> Tuple[bytes, List[bytes]]:
+    """
+    Return an RGB PNG of a diagonal gradient, with the ancillary chunks in
+    extra spliced in after IHDR, and its pixel rows.
+    """
+    rows = [bytes((x * 7 + y) % 256 for x in range(width) for _ in range(3)) for y in range(height)]
+    data = encode_png(width, height, 2, rows)
+    return data[:33] + extra + data[33:], rows
@@ -1,7 +1,35 @@
-from typing import List, Dict, Optional
+import hashlib
+import json
+from typing import Callable, List, Dict, Optional
 from textnode import TextNode, TextType
 
+# Extra <img> attributes (width, height, srcset) keyed by image URL,
+# filled in by the image optimization stage through set_image_hints
+_image_hints: Dict[str, Dict[str, str]] = {}
+_image_hints_digest = ""
+
+def set_image_hints(hints: Dict[str, Dict[str, str]]) -> None:
+    global _image_hints, _image_hints_digest
+    _image_hints = dict(hints)
+    _image_hints_digest = (
+        hashlib.sha256(json.dumps(hints, sort_keys=True).encode("utf-8")).hexdigest()
+        if hints else ""
+    )
+
+def image_hints() -> Dict[str, Dict[str, str]]:
+    return _image_hints
+
+def image_hints_digest() -> str:
+    """
+    Digest of the current hints table, empty when there are none.
+    Rendered HTML depends on it, so caches must include it in their keys.
+    """
+    return _image_hints_digest
+
 class HTMLNode:
+    # Pages produce many of these; slots avoid a per-instance __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(
         self,
         tag: Optional[str] = None,
@@ -17,6 +45,13 @@ class HTMLNode:
     def to_html(self) -> str:
         raise NotImplementedError("Subclasses must implement to_html()")
 
+    def render_to(self, write: Callable[[str], object]) -> None:
+        """
+        Stream this node's HTML to write() in chunks instead of building
+        one string. write is typically a file's write method or list.append.
+        """
+        write(self.to_html())
+
     def props_to_html(self) -> str:
         if not self.props:
             return ''
@@ -30,6 +65,8 @@ class HTMLNode:
         )
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag: Optional[str], value: str, props: Optional[Dict[str, str]] = None):
         # children must always be None for a leaf
         super().__init__(tag=tag, value=value, children=None, props=props)
@@ -44,6 +81,8 @@ class LeafNode(HTMLNode):
         return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(
         self,
         tag: str,
@@ -53,12 +92,21 @@ class ParentNode(HTMLNode):
         super().__init__(tag=tag, value=None, children=children, props=props)
 
     def to_html(self) -> str:
+        # Collect every chunk of the subtree and join once, rather than
+        # building and copying a string at each level of nesting
+        chunks = []
+        self.render_to(chunks.append)
+        return ''.join(chunks)
+
+    def render_to(self, write: Callable[[str], object]) -> None:
         if self.tag is None:
             raise ValueError("ParentNode must have a tag")
         if self.children is None:
             raise ValueError("ParentNode must have children")
-        inner = ''.join(child.to_html() for child in self.children)
-        return f"<{self.tag}{self.props_to_html()}>{inner}</{self.tag}>"
+        write(f"<{self.tag}{self.props_to_html()}>")
+        for child in self.children:
+            child.render_to(write)
+        write(f"</{self.tag}>")
 
 def text_node_to_html_node(text_node: TextNode) -> LeafNode:
     if not isinstance(text_node, TextNode):
@@ -77,6 +125,10 @@ def text_node_to_html_node(text_node: TextNode) -> LeafNode:
     elif ttype == TextType.LINK:
         return LeafNode("a", text, {"href": url})
     elif ttype == TextType.IMAGE:
-        return LeafNode("img", "", {"src": url, "alt": text})
+        props = {"src": url, "alt": text}
+        hints = _image_hints.get(url)
+        if hints:
+            props.update(hints)
+        return LeafNode("img", "", props)
     else:
         raise ValueError(f"Unsupported TextType: {ttype}")
@@ -0,0 +1,358 @@
+import json
+import os
+import shutil
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from assets import transfer_file, up_to_date
+from manifest import file_hash
+
+# Bump whenever the encoder or the variant set changes, so derivatives
+# produced by older code are not reused
+OPTIMIZER_VERSION = "1"
+# Widths of the resized variants; only those narrower than the source
+# are produced
+VARIANT_WIDTHS = (480, 960)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Bytes per pixel of 8-bit images by PNG color type
+CHANNELS = {0: 1, 2: 3, 4: 2, 6: 4}
+# Color chunks copied to derivatives; text, time and other metadata is dropped
+COLOR_CHUNKS = (b"sRGB", b"gAMA", b"cHRM", b"iCCP", b"sBIT")
+KEEP_CHUNKS = (b"IHDR", b"PLTE", b"tRNS") + COLOR_CHUNKS
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+def _chunks(data: bytes):
+    if data[:8] != PNG_SIGNATURE:
+        raise UnsupportedImage("not a PNG file")
+    pos = 8
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack(">I4s", data[pos:pos + 8])
+        yield ctype, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _chunk(ctype: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + ctype + body + struct.pack(">I", zlib.crc32(ctype + body))
+
+
+def png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Return (width, height) from a PNG header, or None if data is not a PNG.
+    """
+    if data[:8] != PNG_SIGNATURE or data[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", data[16:24])
+
+
+def recompress_png(data: bytes) -> bytes:
+    """
+    Losslessly shrink a PNG: re-deflate the pixel data at the highest
+    level and drop metadata chunks. Returns data itself if that is smaller.
+    """
+    out = [PNG_SIGNATURE]
+    idat = []
+    for ctype, body in _chunks(data):
+        if ctype == b"IDAT":
+            idat.append(body)
+        elif ctype == b"IEND":
+            break
+        elif ctype in KEEP_CHUNKS:
+            out.append(_chunk(ctype, body))
+    out.append(_chunk(b"IDAT", zlib.compress(zlib.decompress(b"".join(idat)), 9)))
+    out.append(_chunk(b"IEND", b""))
+    result = b"".join(out)
+    return result if len(result) < len(data) else data
+
+
+def _unfilter(ftype: int, line: bytearray, prev: bytearray, bpp: int) -> None:
+    if ftype == 0:
+        return
+    if ftype == 1:
+        for i in range(bpp, len(line)):
+            line[i] = (line[i] + line[i - bpp]) & 0xFF
+    elif ftype == 2:
+        line[:] = bytes((a + b) & 0xFF for a, b in zip(line, prev))
+    elif ftype == 3:
+        for i in range(len(line)):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + prev[i]) >> 1)) & 0xFF
+    elif ftype == 4:
+        for i in range(len(line)):
+            if i >= bpp:
+                a, c = line[i - bpp], prev[i - bpp]
+            else:
+                a = c = 0
+            b = prev[i]
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            if pa <= pb and pa <= pc:
+                pred = a
+            elif pb <= pc:
+                pred = b
+            else:
+                pred = c
+            line[i] = (line[i] + pred) & 0xFF
+    else:
+        raise UnsupportedImage(f"bad PNG filter type {ftype}")
+
+
+def decode_png(data: bytes) -> Tuple[int, int, int, List[bytearray], List[Tuple[bytes, bytes]]]:
+    """
+    Decode an 8-bit, non-interlaced, non-palette PNG into
+    (width, height, color_type, rows, color_chunks).
+    """
+    header = None
+    idat = []
+    color_chunks = []
+    for ctype, body in _chunks(data):
+        if ctype == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif ctype == b"IDAT":
+            idat.append(body)
+        elif ctype in COLOR_CHUNKS:
+            color_chunks.append((ctype, body))
+    if header is None:
+        raise UnsupportedImage("PNG has no IHDR chunk")
+    width, height, depth, color_type, _, _, interlace = header
+    if depth != 8 or interlace or color_type not in CHANNELS:
+        raise UnsupportedImage("only 8-bit non-interlaced gray/RGB(A) PNGs are decoded")
+    bpp = CHANNELS[color_type]
+    stride = width * bpp
+    raw = zlib.decompress(b"".join(idat))
+    rows = []
+    prev = bytearray(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        line = bytearray(raw[start + 1:start + 1 + stride])
+        _unfilter(raw[start], line, prev, bpp)
+        rows.append(line)
+        prev = line
+    return width, height, color_type, rows, color_chunks
+
+
+def encode_png(
+    width: int,
+    height: int,
+    color_type: int,
+    rows: List[bytes],
+    chunks: List[Tuple[bytes, bytes]] = (),
+) -> bytes:
+    """
+    Encode 8-bit rows as a PNG, using the Sub filter on every row.
+    """
+    bpp = CHANNELS[color_type]
+    raw = bytearray()
+    for row in rows:
+        raw.append(1)
+        raw += row[:bpp]
+        raw += bytes((row[i] - row[i - bpp]) & 0xFF for i in range(bpp, len(row)))
+    out = [PNG_SIGNATURE, _chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))]
+    out.extend(_chunk(ctype, body) for ctype, body in chunks)
+    out.append(_chunk(b"IDAT", zlib.compress(bytes(raw), 9)))
+    out.append(_chunk(b"IEND", b""))
+    return b"".join(out)
+
+
+def resize_rows(
+    rows: List[bytes], width: int, height: int, bpp: int, new_width: int
+) -> Tuple[int, List[bytes]]:
+    """
+    Downscale pixel rows to new_width with a box filter: every output
+    pixel averages the block of source pixels it covers.
+    Returns (new_height, rows).
+    """
+    new_height = max(1, round(height * new_width / width))
+    xs = [x * width // new_width for x in range(new_width + 1)]
+    ys = [y * height // new_height for y in range(new_height + 1)]
+    out = []
+    for y in range(new_height):
+        band = rows[ys[y]:ys[y + 1]]
+        column_sums = [sum(values) for values in zip(*band)]
+        line = bytearray(new_width * bpp)
+        for c in range(bpp):
+            channel = column_sums[c::bpp]
+            for x in range(new_width):
+                x0, x1 = xs[x], xs[x + 1]
+                count = (x1 - x0) * len(band)
+                line[x * bpp + c] = (sum(channel[x0:x1]) + count // 2) // count
+        out.append(bytes(line))
+    return new_height, out
+
+
+def variant_name(path: str, width: int) -> str:
+    """
+    "/images/a.png" -> "/images/a-480w.png"
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}-{width}w{ext}"
+
+
+def optimizable(path: str) -> bool:
+    """
+    Return True for the static files optimize_images() replaces.
+    """
+    return path.lower().endswith(".png")
+
+
+def derive_image(src_path: str, entry_dir: str) -> dict:
+    """
+    Write the optimized image and its resized variants into entry_dir
+    and return their metadata. Images that cannot be decoded are only
+    recompressed.
+    """
+    with open(src_path, "rb") as f:
+        data = f.read()
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    optimized, decoded = data, None
+    try:
+        optimized = recompress_png(data)
+        decoded = decode_png(data)
+    except (UnsupportedImage, zlib.error, struct.error):
+        pass
+    with open(os.path.join(tmp_dir, "image.png"), "wb") as f:
+        f.write(optimized)
+    width, height = png_size(data) or (None, None)
+    variants = []
+    if decoded is not None:
+        _, _, color_type, rows, color_chunks = decoded
+        for new_width in VARIANT_WIDTHS:
+            if new_width >= width:
+                continue
+            new_height, small = resize_rows(rows, width, height, CHANNELS[color_type], new_width)
+            with open(os.path.join(tmp_dir, f"{new_width}w.png"), "wb") as f:
+                f.write(encode_png(new_width, new_height, color_type, small, color_chunks))
+            variants.append(new_width)
+    meta = {"width": width, "height": height, "variants": variants}
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        # Another worker derived the same image first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
+
+
+def _derive_job(job: Tuple[str, str]) -> dict:
+    return derive_image(*job)
+
+
+class ImageCache:
+    """
+    Derivatives of static images keyed by source hash. Each entry is a
+    directory holding image.png, one <width>w.png per variant and
+    meta.json, so an image is only processed again when it changes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def entry_dir(self, digest: str) -> str:
+        key = f"{OPTIMIZER_VERSION}-{digest}"
+        return os.path.join(self.directory, key[:4], key)
+
+    def meta(self, digest: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.entry_dir(digest), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def image_size_hints(url: str, meta: dict) -> dict:
+    """
+    Attributes for an <img> showing url: intrinsic width and height, and
+    a srcset listing the resized variants.
+    """
+    hints = {"width": str(meta["width"]), "height": str(meta["height"])}
+    if meta["variants"]:
+        candidates = [f"{variant_name(url, w)} {w}w" for w in meta["variants"]]
+        candidates.append(f"{url} {meta['width']}w")
+        hints["srcset"] = ", ".join(candidates)
+    return hints
+
+
+def variant_paths(hints: Dict[str, dict]) -> List[str]:
+    """
+    Return the paths, relative to the site root, of the resized variants
+    listed in the srcsets of hints.
+    """
+    paths = []
+    for url, attrs in sorted(hints.items()):
+        for candidate in attrs.get("srcset", "").split(", "):
+            candidate_url = candidate.partition(" ")[0]
+            if candidate_url and candidate_url != url:
+                paths.append(candidate_url.lstrip("/"))
+    return paths
+
+
+def optimize_images(
+    static_dir: str,
+    dest_dir: str,
+    cache_dir: str,
+    workers: Optional[int] = None,
+    link: str = "reflink",
+) -> Dict[str, dict]:
+    """
+    Place optimized versions of the PNGs in static_dir into dest_dir and
+    add their resized variants next to them. Files already matching the
+    cached derivative are left alone. Images missing from the cache are
+    processed on a pool of worker processes.
+    Returns the <img> size hints keyed by site URL.
+    """
+    cache = ImageCache(cache_dir)
+    images = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs.sort()
+        for fname in sorted(files):
+            if optimizable(fname):
+                src_path = os.path.join(root, fname)
+                images.append((src_path, os.path.relpath(src_path, static_dir), file_hash(src_path)))
+
+    todo = {}
+    for src_path, _, digest in images:
+        if digest not in todo and cache.meta(digest) is None:
+            todo[digest] = (src_path, cache.entry_dir(digest))
+    for job in todo.values():
+        os.makedirs(os.path.dirname(job[1]), exist_ok=True)
+    if len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_derive_job, todo.values()))
+    else:
+        for job in todo.values():
+            derive_image(*job)
+
+    hints = {}
+    saved = 0
+    for src_path, rel, digest in images:
+        meta = cache.meta(digest)
+        entry = cache.entry_dir(digest)
+        dest = os.path.join(dest_dir, rel)
+        optimized = os.path.join(entry, "image.png")
+        saved += os.path.getsize(src_path) - os.path.getsize(optimized)
+        derived = [(optimized, dest)] + [
+            (os.path.join(entry, f"{width}w.png"), variant_name(dest, width))
+            for width in meta["variants"]
+        ]
+        for src, dst in derived:
+            if not up_to_date(src, dst):
+                transfer_file(src, dst, link)
+        if meta["width"] is not None:
+            url = "/" + rel.replace(os.sep, "/")
+            hints[url] = image_size_hints(url, meta)
+    print(
+        f"Optimized {len(images)} images ({len(todo)} processed, "
+        f"{saved / 1024:.0f} KiB saved)"
+    )
+    return hints
@@ -1,18 +1,74 @@
+import argparse
+import asyncio
+import hashlib
 import os
 import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 from textnode import TextNode, TextType
-from markdown_utils import markdown_to_html_node, extract_title
+from htmlnode import image_hints, set_image_hints
+from markdown_utils import (
+    INLINE_PARSERS,
+    PageInfo,
+    extract_title,
+    extract_title_from_lines,
+    fragment_cache,
+    inline_parser,
+    iter_html_blocks,
+    iter_markdown_blocks,
+    markdown_to_html_node,
+    set_fragment_cache,
+    set_inline_parser,
+)
+from assets import (
+    LINK_MODES, fingerprint_assets, record_rewrites, sync_directory, transfer_file,
+)
+from feeds import write_feeds
+from images import ImageCache, optimizable, optimize_images, variant_paths
+from manifest import BuildManifest
+from postprocess import postprocess_directory
+from profiling import BuildProfiler, profile_output_needs_cprofile
+from rendercache import (
+    DEFAULT_FRAGMENT_BYTES,
+    DEFAULT_MAX_BYTES,
+    FragmentCache,
+    MemoryRenderCache,
+    RenderCache,
+)
+from search import build_search_index
+from siteindex import SiteIndex, template_references
+from statefile import SourceStats, source_stats
+from template import (
+    Template,
+    asset_map,
+    needs_rewrite,
+    partials_dir,
+    rewrite_basepath,
+    set_asset_map,
+)
 
-BASEPATH = sys.argv[1] if len(sys.argv) > 1 else "/"
+BASEPATH = "/"
+# Build state kept between runs; SiteBuilder(state_dir=...) can move it
+STATE_DIR = ".build"
+MANIFEST_PATH = os.path.join(STATE_DIR, "manifest.json")
+CACHE_DIR = os.path.join(STATE_DIR, "cache")
+SITE_INDEX_PATH = os.path.join(STATE_DIR, "siteindex.json")
+IMAGE_CACHE_DIR = os.path.join(STATE_DIR, "images")
+# Pages buffered between stages of the async pipeline (see --pipeline)
+PIPELINE_QUEUE_SIZE = 16
+# Sources at least this large are converted block by block straight from
+# the open file instead of being read into memory (see --stream-threshold)
+STREAM_THRESHOLD = 32 * 1024 * 1024
 
-def copy_directory(src: str, dst: str) -> None:
+def copy_directory(src: str, dst: str, clean: bool = True) -> None:
     """
     Recursively copy all contents from src to dst.
-    Deletes dst first for a clean copy.
+    Deletes dst first for a clean copy unless clean is False.
     Logs each file copied.
     """
-    if os.path.exists(dst):
+    if clean and os.path.exists(dst):
         shutil.rmtree(dst)
     for root, dirs, files in os.walk(src):
         rel_path = os.path.relpath(root, src)
@@ -24,42 +80,982 @@ def copy_directory(src: str, dst: str) -> None:
             print(f"Copying {src_file} to {dst_file}")
             shutil.copy(src_file, dst_file)
 
-def generate_page(from_path: str, template_path: str, dest_path: str):
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    md = open(from_path, encoding="utf-8").read()
-    tpl = open(template_path, encoding="utf-8").read()
+def read_source(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def stream_page(
+    md: str,
+    template: Template,
+    write: Callable[[str], object],
+    cache: Optional[RenderCache] = None,
+    info: Optional[PageInfo] = None,
+) -> None:
+    """
+    Render markdown source into a compiled template, passing the page to
+    write() as template segments and content chunks. The BASEPATH rewrite
+    is already applied to the template, so only content chunks are
+    rewritten and the whole page is never held in memory as one string.
+    With a cache, previously rendered content is reused without parsing.
+    With info, the facts the site index needs are gathered on the way.
+    """
+    if cache is None:
+        render_content = markdown_to_html_node(md, info).render_to
+        title = extract_title(md)
+    else:
+        hit = cache.get(md)
+        if hit is None or (info is not None and hit[2] is None):
+            title = extract_title(md)
+            content_html = markdown_to_html_node(md, info).to_html()
+            if info is not None:
+                info.title = title
+            cache.put(md, title, content_html, info.to_dict() if info is not None else None)
+        else:
+            title, content_html, cached_info = hit
+            if info is not None:
+                info.restore(cached_info)
+        render_content = lambda out: out(content_html)
+    if info is not None:
+        info.title = title
+    basepath = template.basepath
 
-    # Convert to HTML
-    content_html = markdown_to_html_node(md).to_html()
-    title = extract_title(md)
+    def write_content(out: Callable[[str], object]) -> None:
+        if not needs_rewrite(basepath):
+            render_content(out)
+        else:
+            render_content(lambda chunk: out(rewrite_basepath(chunk, basepath)))
 
-    page = tpl.replace("{{ Title }}", title).replace("{{ Content }}", content_html)
-    page = page.replace('href="/', f'href="{BASEPATH}').replace('src="/', f'src="{BASEPATH}')
+    template.render_to(write, {"Title": title, "Content": write_content})
+
+def render_page(
+    md: str,
+    template: Template,
+    cache: Optional[RenderCache] = None,
+    info: Optional[PageInfo] = None,
+) -> str:
+    """
+    Render markdown source into the template and apply the BASEPATH rewrite.
+    Pure function of its arguments, so it is safe to run in worker processes.
+    """
+    chunks = []
+    stream_page(md, template, chunks.append, cache, info)
+    return "".join(chunks)
 
+def write_page(
+    dest_path: str,
+    md: str,
+    template: Template,
+    cache: Optional[RenderCache] = None,
+    info: Optional[PageInfo] = None,
+) -> None:
+    """
+    Render a page straight into dest_path without building it in memory.
+    """
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
     with open(dest_path, "w", encoding="utf-8") as f:
-        f.write(page)
+        stream_page(md, template, f.write, cache, info)
+
+def write_page_streaming(
+    from_path: str, dest_path: str, template: Template, info: Optional[PageInfo] = None
+) -> None:
+    """
+    Convert a markdown file into dest_path in bounded memory: the source
+    is read line by line and each block is parsed, rendered and written
+    before the next one is read.
+    """
+    with open(from_path, encoding="utf-8") as src:
+        title = extract_title_from_lines(src)
+    if info is not None:
+        info.title = title
+    basepath = template.basepath
+
+    def write_content(out: Callable[[str], object]) -> None:
+        if needs_rewrite(basepath):
+            raw_out = out
+            out = lambda chunk: raw_out(rewrite_basepath(chunk, basepath))
+        out("<div>")
+        with open(from_path, encoding="utf-8") as src:
+            for node in iter_html_blocks(iter_markdown_blocks(src), info):
+                node.render_to(out)
+        out("</div>")
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    with open(dest_path, "w", encoding="utf-8") as f:
+        template.render_to(f.write, {"Title": title, "Content": write_content})
+
+def build_page(
+    from_path: str,
+    dest_path: str,
+    template: Template,
+    cache: Optional[RenderCache] = None,
+    info: Optional[PageInfo] = None,
+) -> None:
+    """
+    Write one page, streaming sources of STREAM_THRESHOLD bytes or more.
+    """
+    if os.path.getsize(from_path) >= STREAM_THRESHOLD:
+        write_page_streaming(from_path, dest_path, template, info)
+    else:
+        write_page(dest_path, read_source(from_path), template, cache, info)
+
+def generate_page(
+    from_path: str,
+    template_path: str,
+    dest_path: str,
+    basepath: str = BASEPATH,
+    manifest: Optional[BuildManifest] = None,
+    template: Optional[Template] = None,
+    cache: Optional[RenderCache] = None,
+    info: Optional[PageInfo] = None,
+) -> bool:
+    """
+    Render one markdown file into dest_path.
+    With a manifest, the page is skipped if its inputs are unchanged.
+    Pass a compiled template to avoid loading template_path for every page,
+    a cache to reuse content rendered by earlier builds, and info to
+    gather the page's facts for the site index.
+    Returns True if the page was written.
+    """
+    if manifest is not None and not manifest.needs_build(from_path, dest_path):
+        return False
+    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+    if template is None:
+        template = Template.load(template_path, basepath)
+    build_page(from_path, dest_path, template, cache, info)
+    if manifest is not None:
+        manifest.record(from_path, dest_path)
+    return True
+
+# Compiled template and render cache of a parallel build, set once per
+# worker process along with the <img> size hints, the asset map, a
+# fragment cache of the parent's budget, the stream threshold and the
+# inline parser. Spawned workers import this module afresh, so none of
+# these can be left to the module defaults
+_worker_template: Optional[Template] = None
+_worker_cache: Optional[RenderCache] = None
+
+def _init_page_worker(
+    template: Template,
+    cache: Optional[RenderCache],
+    hints: dict,
+    assets: dict,
+    fragment_bytes: int,
+    stream_threshold: int,
+    parser: str,
+) -> None:
+    global _worker_template, _worker_cache, STREAM_THRESHOLD
+    _worker_template = template
+    _worker_cache = cache
+    STREAM_THRESHOLD = stream_threshold
+    set_inline_parser(parser)
+    set_image_hints(hints)
+    set_asset_map(assets)
+    set_fragment_cache(FragmentCache(fragment_bytes) if fragment_bytes else None)
+
+def _generate_page_job(job: Tuple[str, str, bool]) -> Tuple[float, Optional[dict]]:
+    """
+    Worker side of generate_pages_parallel: build one page and return the
+    seconds spent on it, used to estimate the serial build time, and the
+    page's facts if asked to gather them.
+    """
+    from_path, dest_path, gather = job
+    info = PageInfo() if gather else None
+    start = time.perf_counter()
+    build_page(from_path, dest_path, _worker_template, _worker_cache, info)
+    return time.perf_counter() - start, info.to_dict() if gather else None
+
+def generate_pages_parallel(
+    pages: List[Tuple[str, str]],
+    template_path: str,
+    basepath: str = BASEPATH,
+    jobs: int = 2,
+    manifest: Optional[BuildManifest] = None,
+    cache: Optional[RenderCache] = None,
+    template: Optional[Template] = None,
+    infos: Optional[Dict[str, dict]] = None,
+) -> int:
+    """
+    Generate (source, dest) pages on a pool of worker processes.
+    Logging and manifest updates happen in the parent, in page order,
+    so the output is the same as a serial build. With infos, the facts
+    of each page written are stored there by source path. Returns the
+    number of pages written.
+    """
+    todo = [
+        (src_path, dest_path) for src_path, dest_path in pages
+        if manifest is None or manifest.needs_build(src_path, dest_path)
+    ]
+    if not todo:
+        return 0
+
+    start = time.perf_counter()
+    busy = 0.0
+    if template is None:
+        template = Template.load(template_path, basepath)
+    fragments = fragment_cache()
+    chunksize = max(1, len(todo) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_page_worker, initargs=(
+            template, cache, image_hints(), asset_map(),
+            fragments.max_bytes if fragments is not None else 0,
+            STREAM_THRESHOLD, inline_parser(),
+        )
+    ) as pool:
+        work = [(src_path, dest_path, infos is not None) for src_path, dest_path in todo]
+        results = pool.map(_generate_page_job, work, chunksize=chunksize)
+        for (src_path, dest_path), (elapsed, info) in zip(todo, results):
+            print(f"Generating page from {src_path} to {dest_path} using {template_path}")
+            busy += elapsed
+            if infos is not None:
+                infos[src_path] = info
+            if manifest is not None:
+                manifest.record(src_path, dest_path)
+    wall = time.perf_counter() - start
+    print(
+        f"Rendered {len(todo)} pages with {jobs} jobs in {wall:.2f}s "
+        f"(serial estimate {busy:.2f}s, {busy / wall:.1f}x speedup)"
+    )
+    return len(todo)
+
+def _makedirs_cached(directory: str, made: set) -> None:
+    # Most pages share a handful of directories: only ask the OS once
+    if directory not in made:
+        os.makedirs(directory, exist_ok=True)
+        made.add(directory)
+
+def _write_text(dest_path: str, text: str) -> None:
+    with open(dest_path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+def _load_page(
+    from_path: str, dest_path: str, manifest: Optional[BuildManifest]
+) -> Tuple[Optional[List[str]], Optional[str]]:
+    """
+    Reader stage of the pipeline: return (stale reasons, markdown). The
+    reasons are None when the page is up to date, and the markdown is None
+    for sources large enough to be streamed by the writer.
+    """
+    reasons: List[str] = []
+    if manifest is not None:
+        reasons = manifest.stale_reasons(from_path, dest_path)
+        if not reasons:
+            return None, None
+    if os.path.getsize(from_path) >= STREAM_THRESHOLD:
+        return reasons, None
+    return reasons, read_source(from_path)
+
+async def _run_pipeline(
+    pages: List[Tuple[str, str]],
+    template_path: str,
+    template: Template,
+    manifest: Optional[BuildManifest],
+    cache: Optional[RenderCache],
+    pool: ThreadPoolExecutor,
+    queue_size: int,
+    infos: Optional[Dict[str, dict]] = None,
+) -> int:
+    loop = asyncio.get_running_loop()
+    run = lambda func, *args: loop.run_in_executor(pool, func, *args)
+    # Queues hold pending futures in page order: the reader keeps up to
+    # queue_size reads in flight, and a full queue stalls the stage
+    # feeding it, which bounds the pages held in memory
+    loaded: asyncio.Queue = asyncio.Queue(queue_size)
+    rendered: asyncio.Queue = asyncio.Queue(queue_size)
+    writes = asyncio.Semaphore(queue_size)
+    made_dirs: set = set()
+
+    async def read_stage() -> None:
+        for src_path, dest_path in pages:
+            await loaded.put((src_path, dest_path, run(_load_page, src_path, dest_path, manifest)))
+        await loaded.put(None)
+
+    async def convert_stage() -> None:
+        while (item := await loaded.get()) is not None:
+            src_path, dest_path, future = item
+            reasons, md = await future
+            if reasons is None:
+                continue
+            if reasons and manifest.explain:
+                print(f"Rebuilding {dest_path}: {'; '.join(reasons)}")
+            info = PageInfo() if infos is not None else None
+            page = None if md is None else await run(render_page, md, template, cache, info)
+            await rendered.put((src_path, dest_path, page, info))
+        await rendered.put(None)
+
+    def write_one(
+        src_path: str, dest_path: str, page: Optional[str], info: Optional[PageInfo]
+    ) -> None:
+        _makedirs_cached(os.path.dirname(dest_path), made_dirs)
+        if page is None:
+            write_page_streaming(src_path, dest_path, template, info)
+        else:
+            _write_text(dest_path, page)
+
+    async def write_stage() -> int:
+        pending = []
+        while (item := await rendered.get()) is not None:
+            src_path, dest_path, page, info = item
+            print(f"Generating page from {src_path} to {dest_path} using {template_path}")
+            await writes.acquire()
+            future = run(write_one, src_path, dest_path, page, info)
+            future.add_done_callback(lambda _: writes.release())
+            pending.append((src_path, dest_path, info, future))
+        for src_path, dest_path, info, future in pending:
+            await future
+            if manifest is not None:
+                manifest.record(src_path, dest_path)
+            if info is not None:
+                infos[src_path] = info.to_dict()
+        return len(pending)
+
+    _, _, written = await asyncio.gather(read_stage(), convert_stage(), write_stage())
+    return written
+
+def generate_pages_async(
+    pages: List[Tuple[str, str]],
+    template_path: str,
+    basepath: str = BASEPATH,
+    io_threads: int = 8,
+    manifest: Optional[BuildManifest] = None,
+    cache: Optional[RenderCache] = None,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    template: Optional[Template] = None,
+    infos: Optional[Dict[str, dict]] = None,
+) -> int:
+    """
+    Generate (source, dest) pages through an asyncio pipeline so that
+    reading upcoming sources, converting the current page and writing
+    finished ones overlap. Blocking file calls run on a pool of io_threads
+    threads. Log lines and manifest updates keep page order. With infos,
+    the facts of each page written are stored there by source path.
+    Returns the number of pages written.
+    """
+    if template is None:
+        template = Template.load(template_path, basepath)
+    with ThreadPoolExecutor(max_workers=io_threads) as pool:
+        return asyncio.run(_run_pipeline(
+            pages, template_path, template, manifest, cache, pool, queue_size, infos
+        ))
 
-def generate_pages_recursive(content_dir: str, template_path: str, dest_dir: str) -> None:
+def collect_pages(content_dir: str, dest_dir: str) -> List[Tuple[str, str]]:
+    """
+    Return sorted (source, dest) pairs for every .md file under content_dir.
+    """
+    pages = []
+    for root, dirs, files in os.walk(content_dir):
+        dirs.sort()
+        for fname in sorted(files):
+            if not fname.lower().endswith('.md'):
+                continue
+            src_path = os.path.join(root, fname)
+            pages.append((src_path, page_dest(src_path, content_dir, dest_dir)))
+    return pages
+
+def shard_pages(
+    pages: List[Tuple[str, str]], content_dir: str, index: int, count: int
+) -> List[Tuple[str, str]]:
+    """
+    Return the pages that belong to shard index of count. A page's shard
+    depends only on its path under content_dir, so every machine agrees
+    on the split and adding a page never moves the others.
+    """
+    share = []
+    for src_path, dest_path in pages:
+        rel = os.path.relpath(src_path, content_dir).replace(os.sep, "/")
+        digest = hashlib.sha1(rel.encode("utf-8")).digest()
+        if int.from_bytes(digest[:4], "big") % count == index:
+            share.append((src_path, dest_path))
+    return share
+
+def page_dest(src_path: str, content_dir: str, dest_dir: str) -> str:
+    """
+    Map a markdown file under content_dir to its .html path under dest_dir.
+    """
+    rel_path = os.path.relpath(src_path, content_dir)
+    return os.path.join(dest_dir, os.path.splitext(rel_path)[0] + '.html')
+
+def generate_pages_recursive(
+    content_dir: str,
+    template_path: str,
+    dest_dir: str,
+    basepath: str = BASEPATH,
+    manifest: Optional[BuildManifest] = None,
+    jobs: int = 1,
+    cache: Optional[RenderCache] = None,
+    io_threads: int = 0,
+    template: Optional[Template] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    infos: Optional[Dict[str, dict]] = None,
+) -> None:
     """
     Crawl content_dir and generate HTML pages for each .md file.
+    With a manifest, unchanged pages are skipped and pages whose source
+    was removed are deleted from dest_dir. With jobs > 1 the pages are
+    rendered on a process pool; with io_threads > 0 they go through the
+    async I/O pipeline instead. With a cache, unchanged markdown is not
+    parsed again even when the page must be re-rendered. Pass a compiled
+    template to reuse it across builds. With shard=(index, count) only
+    that shard's pages are generated and no outputs are deleted. With
+    infos, the facts of every page written (see PageInfo) are stored
+    there by source path.
     """
+    if template is None:
+        template = Template.load(template_path, basepath)
+    if manifest is not None:
+        manifest.begin(template_path, basepath, template)
 #    if os.path.exists(dest_dir):
 #        shutil.rmtree(dest_dir)
     # Ensure static files exist
     os.makedirs(dest_dir, exist_ok=True)
-    for root, dirs, files in os.walk(content_dir):
-        for fname in files:
-            if not fname.lower().endswith('.md'):
+    pages = collect_pages(content_dir, dest_dir)
+    if shard is not None:
+        pages = shard_pages(pages, content_dir, *shard)
+    seen = [src_path for src_path, _ in pages]
+    if io_threads > 0:
+        generated = generate_pages_async(
+            pages, template_path, basepath, io_threads, manifest, cache, template=template,
+            infos=infos,
+        )
+    elif jobs > 1:
+        generated = generate_pages_parallel(
+            pages, template_path, basepath, jobs, manifest, cache, template, infos
+        )
+    else:
+        generated = 0
+        for src_path, dest_file in pages:
+            info = PageInfo() if infos is not None else None
+            if generate_page(
+                src_path, template_path, dest_file, basepath, manifest, template, cache, info
+            ):
+                generated += 1
+                if info is not None:
+                    infos[src_path] = info.to_dict()
+    if manifest is not None:
+        for removed in manifest.prune(seen, dest_dir, remove_outputs=shard is None):
+            print(f"Removing stale page {removed}")
+        print(f"Generated {generated} pages, {len(seen) - generated} unchanged")
+
+def check_links(
+    content_dir: str,
+    static_dir: str,
+    template_path: str,
+    index_path: str = SITE_INDEX_PATH,
+    template: Optional[Template] = None,
+    sources: Optional[SourceStats] = None,
+) -> int:
+    """
+    Update the persisted site index and report broken root-relative links
+    and images, and static files nothing refers to. Returns the number of
+    broken links. Links in the template's partials count as the
+    template's own; pass the compiled template to avoid loading them again,
+    and the source_stats() of content_dir to avoid walking it again.
+    """
+    index = SiteIndex.load(index_path)
+    scanned = index.update(content_dir, sources)
+    if template is None:
+        template = Template.load(template_path)
+    refs = template_references(template.source)
+    report = index.check(static_dir, refs)
+    index.save()
+    for src_path, target in report.broken:
+        print(f"Broken link in {src_path}: {target}")
+    for path in report.orphans:
+        print(f"Orphaned asset: {path}")
+    print(
+        f"Checked {len(index.pages)} pages ({scanned} rescanned): "
+        f"{len(report.broken)} broken links, {len(report.orphans)} orphaned assets"
+    )
+    return len(report.broken)
+
+class SiteBuilder:
+    """
+    A configured site build that can run many times in one process.
+
+    The builder keeps the compiled template (recompiled only when the
+    template file, its partials or the asset map changes), the build
+    manifest and the render caches between calls, so repeated builds from
+    a dev server or a preview service skip interpreter startup and
+    warm-up work.
+    build() writes the site like the command line does; render() and
+    render_pages() turn in-memory markdown into pages without touching
+    the disk. With shard=(index, count) build() renders only that share
+    of the pages; merge_shards() then combines the shards' manifests and
+    runs the steps that need the whole site.
+    """
+
+    def __init__(
+        self,
+        content_dir: str = "content",
+        static_dir: str = "static",
+        dest_dir: str = "docs",
+        template_path: str = "template.html",
+        basepath: str = BASEPATH,
+        state_dir: str = STATE_DIR,
+        incremental: bool = False,
+        explain: bool = False,
+        sync: bool = False,
+        checksum: bool = False,
+        link: str = "reflink",
+        cache: bool = False,
+        cache_size: int = DEFAULT_MAX_BYTES,
+        jobs: int = 1,
+        io_threads: int = 0,
+        optimize_images: bool = False,
+        fingerprint: bool = False,
+        minify: bool = False,
+        precompress: bool = False,
+        check_links: bool = False,
+        manifest_path: Optional[str] = None,
+        fragment_cache_size: int = 0,
+        shard: Optional[Tuple[int, int]] = None,
+        feeds: bool = False,
+        site_url: Optional[str] = None,
+        search: bool = False,
+    ):
+        if feeds and not site_url:
+            raise ValueError("feeds need the site_url the pages are published at")
+        if shard is not None and (optimize_images or fingerprint):
+            # Both change how every page renders, so they must be settled
+            # before the shards start rather than by one of them
+            raise ValueError("image optimization and fingerprinting cannot run in a shard")
+        self.content_dir = content_dir
+        self.static_dir = static_dir
+        self.dest_dir = dest_dir
+        self.template_path = template_path
+        self.basepath = basepath
+        self.state_dir = state_dir
+        self.incremental = incremental
+        self.explain = explain
+        self.sync = sync
+        self.checksum = checksum
+        self.link = link
+        self.jobs = jobs
+        self.io_threads = io_threads
+        self.optimize_images = optimize_images
+        self.fingerprint = fingerprint
+        self.minify = minify
+        self.precompress = precompress
+        self.check_links = check_links
+        self.manifest_path = manifest_path or os.path.join(state_dir, "manifest.json")
+        self.shard = shard
+        self.feeds = feeds
+        self.site_url = site_url
+        self.search = search
+        self.manifest: Optional[BuildManifest] = None
+        self.cache: Optional[RenderCache] = None
+        if cache or incremental:
+            self.cache = RenderCache(os.path.join(state_dir, "cache"), cache_size)
+        self.memory_cache = MemoryRenderCache()
+        self.fragment_cache: Optional[FragmentCache] = None
+        if fragment_cache_size:
+            self.fragment_cache = FragmentCache(fragment_cache_size)
+        self.image_hints: Dict[str, Dict[str, str]] = {}
+        self.asset_map: Dict[str, str] = {}
+        self._template: Optional[Template] = None
+        self._template_key = None
+
+    def _state(self, name: str) -> str:
+        return os.path.join(self.state_dir, name)
+
+    def _shard_manifest_path(self, index: int, count: int) -> str:
+        return self._state(os.path.join("shards", f"manifest-{index}-of-{count}.json"))
+
+    def _activate(self) -> None:
+        # Rendering settings are module-wide; make them this builder's
+        set_image_hints(self.image_hints)
+        set_asset_map(self.asset_map)
+        set_fragment_cache(self.fragment_cache)
+
+    def template(self) -> Template:
+        """
+        Return the compiled template, compiling it again only if the file,
+        one of its partials or the asset map changed since the last call.
+        """
+        includes = self._template.includes if self._template is not None else []
+        stats = []
+        for path in [self.template_path] + includes:
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        key = (tuple(stats), tuple(sorted(self.asset_map.items())))
+        if self._template is None or key != self._template_key:
+            self._template = Template.load(self.template_path, self.basepath)
+            self._template_key = key
+        return self._template
+
+    def build(self) -> int:
+        """
+        Build the site into dest_dir. Returns the number of broken links
+        found (always 0 unless check_links is set).
+        """
+        if self.shard is not None:
+            return self._build_shard()
+        print(f"\nStarting directory copy: {self.static_dir} -> {self.dest_dir}")
+        if self.incremental and self.manifest is None:
+            self.manifest = BuildManifest.load(self.manifest_path, self.static_dir, self.explain)
+        if self.sync or self.incremental:
+            # Keeps the pages generated by earlier runs in place. Optimized
+            # images are placed by optimize_images() instead, so the raw
+            # PNG is not copied over them on every run
+            sync_directory(
+                self.static_dir, self.dest_dir, self._state("assets.json"), self.checksum,
+                self.link, optimizable if self.optimize_images else None,
+            )
+        else:
+            copy_directory(self.static_dir, self.dest_dir)
+        if self.optimize_images:
+            self.image_hints = optimize_images(
+                self.static_dir, self.dest_dir, self._state("images"), link=self.link
+            )
+        if self.fingerprint:
+            self.asset_map = fingerprint_assets(
+                self.static_dir, self.dest_dir, self._state("asset-manifest.json"), self.link,
+                variant_paths(self.image_hints),
+            )
+        self._activate()
+        infos = self._page_infos()
+        generate_pages_recursive(
+            self.content_dir, self.template_path, self.dest_dir, self.basepath, self.manifest,
+            self.jobs, self.cache, self.io_threads, self.template(), infos=infos,
+        )
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.cache is not None:
+            self.cache.evict()
+        if self.fragment_cache is not None and self.jobs <= 1:
+            # Worker processes keep their own caches, not counted here
+            print(self.fragment_cache.stats())
+        return self._finish(infos)
+
+    def _build_shard(self) -> int:
+        index, count = self.shard
+        path = self._shard_manifest_path(index, count)
+        if self.incremental and self.manifest is not None:
+            manifest = self.manifest
+        elif self.incremental:
+            manifest = BuildManifest.load(path, self.static_dir, self.explain)
+        else:
+            # Still recorded, for the merge step
+            manifest = BuildManifest(path, self.static_dir, self.explain)
+        manifest.shard = self.shard
+        self.manifest = manifest
+        if index == 0:
+            print(f"\nStarting directory copy: {self.static_dir} -> {self.dest_dir}")
+            # Never wipe dest_dir: other shards may be writing into it
+            sync_directory(
+                self.static_dir, self.dest_dir, self._state("assets.json"), self.checksum, self.link
+            )
+        self._activate()
+        print(f"\nBuilding shard {index}/{count}")
+        generate_pages_recursive(
+            self.content_dir, self.template_path, self.dest_dir, self.basepath, manifest,
+            self.jobs, self.cache, self.io_threads, self.template(), self.shard,
+        )
+        manifest.save()
+        if self.cache is not None:
+            self.cache.evict()
+        return 0
+
+    def merge_shards(self, count: int) -> int:
+        """
+        Merge the manifests of a build split into count shards, delete the
+        outputs of pages removed since the last merge, then run the
+        site-wide post-processing and link check. Raises ValueError if the
+        shards are incomplete or two pages write the same output. Returns
+        the number of broken links found.
+        """
+        paths = [self._shard_manifest_path(i, count) for i in range(count)]
+        merged = BuildManifest.merge(paths, self.manifest_path, self.static_dir)
+        previous = BuildManifest.load(self.manifest_path, self.static_dir)
+        for removed in previous.prune(merged.pages, self.dest_dir):
+            print(f"Removing stale page {removed}")
+        # Outputs copied together from other machines have new mtimes
+        merged.refresh_outputs()
+        merged.save()
+        self.manifest = merged
+        print(f"Merged {count} shards: {len(merged.pages)} pages")
+        return self._finish()
+
+    def _page_infos(self) -> Optional[Dict[str, dict]]:
+        # Gather page facts while rendering only if a step reads the site index
+        return {} if self.feeds or self.check_links or self.search else None
+
+    def _finish(self, infos: Optional[Dict[str, dict]] = None) -> int:
+        # Steps that need the whole site in dest_dir
+        sources = None
+        if self.feeds or self.check_links or self.search:
+            # The site and search indexes check the same sources; walk
+            # content_dir once for all of them
+            sources = source_stats(self.content_dir)
+        if self.feeds or self.check_links:
+            # Pages rendered by this build are indexed from what rendering
+            # gathered; update() then only reads sources it did not render
+            index = SiteIndex.load(self._state("siteindex.json"))
+            for src_path, info in (infos or {}).items():
+                index.record(src_path, self.content_dir, info)
+            index.update(self.content_dir, sources)
+            index.save()
+        if self.feeds:
+            write_feeds(
+                index, self.dest_dir, self.template(), self.site_url, self.basepath,
+                self._state("feeds.json"),
+            )
+        if self.search:
+            build_search_index(
+                self.content_dir, self.dest_dir, self._state("search.json"), self.basepath, infos,
+                sources,
+            )
+        if self.minify or self.precompress:
+            postprocess_directory(
+                self.dest_dir, self._state("postprocess.json"), self.minify, self.precompress
+            )
+            if self.minify and (self.sync or self.incremental):
+                # Minified assets differ from static/ now; keep the next
+                # sync from copying the originals back over them
+                record_rewrites(
+                    self.static_dir, self.dest_dir, self._state("assets.json"), self.checksum
+                )
+            if self.minify and self.manifest is not None:
+                # Minified pages are still the outputs the manifest describes
+                self.manifest.refresh_outputs()
+                self.manifest.save()
+        if not self.check_links:
+            return 0
+        return check_links(
+            self.content_dir, self.static_dir, self.template_path, self._state("siteindex.json"),
+            self.template(), sources,
+        )
+
+    def update(self, changed: List[str], removed: List[str] = ()) -> List[str]:
+        """
+        Bring dest_dir up to date after the given source files changed or
+        were removed, redoing only what they affect: the page of a markdown
+        file, the copy of a static file (and the image and fingerprint
+        steps, when enabled), and every page after an edit to the template
+        or a partial or a change of the asset map or image hints. The
+        site-wide steps of build() then run again. Returns the output
+        paths written or removed.
+        """
+        content_dir = os.path.normpath(self.content_dir)
+        static_dir = os.path.normpath(self.static_dir)
+        layout_dir = os.path.normpath(partials_dir(self.template_path))
+        changed = {os.path.normpath(path) for path in changed}
+        removed = {os.path.normpath(path) for path in removed}
+        outputs = []
+
+        static = sorted(p for p in changed | removed if p.startswith(static_dir + os.sep))
+        for path in static:
+            output = os.path.join(self.dest_dir, os.path.relpath(path, static_dir))
+            if path in removed:
+                if not os.path.exists(output):
+                    continue
+                print(f"Removing {output}")
+                os.remove(output)
+            elif not (self.optimize_images and optimizable(path)):
+                # optimize_images() places the optimized copy below
+                print(f"Copying {path} to {output}")
+                transfer_file(path, output, self.link)
+            outputs.append(output)
+        previous = (self.image_hints, self.asset_map)
+        if static and self.optimize_images:
+            self.image_hints = optimize_images(
+                self.static_dir, self.dest_dir, self._state("images"), link=self.link
+            )
+        if static and self.fingerprint:
+            self.asset_map = fingerprint_assets(
+                self.static_dir, self.dest_dir, self._state("asset-manifest.json"), self.link,
+                variant_paths(self.image_hints),
+            )
+        self._activate()
+        template = self.template()
+        every_page = (self.image_hints, self.asset_map) != previous or any(
+            path == os.path.normpath(self.template_path) or path.startswith(layout_dir + os.sep)
+            for path in changed | removed
+        )
+
+        pages = collect_pages(self.content_dir, self.dest_dir)
+        if self.manifest is not None:
+            self.manifest.begin(self.template_path, self.basepath, template)
+        infos = self._page_infos()
+        for src_path, dest_path in pages:
+            if not every_page and os.path.normpath(src_path) not in changed:
                 continue
-            src_path = os.path.join(root, fname)
-            rel_dir = os.path.relpath(root, content_dir)
-            dest_subdir = os.path.join(dest_dir, rel_dir) if rel_dir != '.' else dest_dir
-            os.makedirs(dest_subdir, exist_ok=True)
-            dest_file = os.path.join(dest_subdir, os.path.splitext(fname)[0] + '.html')
-            generate_page(src_path, template_path, dest_file)
+            info = PageInfo() if infos is not None else None
+            if generate_page(
+                src_path, self.template_path, dest_path, self.basepath, self.manifest,
+                template, self.cache, info,
+            ):
+                outputs.append(dest_path)
+                if info is not None:
+                    infos[src_path] = info.to_dict()
+        for path in sorted(removed):
+            if not path.startswith(content_dir + os.sep) or not path.lower().endswith(".md"):
+                continue
+            output = page_dest(path, content_dir, self.dest_dir)
+            if os.path.exists(output):
+                print(f"Removing {output}")
+                os.remove(output)
+                outputs.append(output)
+        if self.manifest is not None:
+            self.manifest.prune([src_path for src_path, _ in pages], self.dest_dir)
+            self.manifest.save()
+        if outputs:
+            self._finish(infos)
+        return outputs
+
+    def render(self, md: str) -> str:
+        """
+        Render markdown source into a full page in memory.
+        """
+        self._activate()
+        return render_page(md, self.template(), self.memory_cache)
+
+    def render_pages(self, sources: Dict[str, str]) -> Dict[str, str]:
+        """
+        Render in-memory sources keyed by path relative to the content
+        directory ("blog/post/index.md") into pages keyed by output path
+        ("blog/post/index.html").
+        """
+        self._activate()
+        template = self.template()
+        return {
+            os.path.splitext(rel_path)[0] + ".html": render_page(md, template, self.memory_cache)
+            for rel_path, md in sources.items()
+        }
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """
+    "2/4" -> (2, 4), for --shard.
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected INDEX/COUNT, got {text!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..COUNT-1, got {text!r}")
+    return index, count
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the static site into docs/.")
+    parser.add_argument("basepath", nargs="?", default=BASEPATH,
+                        help="prefix for root-relative href/src links (default: /)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild pages whose source, template, basepath or "
+                             "embedded images changed")
+    parser.add_argument("--explain", action="store_true",
+                        help="print why each page is rebuilt (implies --incremental)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH,
+                        help=f"build manifest used by --incremental (default: {MANIFEST_PATH})")
+    parser.add_argument("--sync", action="store_true",
+                        help="copy only changed static files instead of wiping docs/ "
+                             "(implied by --incremental)")
+    parser.add_argument("--checksum", action="store_true",
+                        help="with --sync, compare file contents when size matches but mtime differs")
+    parser.add_argument("--link", choices=LINK_MODES, default="reflink",
+                        help="with --sync, how to place files on the same filesystem (default: reflink)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse content rendered by earlier builds (implied by --incremental)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="render cache size limit in MiB (default: %(default)s)")
+    parser.add_argument("--fragment-cache", type=int, default=0, metavar="MIB",
+                        help="memory budget of an LRU cache of rendered blocks shared "
+                             f"by all pages (default: off; {DEFAULT_FRAGMENT_BYTES // (1024 * 1024)} "
+                             "is a good start)")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="delete the render and image caches and exit")
+    parser.add_argument("--optimize-images", action="store_true",
+                        help="recompress PNGs, add resized variants and give <img> tags "
+                             "width, height and srcset; derivatives are cached in "
+                             f"{IMAGE_CACHE_DIR}")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="add content-hashed copies of static files and point "
+                             "href/src URLs at them")
+    parser.add_argument("--minify", action="store_true",
+                        help="collapse whitespace in HTML and CSS output outside <pre>")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br with the brotli module) sidecars of text output")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="render pages on N worker processes (0 = one per CPU)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap reads, conversion and writes in an async I/O pipeline")
+    parser.add_argument("--io-threads", type=int, default=8,
+                        help="threads for blocking file calls with --pipeline (default: 8)")
+    parser.add_argument("--inline-parser", choices=sorted(INLINE_PARSERS), default="scan",
+                        help="inline markdown parser implementation (default: scan)")
+    parser.add_argument("--stream-threshold", type=int, default=STREAM_THRESHOLD // (1024 * 1024),
+                        help="convert sources of at least this many MiB line by line "
+                             "in bounded memory; 0 streams every page (default: %(default)s)")
+    parser.add_argument("--check-links", action="store_true",
+                        help="report broken internal links and unused static files; "
+                             "exits with status 1 on broken links")
+    parser.add_argument("--feeds", action="store_true",
+                        help="write blog/index.html, feed.xml and sitemap.xml from the "
+                             "site index (needs --site-url)")
+    parser.add_argument("--site-url",
+                        help="address the site is published at, such as "
+                             "https://example.github.io, for absolute URLs in feeds")
+    parser.add_argument("--search", action="store_true",
+                        help="write a prefix-sharded search index of the page text "
+                             "into docs/search/")
+    parser.add_argument("--shard", type=parse_shard, metavar="INDEX/COUNT",
+                        help="build only this share of the pages, for running COUNT "
+                             "builds in parallel; shard 0 also copies static/")
+    parser.add_argument("--merge-shards", type=int, metavar="COUNT",
+                        help="combine the manifests of a --shard build, remove stale "
+                             "pages and run --feeds, --search, --minify, --precompress "
+                             "and --check-links")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every build stage and page and print a report (forces --jobs 1)")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="number of slowest pages to list with --profile (default: 10)")
+    parser.add_argument("--profile-out",
+                        help="with --profile, write stats as JSON, or cProfile data for *.prof")
+    parser.add_argument("--watch", action="store_true",
+                        help="after building, rebuild changed pages and assets as they change")
+    parser.add_argument("--serve", action="store_true",
+                        help="like --watch, and serve docs/ locally with live reload")
+    parser.add_argument("--port", type=int, default=8000,
+                        help="port for --serve (default: 8000)")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("--jobs must be >= 0")
+    if args.jobs == 0:
+        args.jobs = os.cpu_count() or 1
+    if args.pipeline and args.jobs > 1:
+        parser.error("--pipeline and --jobs are mutually exclusive")
+    if args.io_threads < 1:
+        parser.error("--io-threads must be >= 1")
+    if args.explain:
+        args.incremental = True
+    if args.shard is not None:
+        site_wide = [flag for flag, on in (
+            ("--optimize-images", args.optimize_images), ("--fingerprint", args.fingerprint),
+            ("--feeds", args.feeds), ("--search", args.search), ("--minify", args.minify),
+            ("--precompress", args.precompress), ("--check-links", args.check_links),
+            ("--merge-shards", args.merge_shards), ("--watch", args.watch),
+            ("--serve", args.serve),
+        ) if on]
+        if site_wide:
+            parser.error(f"{', '.join(site_wide)} cannot be combined with --shard")
+    if args.feeds and not args.site_url:
+        parser.error("--feeds needs --site-url")
+    if args.merge_shards is not None and args.merge_shards < 1:
+        parser.error("--merge-shards must be >= 1")
+    return args
+
+def main(argv=None):
+    global STREAM_THRESHOLD
+    args = parse_args(argv)
+    set_inline_parser(args.inline_parser)
+    STREAM_THRESHOLD = args.stream_threshold * 1024 * 1024
+    if args.clear_cache:
+        RenderCache(CACHE_DIR).clear()
+        ImageCache(IMAGE_CACHE_DIR).clear()
+        print(f"Cleared render cache {CACHE_DIR} and image cache {IMAGE_CACHE_DIR}")
+        return
 
-def main():
     # Example TextNode usage
     node = TextNode(
         "This is some anchor text",
@@ -68,15 +1064,60 @@ def main():
     )
     print(node)
 
-    # Generate static site: copy from 'static' to 'public'
-    src_dir = 'static'
-    dst_dir = 'docs'
-    template_path = 'template.html'
+    builder = SiteBuilder(
+        basepath=args.basepath,
+        incremental=args.incremental,
+        explain=args.explain,
+        sync=args.sync,
+        checksum=args.checksum,
+        link=args.link,
+        cache=args.cache,
+        cache_size=args.cache_size * 1024 * 1024,
+        jobs=args.jobs,
+        io_threads=args.io_threads if args.pipeline else 0,
+        optimize_images=args.optimize_images,
+        fingerprint=args.fingerprint,
+        minify=args.minify,
+        precompress=args.precompress,
+        check_links=args.check_links,
+        manifest_path=args.manifest,
+        fragment_cache_size=args.fragment_cache * 1024 * 1024,
+        shard=args.shard,
+        feeds=args.feeds,
+        site_url=args.site_url,
+        search=args.search,
+    )
+    if args.merge_shards is not None:
+        try:
+            return 1 if builder.merge_shards(args.merge_shards) else 0
+        except ValueError as e:
+            print(f"Cannot merge shards:\n{e}")
+            return 1
+
+    profiler = None
+    if args.profile:
+        profiler = BuildProfiler(use_cprofile=profile_output_needs_cprofile(args.profile_out))
+        profiler.instrument(sys.modules[__name__])
+        if args.jobs > 1 or args.pipeline:
+            print("--profile runs a serial build; ignoring --jobs and --pipeline")
+            builder.jobs = 1
+            builder.io_threads = 0
+        profiler.start()
+
+    broken = builder.build()
+    if profiler is not None:
+        profiler.stop()
+        profiler.restore()
+        print()
+        print(profiler.report(args.profile_top))
+        if args.profile_out:
+            profiler.dump(args.profile_out)
+            print(f"Wrote profile to {args.profile_out}")
 
-    # Announce the copy
-    print(f"\nStarting directory copy: {src_dir} -> {dst_dir}")
-    copy_directory(src_dir, dst_dir)
-    generate_pages_recursive('content', template_path, dst_dir)
+    if args.watch or args.serve:
+        from devserver import SiteWatcher, watch
+        watch(SiteWatcher(builder), args.port if args.serve else None)
+    return 1 if broken else 0
 
 #    generate_page("content/index.md", "template.html", "public/index.html")
 #    generate_page("content/blog/glorfindel/index.md", "template.html", "public/blog/glorfindel/index.html")
@@ -86,4 +1127,4 @@ def main():
 #
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,320 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from htmlnode import image_hints
+from markdown_utils import extract_markdown_images, extract_markdown_links, iter_markdown_blocks
+from siteindex import template_references
+from statefile import write_json
+from template import Template, asset_url, partial_paths, partials_dir
+
+MANIFEST_VERSION = 5
+
+
+def file_hash(path: str) -> str:
+    """
+    Return the sha256 hex digest of a file, read in fixed-size chunks.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _site_absolute(url: str) -> bool:
+    return url.startswith("/") and not url.startswith("//")
+
+
+def scan_urls(lines: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Return the site-absolute image and link URLs in markdown lines (such
+    as an open file), as written. Only one block is held in memory at a
+    time, so sources the renderer streams stay in bounded memory.
+    """
+    images = set()
+    links = set()
+    for block in iter_markdown_blocks(lines):
+        images.update(url for _, url in extract_markdown_images(block) if _site_absolute(url))
+        links.update(url for _, url in extract_markdown_links(block) if _site_absolute(url))
+    return sorted(images), sorted(links)
+
+
+def _image_paths(urls: Iterable[str], static_dir: str) -> List[str]:
+    deps = set()
+    for url in urls:
+        path = url.split("#", 1)[0].split("?", 1)[0].lstrip("/")
+        if path:
+            deps.add(os.path.join(static_dir, path))
+    return sorted(deps)
+
+
+def image_dependencies(md: str, static_dir: str) -> List[str]:
+    """
+    Return the static files a page embeds: site-absolute image URLs from
+    the markdown, resolved against static_dir. External and relative
+    URLs are ignored.
+    """
+    return _image_paths(scan_urls(md.split("\n"))[0], static_dir)
+
+
+class BuildManifest:
+    """
+    On-disk dependency graph of the last build.
+
+    Each page entry maps a source markdown path to its output and to the
+    inputs it was built from: the source hash, the BASEPATH, the hash of
+    every file it depends on (the template, the partials it includes and
+    the static images the page embeds), the <img> size hints it was
+    rendered with, and the fingerprinted names its static URLs were
+    rewritten to. A page is stale exactly when one of its own inputs
+    changed, so editing an image only rebuilds the pages that show it.
+    The size and mtime of the output itself are recorded too, so an
+    output overwritten by another build (such as a non-incremental one
+    for a different BASEPATH) is not mistaken for fresh.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, static_dir: str = "static", explain: bool = False
+    ):
+        self.path = path
+        self.static_dir = static_dir
+        # Print why each page is rebuilt (--explain)
+        self.explain = explain
+        self.template_path: Optional[str] = None
+        self.basepath: Optional[str] = None
+        self._template_urls: Optional[List[str]] = None
+        self._template_includes: Optional[List[str]] = None
+        # (index, count) when this manifest covers one shard of the pages
+        self.shard: Optional[Tuple[int, int]] = None
+        self.pages: Dict[str, dict] = {}
+        # Hashes of the current files, computed at most once per build
+        self._hashes: Dict[str, Optional[str]] = {}
+
+    @classmethod
+    def load(
+        cls, path: str, static_dir: str = "static", explain: bool = False
+    ) -> "BuildManifest":
+        """
+        Load a manifest from path. A missing, unreadable or outdated file
+        yields an empty manifest, which simply forces a full build.
+        """
+        manifest = cls(path, static_dir, explain)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+        manifest.pages = data.get("pages", {})
+        if data.get("shard") is not None:
+            manifest.shard = tuple(data["shard"])
+        return manifest
+
+    @classmethod
+    def merge(
+        cls, shard_paths: List[str], path: str, static_dir: str = "static"
+    ) -> "BuildManifest":
+        """
+        Combine the manifests written by the shards of one build into a
+        manifest for the whole site. Raises ValueError listing every
+        problem: a missing, outdated or misnumbered shard manifest, a page
+        claimed by two shards, or two pages writing the same output.
+        """
+        merged = cls(path, static_dir)
+        problems = []
+        count = len(shard_paths)
+        owners: Dict[str, str] = {}
+        for index, shard_path in enumerate(shard_paths):
+            try:
+                with open(shard_path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                problems.append(f"cannot read shard manifest {shard_path}: {e}")
+                continue
+            if data.get("version") != MANIFEST_VERSION:
+                problems.append(f"{shard_path} was written by another manifest version")
+                continue
+            if data.get("shard") != [index, count]:
+                problems.append(f"{shard_path} is not shard {index}/{count}")
+                continue
+            for src_path, entry in data.get("pages", {}).items():
+                if src_path in merged.pages:
+                    problems.append(f"{src_path} was built by more than one shard")
+                    continue
+                output = entry.get("output")
+                if output in owners:
+                    problems.append(
+                        f"output collision: {output} is written by {owners[output]} and {src_path}"
+                    )
+                    continue
+                owners[output] = src_path
+                merged.pages[src_path] = entry
+        if problems:
+            raise ValueError("\n".join(problems))
+        return merged
+
+    def save(self) -> None:
+        if self.path is None:
+            raise ValueError("BuildManifest has no path to save to")
+        data = {"version": MANIFEST_VERSION, "pages": self.pages}
+        if self.shard is not None:
+            data["shard"] = list(self.shard)
+        write_json(self.path, data, indent=1, sort_keys=True)
+
+    def begin(
+        self, template_path: str, basepath: str, template: Optional[Template] = None
+    ) -> None:
+        """
+        Start a build with the given template and BASEPATH. Input hashes
+        cached by a previous build are dropped. Pass the compiled template
+        to take its partials and URLs from it instead of the file.
+        """
+        self.template_path = template_path
+        self.basepath = basepath
+        self._hashes = {}
+        self._template_urls = None
+        self._template_includes = None
+        if template is not None:
+            self._template_urls = template_references(template.source)
+            self._template_includes = template.includes
+
+    def current_hash(self, path: str) -> Optional[str]:
+        """
+        Hash of path as it is now, or None if it does not exist.
+        """
+        if path not in self._hashes:
+            self._hashes[path] = file_hash(path) if os.path.isfile(path) else None
+        return self._hashes[path]
+
+    def stale_reasons(self, src_path: str, dest_path: str) -> List[str]:
+        """
+        Explain why dest_path must be rebuilt from src_path. An empty list
+        means the output is up to date.
+        """
+        entry = self.pages.get(src_path)
+        if entry is None:
+            return ["new page"]
+        if entry.get("output") != dest_path:
+            return ["output path changed"]
+        output_state = _output_state(dest_path)
+        if output_state is None:
+            return ["output missing"]
+        if output_state != entry.get("output_state"):
+            return ["output was overwritten"]
+        reasons = []
+        if self.current_hash(src_path) != entry.get("hash"):
+            reasons.append(f"{src_path} changed")
+        if entry.get("basepath") != self.basepath:
+            reasons.append(f"basepath changed to {self.basepath}")
+        deps = entry.get("deps", {})
+        if self.template_path not in deps:
+            reasons.append(f"template is now {self.template_path}")
+        for dep, old_hash in sorted(deps.items()):
+            new_hash = self.current_hash(dep)
+            if new_hash == old_hash:
+                continue
+            if new_hash is None:
+                reasons.append(f"{dep} removed")
+            elif old_hash is None:
+                reasons.append(f"{dep} added")
+            else:
+                reasons.append(f"{dep} changed")
+        hints = image_hints()
+        for url, old_hints in sorted(entry.get("hints", {}).items()):
+            if hints.get(url) != old_hints:
+                reasons.append(f"size hints for {url} changed")
+        for url, old_url in sorted(entry.get("assets", {}).items()):
+            if asset_url(url) != old_url:
+                reasons.append(f"fingerprint of {url} changed")
+        return reasons
+
+    def needs_build(self, src_path: str, dest_path: str) -> bool:
+        """
+        True if dest_path is stale; with explain set, also print why.
+        """
+        reasons = self.stale_reasons(src_path, dest_path)
+        if reasons and self.explain:
+            print(f"Rebuilding {dest_path}: {'; '.join(reasons)}")
+        return bool(reasons)
+
+    def record(self, src_path: str, dest_path: str) -> None:
+        """
+        Record the inputs dest_path was just built from. The source is read
+        again, one block at a time, to find the images and links it has.
+        """
+        with open(src_path, encoding="utf-8") as f:
+            images, links = scan_urls(f)
+        if self._template_urls is None:
+            with open(self.template_path, encoding="utf-8") as f:
+                source = f.read()
+            self._template_urls = template_references(source)
+            self._template_includes = partial_paths(source, partials_dir(self.template_path))
+        deps = (
+            [self.template_path] + self._template_includes
+            + _image_paths(images, self.static_dir)
+        )
+        hints = image_hints()
+        urls = set(self._template_urls) | set(images) | set(links)
+        self.pages[src_path] = {
+            "hash": self.current_hash(src_path),
+            "output": dest_path,
+            "basepath": self.basepath,
+            "deps": {dep: self.current_hash(dep) for dep in deps},
+            "hints": {url: hints.get(url) for url in images},
+            "assets": {url: asset_url(url) for url in sorted(urls)},
+            "output_state": _output_state(dest_path),
+        }
+
+    def refresh_outputs(self) -> None:
+        """
+        Record the current size and mtime of every output, after a step
+        such as minification rewrote them in place.
+        """
+        for entry in self.pages.values():
+            state = _output_state(entry.get("output") or "")
+            if state is not None:
+                entry["output_state"] = state
+
+    def prune(
+        self, seen_sources: Iterable[str], dest_dir: str, remove_outputs: bool = True
+    ) -> List[str]:
+        """
+        Forget every source not in seen_sources and delete its output,
+        along with any directories under dest_dir left empty by it.
+        Returns the list of output paths that were removed. A shard passes
+        remove_outputs=False: a page missing from its share may have moved
+        to another shard, so only the merge step deletes outputs.
+        """
+        seen = set(seen_sources)
+        removed = []
+        for src_path in sorted(set(self.pages) - seen):
+            output = self.pages.pop(src_path).get("output")
+            if remove_outputs and output and os.path.exists(output):
+                os.remove(output)
+                removed.append(output)
+                _remove_empty_parents(os.path.dirname(output), dest_dir)
+        return removed
+
+
+def _output_state(path: str) -> Optional[List[int]]:
+    # [size, mtime_ns], as stored in the manifest, or None if path is missing
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _remove_empty_parents(directory: str, stop_dir: str) -> None:
+    # Walk upwards removing directories left empty by a deleted page
+    stop_dir = os.path.abspath(stop_dir)
+    while (
+        os.path.abspath(directory).startswith(stop_dir + os.sep)
+        and os.path.isdir(directory)
+        and not os.listdir(directory)
+    ):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
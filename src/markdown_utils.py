@@ -1,10 +1,19 @@
 import re
 import textwrap
-from typing import List
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
 from enum import Enum
 from textnode import TextNode, TextType
-from htmlnode import text_node_to_html_node, LeafNode, ParentNode
+from htmlnode import text_node_to_html_node, HTMLNode, LeafNode, ParentNode
+from rendercache import FragmentCache
 
+IMAGE_RE = re.compile(r'!\[([^\]]*)\]\(([^\)]+)\)')
+# To avoid capturing images, negative lookbehind for '!'
+LINK_RE = re.compile(r'(?<!!)\[([^\]]+)\]\(([^\)]+)\)')
+# Shared tag strings, so headings don't each allocate their own
+HEADING_TAGS = ("", "h1", "h2", "h3", "h4", "h5", "h6")
+# Search terms: runs of word characters, lowercased; see PageInfo.terms
+TERM_RE = re.compile(r"\w+")
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     """
@@ -38,8 +47,7 @@ def extract_markdown_images(text: str):
     Extract markdown image tags of the form ![alt](url) from text.
     Returns list of (alt, url) tuples.
     """
-    pattern = r'!\[([^\]]*)\]\(([^\)]+)\)'
-    return re.findall(pattern, text)
+    return IMAGE_RE.findall(text)
 
 
 def extract_markdown_links(text: str):
@@ -47,23 +55,20 @@ def extract_markdown_links(text: str):
     Extract markdown link tags of the form [text](url) from text.
     Returns list of (text, url) tuples.
     """
-    # To avoid capturing images, negative lookbehind for '!'
-    pattern = r'(?<!!)\[([^\]]+)\]\(([^\)]+)\)'
-    return re.findall(pattern, text)
+    return LINK_RE.findall(text)
 
 def split_nodes_image(old_nodes):
     """
     Split plain TextNode objects around markdown image syntax into Text and Image nodes.
     """
     new_nodes = []
-    image_pattern = re.compile(r'!\[([^\]]*)\]\(([^\)]+)\)')
     for node in old_nodes:
         if node.text_type != TextType.PLAIN:
             new_nodes.append(node)
             continue
         text = node.text
         last_end = 0
-        for m in image_pattern.finditer(text):
+        for m in IMAGE_RE.finditer(text):
             # preceding text
             if m.start() > last_end:
                 new_nodes.append(TextNode(text[last_end:m.start()], TextType.PLAIN))
@@ -81,14 +86,13 @@ def split_nodes_link(old_nodes):
     Split plain TextNode objects around markdown link syntax into Text and Link nodes.
     """
     new_nodes = []
-    link_pattern = re.compile(r'(?<!!)\[([^\]]+)\]\(([^\)]+)\)')
     for node in old_nodes:
         if node.text_type != TextType.PLAIN:
             new_nodes.append(node)
             continue
         text = node.text
         last_end = 0
-        for m in link_pattern.finditer(text):
+        for m in LINK_RE.finditer(text):
             if m.start() > last_end:
                 new_nodes.append(TextNode(text[last_end:m.start()], TextType.PLAIN))
             anchor, url = m.groups()
@@ -116,14 +120,136 @@ def text_to_textnodes(text: str):
     nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
     return nodes
 
+
+def _scan_delimiters(text: str, out: list) -> None:
+    # Equivalent to the code, bold and italic split_nodes_delimiter passes:
+    # each even (plain) part of one split is split again by the next delimiter
+    for i, code_part in enumerate(text.split("`")):
+        if i % 2:
+            out.append(TextNode(code_part, TextType.CODE))
+            continue
+        for j, bold_part in enumerate(code_part.split("**")):
+            if j % 2:
+                out.append(TextNode(bold_part, TextType.BOLD))
+                continue
+            for k, part in enumerate(bold_part.split("_")):
+                out.append(TextNode(part, TextType.ITALIC if k % 2 else TextType.PLAIN))
+
+
+def _scan_links(text: str, start: int, end: int, out: list) -> None:
+    for link in LINK_RE.finditer(text, start, end):
+        if link.start() > start:
+            _scan_delimiters(text[start:link.start()], out)
+        anchor, url = link.groups()
+        out.append(TextNode(anchor, TextType.LINK, url))
+        start = link.end()
+    if start < end:
+        _scan_delimiters(text[start:end], out)
+
+
+def scan_textnodes(text: str):
+    """
+    Single-pass equivalent of text_to_textnodes.
+    Sweeps the text left to right once, emitting the same TextNode sequence
+    without building the intermediate node lists of the chained passes.
+    """
+    nodes = []
+    last_end = 0
+    # Images take precedence over links, so links are only searched for in
+    # the gaps between images, exactly as split_nodes_link sees them.
+    for image in IMAGE_RE.finditer(text):
+        _scan_links(text, last_end, image.start(), nodes)
+        alt, url = image.groups()
+        nodes.append(TextNode(alt, TextType.IMAGE, url))
+        last_end = image.end()
+    _scan_links(text, last_end, len(text), nodes)
+    return nodes
+
+
+
+INLINE_PARSERS = {
+    "scan": scan_textnodes,
+    "chained": text_to_textnodes,
+}
+_inline_parser = scan_textnodes
+
+
+def set_inline_parser(name: str) -> None:
+    """
+    Select the inline parser used by markdown_to_html_node by name.
+    """
+    global _inline_parser
+    if name not in INLINE_PARSERS:
+        raise ValueError(f"Unknown inline parser: {name!r}")
+    _inline_parser = INLINE_PARSERS[name]
+
+def inline_parser() -> str:
+    """
+    Name of the selected inline parser, for set_inline_parser in a worker.
+    """
+    for name, parser in INLINE_PARSERS.items():
+        if parser is _inline_parser:
+            return name
+    raise ValueError("The inline parser is not one of INLINE_PARSERS")
+
+# Optional cache of rendered blocks shared by every page; see set_fragment_cache
+_fragment_cache: Optional[FragmentCache] = None
+
+
+def set_fragment_cache(cache: Optional[FragmentCache]) -> None:
+    """
+    Use cache for rendered block fragments, or disable it with None.
+    """
+    global _fragment_cache
+    _fragment_cache = cache
+
+
+def fragment_cache() -> Optional[FragmentCache]:
+    return _fragment_cache
+
 def markdown_to_blocks(markdown: str) -> List[str]:
     """
     Split a raw markdown document into block strings separated by blank lines.
+    Blank lines inside fenced code blocks do not end the block.
     """
+    if "```" in markdown:
+        return list(iter_markdown_blocks(markdown.split("\n")))
     blocks = markdown.split("\n\n")
     stripped = [block.strip() for block in blocks]
     return [block for block in stripped if block]
 
+
+def _is_fence(stripped_line: str) -> bool:
+    # A line that opens or closes a fence; "```x```" on one line does neither
+    return stripped_line.startswith("```") and (
+        stripped_line == "```" or not stripped_line.endswith("```")
+    )
+
+
+def iter_markdown_blocks(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Lazily split markdown lines (such as an open file) into blocks.
+    Produces the same blocks as markdown_to_blocks while holding only the
+    current block in memory.
+    """
+    buf = []
+    in_fence = False
+    for line in lines:
+        if line.endswith("\n"):
+            line = line[:-1]
+        if line == "" and not in_fence:
+            block = "\n".join(buf).strip()
+            if block:
+                yield block
+            buf = []
+            continue
+        if _is_fence(line.strip()):
+            in_fence = not in_fence
+        buf.append(line)
+    block = "\n".join(buf).strip()
+    if block:
+        yield block
+
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
     HEADING = "heading"
@@ -133,81 +259,202 @@ class BlockType(Enum):
     ORDERED_LIST = "ordered_list"
 
 
-def block_to_block_type(block: str) -> BlockType:
+class Block(NamedTuple):
+    """
+    A classified block with its payload already extracted: the inline text
+    for headings, quotes and paragraphs, the item texts for lists, and the
+    dedented body for code.
+    """
+    type: BlockType
+    content: Union[str, List[str]]
+    level: int = 0
+
+
+HEADING_RE = re.compile(r'(#{1,6}) +(.*)')
+ORDERED_ITEM_RE = re.compile(r'(\d+)\. +(.*)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def parse_block(block: str) -> Block:
+    """
+    Classify a block and extract its payload in a single scan of its lines.
+    """
     # Heading: starts with 1-6 '#' + space
-    if re.match(r'^#{1,6} ', block):
-        return BlockType.HEADING
+    m = HEADING_RE.match(block)
+    if m:
+        return Block(BlockType.HEADING, m.group(2), len(m.group(1)))
+    lines = block.split('\n')
     # Code block: starts and ends with triple backticks
     if block.startswith("```") and block.strip().endswith("```"):
-        return BlockType.CODE
+        code_text = textwrap.dedent("\n".join(lines[1:-1])) + '\n'
+        return Block(BlockType.CODE, code_text)
     # Quote block: every line starts with '>'
-    lines = block.split('\n')
     if all(line.startswith('>') for line in lines):
-        return BlockType.QUOTE
+        text = '\n'.join(line.lstrip('> ').rstrip() for line in lines)
+        return Block(BlockType.QUOTE, text)
     # Unordered list: every line starts with '- '
-    if all(re.match(r'^- ', line) for line in lines):
-        return BlockType.UNORDERED_LIST
+    if all(line.startswith('- ') for line in lines):
+        return Block(BlockType.UNORDERED_LIST, [line[2:] for line in lines])
     # Ordered list: lines start at 1.,2.,... increment
-    nums = []
-    for line in lines:
-        m = re.match(r'^(\d+)\. ', line)
-        if not m:
-            nums = []
-            break
-        nums.append(int(m.group(1)))
-    if nums and nums == list(range(1, len(nums)+1)):
-        return BlockType.ORDERED_LIST
+    if block[:1].isdigit():
+        items = []
+        for expected, line in enumerate(lines, 1):
+            m = ORDERED_ITEM_RE.match(line)
+            if not m or int(m.group(1)) != expected:
+                break
+            items.append(m.group(2))
+        else:
+            return Block(BlockType.ORDERED_LIST, items)
     # Default paragraph
-    return BlockType.PARAGRAPH
+    return Block(BlockType.PARAGRAPH, WHITESPACE_RE.sub(' ', block.strip()))
+
+
+def block_to_block_type(block: str) -> BlockType:
+    return parse_block(block).type
+
+
+def _inline_children(text: str, nodes: Optional[List[TextNode]] = None) -> List[LeafNode]:
+    parsed = _inline_parser(text)
+    if nodes is not None:
+        nodes.extend(parsed)
+    return [text_node_to_html_node(n) for n in parsed]
+
+
+def block_to_html_node(block: Block, nodes: Optional[List[TextNode]] = None) -> ParentNode:
+    """
+    Render a parsed Block as its HTML element. The inline TextNodes parsed
+    on the way are appended to nodes, if given.
+    """
+    btype = block.type
+    if btype == BlockType.PARAGRAPH:
+        return ParentNode('p', _inline_children(block.content, nodes))
+    if btype == BlockType.HEADING:
+        return ParentNode(HEADING_TAGS[block.level], _inline_children(block.content, nodes))
+    if btype == BlockType.CODE:
+        return ParentNode('pre', [LeafNode('code', block.content)])
+    if btype == BlockType.QUOTE:
+        return ParentNode('blockquote', _inline_children(block.content, nodes))
+    tag = 'ul' if btype == BlockType.UNORDERED_LIST else 'ol'
+    return ParentNode(
+        tag, [ParentNode('li', _inline_children(item, nodes)) for item in block.content]
+    )
+
+
+class BlockInfo(NamedTuple):
+    """
+    What the site and search indexes need from a rendered block: the
+    targets of its links and images, whether it is a paragraph with text
+    besides links and images, which can serve as the page summary, and
+    the counts of the terms in its text.
+    """
+    links: Tuple[str, ...]
+    images: Tuple[str, ...]
+    has_text: bool
+    terms: Dict[str, int]
+
+
+def _block_info(block: Block, nodes: List[TextNode]) -> BlockInfo:
+    links = tuple(n.url for n in nodes if n.text_type == TextType.LINK)
+    images = tuple(n.url for n in nodes if n.text_type == TextType.IMAGE)
+    has_text = block.type == BlockType.PARAGRAPH and any(
+        n.text_type not in (TextType.LINK, TextType.IMAGE) and any(c.isalnum() for c in n.text)
+        for n in nodes
+    )
+    # Link text and image alt text count; link targets and markup do not
+    terms = Counter(
+        term for n in nodes for term in TERM_RE.findall(n.text.lower()) if len(term) > 1
+    )
+    return BlockInfo(links, images, has_text, dict(terms))
 
-def markdown_to_html_node(markdown: str) -> ParentNode:
+
+class PageInfo:
+    """
+    Facts about a page gathered while its blocks are rendered, so the
+    site and search indexes do not parse the page again: the title, the
+    link and image targets, the summary (the HTML of the first paragraph
+    with text besides links and images, such as a "Back home" link) and
+    the term counts of the text the inline parser produced. Code blocks
+    add nothing.
+    """
+
+    def __init__(self):
+        self.title: Optional[str] = None
+        self.summary: Optional[str] = None
+        self.links: List[str] = []
+        self.images: List[str] = []
+        self.terms: Counter = Counter()
+
+    def add(self, info: BlockInfo, html: Callable[[], str]) -> None:
+        """
+        Add a rendered block; html() returns its HTML, only asked for
+        when the block becomes the summary.
+        """
+        self.links.extend(info.links)
+        self.images.extend(info.images)
+        self.terms.update(info.terms)
+        if self.summary is None and info.has_text:
+            self.summary = html()
+
+    def to_dict(self) -> dict:
+        return {
+            "title": self.title,
+            "summary": self.summary,
+            "links": self.links,
+            "images": self.images,
+            "terms": dict(self.terms),
+        }
+
+    def restore(self, data: dict) -> None:
+        """
+        Take the facts of a page from an earlier to_dict(), for content
+        served from a render cache.
+        """
+        self.title = data["title"]
+        self.summary = data["summary"]
+        self.links = list(data["links"])
+        self.images = list(data["images"])
+        self.terms = Counter(data["terms"])
+
+
+def render_block(block: str, info: Optional[PageInfo] = None) -> HTMLNode:
+    """
+    Parse and render one raw block, adding its facts to info if given.
+    With a fragment cache, a block seen before comes back as a raw HTML
+    leaf without being parsed again; the cache keeps its facts too.
+    """
+    cache = _fragment_cache
+    if cache is None:
+        if info is None:
+            return block_to_html_node(parse_block(block))
+        parsed = parse_block(block)
+        nodes: List[TextNode] = []
+        node = block_to_html_node(parsed, nodes)
+        info.add(_block_info(parsed, nodes), node.to_html)
+        return node
+    hit = cache.get_entry(block)
+    if hit is None:
+        parsed = parse_block(block)
+        nodes = []
+        html = block_to_html_node(parsed, nodes).to_html()
+        block_info = _block_info(parsed, nodes)
+        cache.put(block, html, block_info)
+    else:
+        html, block_info = hit
+    if info is not None:
+        info.add(block_info, lambda: html)
+    return LeafNode(None, html)
+
+def markdown_to_html_node(markdown: str, info: Optional[PageInfo] = None) -> ParentNode:
     blocks = markdown_to_blocks(markdown)
-    children = []
+    return ParentNode('div', [render_block(block, info) for block in blocks])
+
+def iter_html_blocks(blocks: Iterable[str], info: Optional[PageInfo] = None) -> Iterator[HTMLNode]:
+    """
+    Lazily parse blocks into the children markdown_to_html_node would put
+    in its <div>, one block at a time, adding their facts to info if given.
+    """
     for block in blocks:
-        btype = block_to_block_type(block)
-        if btype == BlockType.HEADING:
-            m = re.match(r'^(#{1,6}) +(.*)', block)
-            level = len(m.group(1))
-            text = m.group(2)
-            inline = text_to_textnodes(text)
-            html_children = [text_node_to_html_node(n) for n in inline]
-            children.append(ParentNode(f'h{level}', html_children))
-        elif btype == BlockType.CODE:
-            lines = block.split('\n')
-            content = "\n".join(lines[1:-1])
-            dedented = textwrap.dedent(content)
-            code_text = dedented + '\n'
-            code_node = LeafNode('code', code_text)
-            children.append(ParentNode('pre', [code_node]))
-        elif btype == BlockType.QUOTE:
-            lines = [line.lstrip('> ').rstrip() for line in block.split('\n')]
-            text = '\n'.join(lines)
-            inline = text_to_textnodes(text)
-            html_children = [text_node_to_html_node(n) for n in inline]
-            children.append(ParentNode('blockquote', html_children))
-        elif btype == BlockType.UNORDERED_LIST:
-            items = []
-            for line in block.split('\n'):
-                item_text = line[2:]
-                inline = text_to_textnodes(item_text)
-                html_children = [text_node_to_html_node(n) for n in inline]
-                items.append(ParentNode('li', html_children))
-            children.append(ParentNode('ul', items))
-        elif btype == BlockType.ORDERED_LIST:
-            items = []
-            for line in block.split('\n'):
-                m = re.match(r'^([0-9]+)[.] +(.*)', line)
-                item_text = m.group(2)
-                inline = text_to_textnodes(item_text)
-                html_children = [text_node_to_html_node(n) for n in inline]
-                items.append(ParentNode('li', html_children))
-            children.append(ParentNode('ol', items))
-        else:
-            paragraph_text = re.sub(r'\s+', ' ', block.strip())
-            inline = text_to_textnodes(paragraph_text)
-            html_children = [text_node_to_html_node(n) for n in inline]
-            children.append(ParentNode('p', html_children))
-    return ParentNode('div', children)
+        yield render_block(block, info)
 
 
 def extract_title(markdown: str) -> str:
@@ -215,7 +462,14 @@ def extract_title(markdown: str) -> str:
     Find the first H1 line (“# Title”) and return its text.
     Raises ValueError if no H1 is present.
     """
-    for line in markdown.splitlines():
+    return extract_title_from_lines(markdown.splitlines())
+
+
+def extract_title_from_lines(lines: Iterable[str]) -> str:
+    """
+    Like extract_title, but stops reading lines at the first H1.
+    """
+    for line in lines:
         if line.startswith("# "):
             return line[2:].strip()
     raise ValueError("No H1 title found in markdown")
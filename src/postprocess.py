@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from statefile import write_json
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz sidecars are written without it
+    brotli = None
+
+MINIFY_EXTS = (".html", ".css")
+COMPRESS_EXTS = (".html", ".css", ".js", ".svg", ".xml", ".json", ".txt")
+
+# Elements whose content is whitespace sensitive or not HTML text
+RAW_BLOCK_RE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.S | re.I)
+TAG_RE = re.compile(r'(<[^>]*>)')
+WHITESPACE_RUN_RE = re.compile(r'\s+')
+CSS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+# Whitespace before a colon can be a descendant combinator; after it never is
+CSS_COLON_RE = re.compile(r':\s+')
+CSS_STRING_SLOT_RE = re.compile(r'\0(\d+)\0')
+
+
+def _collapse(match: re.Match) -> str:
+    # A run with a line break stays a line break so text keeps its word
+    # boundaries and the file keeps readable line structure
+    return "\n" if "\n" in match.group(0) else " "
+
+
+def minify_html(html: str) -> str:
+    """
+    Collapse whitespace runs in text between tags. Tags themselves and
+    the contents of <pre>, <textarea>, <script> and <style> are left
+    untouched, so the rendered page is unchanged.
+    """
+    parts = RAW_BLOCK_RE.split(html)
+    out = []
+    # split() yields text, raw block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        for j, piece in enumerate(TAG_RE.split(parts[i])):
+            out.append(piece if j % 2 else WHITESPACE_RUN_RE.sub(_collapse, piece))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return "".join(out).strip() + "\n"
+
+
+def minify_css(css: str) -> str:
+    """
+    Drop comments and the whitespace around braces, semicolons, commas
+    and child combinators. String literals are kept as written.
+    """
+    strings: List[str] = []
+
+    def protect(match: re.Match) -> str:
+        if match.group(1) is None:
+            # A comment separates tokens like whitespace does
+            return " "
+        strings.append(match.group(1))
+        return f"\0{len(strings) - 1}\0"
+
+    code = WHITESPACE_RUN_RE.sub(" ", CSS_TOKEN_RE.sub(protect, css))
+    code = CSS_PUNCT_RE.sub(r"\1", code).replace(";}", "}")
+    code = CSS_COLON_RE.sub(":", code).strip()
+    return CSS_STRING_SLOT_RE.sub(lambda m: strings[int(m.group(1))], code)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Outputs may be hardlinked to their sources; never write through them
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _sidecar(path: str, ext: str, data: Optional[bytes]) -> None:
+    # Only keep a sidecar that is actually smaller than the file itself
+    sidecar = path + ext
+    if data is not None:
+        _write_atomic(sidecar, data)
+    elif os.path.exists(sidecar):
+        os.remove(sidecar)
+
+
+def process_file(path: str, minify: bool, compress: bool) -> str:
+    """
+    Minify path in place and write its .gz (and, with the brotli module,
+    .br) sidecars. Returns the content hash of the final file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if minify and path.endswith(MINIFY_EXTS):
+        text = data.decode("utf-8")
+        text = minify_css(text) if path.endswith(".css") else minify_html(text)
+        minified = text.encode("utf-8")
+        if minified != data:
+            _write_atomic(path, minified)
+            data = minified
+    if compress and path.endswith(COMPRESS_EXTS):
+        gz = gzip.compress(data, 9, mtime=0)
+        _sidecar(path, ".gz", gz if len(gz) < len(data) else None)
+        if brotli is not None:
+            br = brotli.compress(data)
+            _sidecar(path, ".br", br if len(br) < len(data) else None)
+    return hashlib.sha256(data).hexdigest()
+
+
+def _process_job(job: Tuple[str, bool, bool]) -> str:
+    return process_file(*job)
+
+
+def postprocess_directory(
+    dest_dir: str,
+    state_path: Optional[str] = None,
+    minify: bool = True,
+    compress: bool = True,
+    workers: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Minify and precompress the text files under dest_dir on a pool of
+    worker processes. With state_path, files whose content still has the
+    hash recorded after the last run are skipped, and sidecars of files
+    that disappeared are removed.
+    Returns {"processed": n, "unchanged": n, "removed": n}.
+    """
+    options = f"minify={minify} compress={compress} brotli={brotli is not None}"
+    recorded: Dict[str, str] = {}
+    if state_path is not None:
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("options") == options:
+                recorded = state.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+    exts = COMPRESS_EXTS if compress else MINIFY_EXTS
+    files: Dict[str, str] = {}
+    todo: List[str] = []
+    for root, dirs, names in os.walk(dest_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith(exts):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            if recorded.get(path) == digest:
+                files[path] = digest
+            else:
+                todo.append(path)
+
+    jobs = [(path, minify, compress) for path in todo]
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            files.update(zip(todo, pool.map(_process_job, jobs, chunksize=8)))
+    else:
+        files.update((job[0], process_file(*job)) for job in jobs)
+
+    removed = 0
+    for path in set(recorded) - set(files):
+        for ext in (".gz", ".br"):
+            if os.path.exists(path + ext) and not os.path.exists(path):
+                os.remove(path + ext)
+                removed += 1
+    if state_path is not None:
+        write_json(state_path, {"options": options, "files": files}, indent=1, sort_keys=True)
+    counts = {"processed": len(todo), "unchanged": len(files) - len(todo), "removed": removed}
+    print(
+        f"Post-processed {dest_dir}: {counts['processed']} processed, "
+        f"{counts['unchanged']} unchanged, {counts['removed']} stale sidecars removed"
+    )
+    return counts
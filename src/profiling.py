@@ -0,0 +1,189 @@
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+import markdown_utils
+from htmlnode import ParentNode
+
+
+class BuildProfiler:
+    """
+    Opt-in instrumentation for a build.
+
+    instrument() swaps the build's stage functions for timing wrappers,
+    so a build without --profile runs the original functions untouched.
+    Each stage records self time (nested stages are subtracted), call
+    count and, with track_allocations, net bytes allocated. Every
+    generate_page call is also recorded as a page with its total time
+    and peak traced memory.
+    """
+
+    def __init__(self, track_allocations: bool = True, use_cprofile: bool = False):
+        self.track_allocations = track_allocations
+        self.stage_time: Dict[str, float] = defaultdict(float)
+        self.stage_calls: Dict[str, int] = defaultdict(int)
+        self.stage_alloc: Dict[str, int] = defaultdict(int)
+        self.page_time: Dict[str, float] = {}
+        self.page_peak: Dict[str, int] = {}
+        self.cprofile = cProfile.Profile() if use_cprofile else None
+        # One [child_time, child_alloc] accumulator per open stage
+        self._stack: List[List[float]] = []
+        self._active = set()
+        self._patches = []
+
+    def _memory(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.track_allocations else 0
+
+    @contextmanager
+    def stage(self, name: str):
+        # Recursive calls (such as nested render_to) count once, at the top
+        if name in self._active:
+            yield
+            return
+        self._active.add(name)
+        self._stack.append([0.0, 0])
+        mem = self._memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            alloc = max(0, self._memory() - mem)
+            child_time, child_alloc = self._stack.pop()
+            self.stage_time[name] += elapsed - child_time
+            self.stage_alloc[name] += max(0, alloc - child_alloc)
+            self.stage_calls[name] += 1
+            if self._stack:
+                self._stack[-1][0] += elapsed
+                self._stack[-1][1] += alloc
+            self._active.discard(name)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def wrap_page(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(from_path, *args, **kwargs):
+            if self.track_allocations:
+                tracemalloc.reset_peak()
+            base = self._memory()
+            start = time.perf_counter()
+            try:
+                return func(from_path, *args, **kwargs)
+            finally:
+                self.page_time[from_path] = time.perf_counter() - start
+                if self.track_allocations:
+                    self.page_peak[from_path] = tracemalloc.get_traced_memory()[1] - base
+        return wrapper
+
+    def _patch(self, owner, attr: str, replacement: Callable) -> None:
+        self._patches.append((owner, attr, getattr(owner, attr)))
+        setattr(owner, attr, replacement)
+
+    def instrument(self, build_module) -> None:
+        """
+        Wrap the stage functions of build_module (the main module) and of
+        the markdown parser and HTML renderer.
+        """
+        for attr in ("copy_directory", "sync_directory"):
+            self._patch(build_module, attr, self.wrap("copy", getattr(build_module, attr)))
+        self._patch(build_module, "read_source", self.wrap("read", build_module.read_source))
+        for attr in ("markdown_to_blocks", "parse_block"):
+            self._patch(markdown_utils, attr, self.wrap(attr, getattr(markdown_utils, attr)))
+        self._patch(markdown_utils, "_inline_parser",
+                    self.wrap("inline_parse", markdown_utils._inline_parser))
+        self._patch(build_module, "markdown_to_html_node",
+                    self.wrap("block_parse", build_module.markdown_to_html_node))
+        self._patch(ParentNode, "render_to", self.wrap("to_html", ParentNode.render_to))
+        render_page = self.wrap("template_fill", build_module.render_page)
+        self._patch(build_module, "render_page", render_page)
+
+        # Render to a string first so file writes are timed on their own
+        # instead of being interleaved with streamed chunks
+        def write_page(dest_path, md, template, cache=None, info=None):
+            page = render_page(md, template, cache, info)
+            with self.stage("write"):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                with open(dest_path, "w", encoding="utf-8") as f:
+                    f.write(page)
+
+        self._patch(build_module, "write_page", write_page)
+        self._patch(build_module, "generate_page", self.wrap_page(build_module.generate_page))
+
+    def restore(self) -> None:
+        while self._patches:
+            owner, attr, original = self._patches.pop()
+            setattr(owner, attr, original)
+
+    def start(self) -> None:
+        if self.track_allocations:
+            tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def stop(self) -> None:
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.track_allocations:
+            tracemalloc.stop()
+
+    def slowest_pages(self, top: int = 10):
+        return sorted(self.page_time.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    def report(self, top: int = 10) -> str:
+        total = sum(self.stage_time.values()) or 1.0
+        lines = [f"{'Stage':<20} {'calls':>8} {'self s':>9} {'%':>6} {'alloc KiB':>10}"]
+        for name, seconds in sorted(self.stage_time.items(), key=lambda item: -item[1]):
+            lines.append(
+                f"{name:<20} {self.stage_calls[name]:>8} {seconds:>9.4f} "
+                f"{100 * seconds / total:>6.1f} {self.stage_alloc[name] / 1024:>10.1f}"
+            )
+        lines.append("")
+        lines.append(f"Slowest {top} pages:")
+        for path, seconds in self.slowest_pages(top):
+            peak = self.page_peak.get(path)
+            peak_text = f"  peak {peak / 1024:8.1f} KiB" if peak is not None else ""
+            lines.append(f"  {seconds:8.4f}s{peak_text}  {path}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "stages": {
+                name: {
+                    "calls": self.stage_calls[name],
+                    "seconds": self.stage_time[name],
+                    "alloc_bytes": self.stage_alloc[name],
+                }
+                for name in self.stage_time
+            },
+            "pages": {
+                path: {"seconds": seconds, "peak_bytes": self.page_peak.get(path)}
+                for path, seconds in self.page_time.items()
+            },
+        }
+
+    def dump(self, path: str) -> None:
+        """
+        Write the stats as JSON, or the cProfile data for .prof/.pstats paths.
+        """
+        if path.endswith((".prof", ".pstats")):
+            if self.cprofile is None:
+                raise ValueError("cProfile output requires use_cprofile=True")
+            self.cprofile.dump_stats(path)
+            return
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+def profile_output_needs_cprofile(path: Optional[str]) -> bool:
+    return bool(path) and path.endswith((".prof", ".pstats"))
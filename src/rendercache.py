@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import zlib
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from htmlnode import image_hints_digest
+
+# Bump whenever a change to the markdown parser or HTML rendering alters
+# the output, so fragments cached by older code are never served.
+PARSER_VERSION = "2"
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_FRAGMENT_BYTES = 16 * 1024 * 1024
+
+
+
+def render_key(md: str) -> str:
+    """
+    Cache key of the content rendered from md by the current code.
+    """
+    h = hashlib.sha256(PARSER_VERSION.encode("utf-8"))
+    h.update(b"\0")
+    # <img> size hints change the rendered HTML of unchanged markdown
+    hints = image_hints_digest()
+    if hints:
+        h.update(hints.encode("ascii"))
+        h.update(b"\0")
+    h.update(md.encode("utf-8"))
+    return h.hexdigest()
+
+
+class RenderCache:
+    """
+    Persistent cache of rendered page content keyed by markdown hash.
+
+    Each entry holds the page title, the rendered content fragment
+    (before template filling and the BASEPATH rewrite) and, when it was
+    gathered, the PageInfo of the page as a dict, compressed with zlib.
+    A hit skips block and inline parsing entirely. Entries are evicted
+    least-recently-used first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def key(self, md: str) -> str:
+        return render_key(md)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, md: str) -> Optional[Tuple[str, str, Optional[dict]]]:
+        """
+        Return the cached (title, content_html, info) for md, or None.
+        info is None for entries stored without one.
+        """
+        path = self._path(self.key(md))
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()))
+            title, html = entry[:2]
+        except (OSError, ValueError, zlib.error):
+            return None
+        # Record the hit for LRU eviction
+        os.utime(path)
+        return title, html, entry[2] if len(entry) > 2 else None
+
+    def put(self, md: str, title: str, html: str, info: Optional[dict] = None) -> None:
+        path = self._path(self.key(md))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(json.dumps([title, html, info]).encode("utf-8"))
+        # Unique per process, since parallel builds share the cache
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache fits in
+        max_bytes. Returns the number of entries removed.
+        """
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for fname in files:
+                path = os.path.join(root, fname)
+                st = os.stat(path)
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
+
+
+class MemoryRenderCache:
+    """
+    In-process counterpart of RenderCache for a long-lived builder: the
+    max_entries most recently used (title, content_html, info) entries
+    are kept in memory, so nothing touches the disk.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, str, Optional[dict]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, md: str) -> Optional[Tuple[str, str, Optional[dict]]]:
+        key = render_key(md)
+        hit = self._entries.get(key)
+        if hit is not None:
+            self._entries.move_to_end(key)
+        return hit
+
+    def put(self, md: str, title: str, html: str, info: Optional[dict] = None) -> None:
+        key = render_key(md)
+        self._entries[key] = (title, html, info)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Bytes of bookkeeping per cached fragment: the key and entry tuples
+# and the OrderedDict's own link
+ENTRY_OVERHEAD = 200
+
+
+def _info_size(info) -> int:
+    # Approximate memory held by a markdown_utils.BlockInfo
+    if info is None:
+        return 0
+    size = sys.getsizeof(info)
+    for urls in (info.links, info.images):
+        size += sys.getsizeof(urls) + sum(sys.getsizeof(url) for url in urls)
+    size += sys.getsizeof(info.terms)
+    size += sum(sys.getsizeof(term) + sys.getsizeof(n) for term, n in info.terms.items())
+    return size
+
+
+class FragmentCache:
+    """
+    Bounded LRU of rendered block HTML keyed by the raw block text.
+
+    The block type and payload are derived from the text alone, so the
+    text (together with the current <img> size hints) fully determines
+    the fragment. Repeated paragraphs, list items and headings are then
+    rendered once per process. Entries are charged their approximate
+    in-memory size, block facts included, and evicted least-recently-used first once the cache
+    exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_FRAGMENT_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[str, str], tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_entry(self, block: str) -> Optional[tuple]:
+        """
+        Return the cached (html, info) of block, or None.
+        """
+        key = (image_hints_digest(), block)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def get(self, block: str) -> Optional[str]:
+        entry = self.get_entry(block)
+        return None if entry is None else entry[0]
+
+    def put(self, block: str, html: str, info=None) -> None:
+        """
+        Cache the HTML of block, with the facts the site index takes
+        from it (see markdown_utils.BlockInfo).
+        """
+        key = (image_hints_digest(), block)
+        cost = sys.getsizeof(block) + sys.getsizeof(html) + _info_size(info) + ENTRY_OVERHEAD
+        if cost > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = (html, info, cost)
+        self.size += cost
+        while self.size > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"Fragment cache: {self.hits} hits, {self.misses} misses "
+            f"({rate:.0%} hit rate), {len(self._entries)} fragments in "
+            f"{self.size / 1024:.0f} KiB"
+        )
@@ -0,0 +1,244 @@
+"""
+Client-side search index written into the site at build time.
+
+docs/search/index.json lists the pages by document id as [url, title]
+pairs (null for a free id) and the prefix length. The postings of a
+term live in docs/search/<prefix>.json, where the prefix is the term's
+first PREFIX_LENGTH characters with anything outside [a-z0-9] written
+as _<hex code point>. Each shard maps its terms to a flat
+[doc, tf, doc, tf, ...] list sorted by document id, so the browser
+only fetches the shards of the terms it looks up.
+"""
+import json
+import os
+import string
+from typing import Dict, Iterable, List, Optional, Set
+
+from feeds import page_url, write_if_changed
+from markdown_utils import PageInfo, extract_title, markdown_to_html_node
+from statefile import SourceStats, is_fresh, source_stats, write_json
+
+SEARCH_VERSION = 1
+PREFIX_LENGTH = 2
+SHARD_CHARS = set(string.ascii_lowercase + string.digits)
+
+
+def page_terms(md: str) -> Dict[str, int]:
+    """
+    Count the terms in the text of a page the build did not render, the
+    way rendering counts them (see PageInfo): from the TextNodes of the
+    active inline parser, so link targets and markup are left out while
+    link text and image alt text count. Code blocks are skipped.
+    """
+    info = PageInfo()
+    markdown_to_html_node(md, info)
+    return dict(info.terms)
+
+
+def shard_name(term: str) -> str:
+    """
+    "tolkien" -> "to"; "élan" -> "_e9l".
+    """
+    return "".join(c if c in SHARD_CHARS else f"_{ord(c):x}" for c in term[:PREFIX_LENGTH])
+
+
+class SearchIndex:
+    """
+    Persistent per-page term counts behind the search files.
+
+    Like the site index, entries carry the size and mtime of their source.
+    The build records the term counts it gathered while rendering with
+    record(), so update() only tokenizes pages that changed without being
+    rendered. Pages keep their document id for as long as they exist, so
+    an edit only changes the shards holding the terms it added or removed.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.pages: Dict[str, dict] = {}
+        # Shards whose postings changed since the last write()
+        self.dirty: Set[str] = set()
+        # Ids taken, and the lowest id that may be free; see _doc_for
+        self._used: Optional[Set[int]] = None
+        self._next_doc = 0
+
+    @classmethod
+    def load(cls, path: str) -> "SearchIndex":
+        """
+        Load an index from path. A missing, unreadable or outdated file
+        yields an empty index, which is rebuilt by the next update().
+        """
+        index = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("version") == SEARCH_VERSION:
+            index.pages = data.get("pages", {})
+        return index
+
+    def save(self) -> None:
+        if self.path is None:
+            raise ValueError("SearchIndex has no path to save to")
+        write_json(self.path, {"version": SEARCH_VERSION, "pages": self.pages}, sort_keys=True)
+
+    def _forget(self, src_path: str) -> None:
+        entry = self.pages.pop(src_path, None)
+        if entry is not None:
+            self.dirty.update(shard_name(term) for term in entry["terms"])
+
+    def _doc_for(self, src_path: str) -> int:
+        entry = self.pages.get(src_path)
+        if entry:
+            return entry["doc"]
+        if self._used is None:
+            self._used = {entry["doc"] for entry in self.pages.values()}
+            self._next_doc = 0
+        # Reuse the lowest free id so the document list stays dense
+        while self._next_doc in self._used:
+            self._next_doc += 1
+        self._used.add(self._next_doc)
+        return self._next_doc
+
+    def _store(
+        self, src_path: str, content_dir: str, title: Optional[str], terms: Dict[str, int],
+        st: os.stat_result,
+    ) -> None:
+        doc = self._doc_for(src_path)
+        self._forget(src_path)
+        rel = os.path.relpath(src_path, content_dir)
+        self.pages[src_path] = {
+            "doc": doc,
+            "output": (os.path.splitext(rel)[0] + ".html").replace(os.sep, "/"),
+            "title": title,
+            "terms": terms,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        self.dirty.update(shard_name(term) for term in terms)
+
+    def record(self, src_path: str, content_dir: str, info: dict) -> None:
+        """
+        Store the title and term counts a build gathered while rendering
+        src_path (see PageInfo.to_dict), against the source's current size
+        and mtime.
+        """
+        self._store(src_path, content_dir, info["title"], info["terms"], os.stat(src_path))
+
+    def update(self, content_dir: str, sources: Optional[SourceStats] = None) -> int:
+        """
+        Bring the index in line with the .md files under content_dir,
+        tokenizing new and modified sources and dropping removed ones.
+        Pass the source_stats() of content_dir if the caller already has
+        them. Returns the number of pages tokenized.
+        """
+        if sources is None:
+            sources = source_stats(content_dir)
+        seen = set()
+        scanned = 0
+        for src_path, st in sources:
+            seen.add(src_path)
+            if is_fresh(self.pages.get(src_path), st):
+                continue
+            with open(src_path, encoding="utf-8") as f:
+                md = f.read()
+            try:
+                title = extract_title(md)
+            except ValueError:
+                title = None
+            self._store(src_path, content_dir, title, page_terms(md), st)
+            scanned += 1
+        for src_path in set(self.pages) - seen:
+            self._forget(src_path)
+        # Ids of removed pages are free from the next build on
+        self._used = None
+        return scanned
+
+    def postings(self, shards: Iterable[str]) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Return the flat [doc, tf, ...] postings of every term, grouped by
+        shard, for the given shards.
+        """
+        wanted = set(shards)
+        out: Dict[str, Dict[str, List[int]]] = {shard: {} for shard in wanted}
+        for entry in sorted(self.pages.values(), key=lambda entry: entry["doc"]):
+            for term, tf in entry["terms"].items():
+                shard = shard_name(term)
+                if shard in wanted:
+                    out[shard].setdefault(term, []).extend((entry["doc"], tf))
+        return out
+
+    def shards(self) -> Set[str]:
+        return {shard_name(term) for entry in self.pages.values() for term in entry["terms"]}
+
+    def write(self, dest_dir: str, basepath: str = "/") -> List[str]:
+        """
+        Write the search files under dest_dir/search: the document list,
+        plus the shards changed by update() and any that are missing.
+        Shards left without terms are removed. Returns the paths written
+        or removed.
+        """
+        out_dir = os.path.join(dest_dir, "search")
+        os.makedirs(out_dir, exist_ok=True)
+        docs: List[Optional[list]] = [None] * (
+            max((entry["doc"] for entry in self.pages.values()), default=-1) + 1
+        )
+        for entry in self.pages.values():
+            url = basepath + page_url(entry["output"])[1:]
+            docs[entry["doc"]] = [url, entry["title"] or entry["output"]]
+        changed = []
+        meta = {"prefix_length": PREFIX_LENGTH, "docs": docs}
+        path = os.path.join(out_dir, "index.json")
+        if write_if_changed(path, _dumps(meta)):
+            changed.append(path)
+
+        live = self.shards()
+        existing = {
+            name[:-len(".json")] for name in os.listdir(out_dir)
+            if name.endswith(".json") and name != "index.json"
+        }
+        todo = self.postings((self.dirty & live) | (live - existing))
+        for shard in sorted(todo):
+            path = os.path.join(out_dir, shard + ".json")
+            if write_if_changed(path, _dumps(todo[shard])):
+                changed.append(path)
+        for shard in sorted(existing - live):
+            path = os.path.join(out_dir, shard + ".json")
+            if os.path.exists(path):
+                os.remove(path)
+                changed.append(path)
+        self.dirty.clear()
+        return changed
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+
+
+def build_search_index(
+    content_dir: str,
+    dest_dir: str,
+    state_path: str,
+    basepath: str = "/",
+    infos: Optional[Dict[str, dict]] = None,
+    sources: Optional[SourceStats] = None,
+) -> List[str]:
+    """
+    Update the persisted search index from content_dir and write the
+    search files it changed into dest_dir. infos holds the facts the
+    build gathered while rendering pages, by source path; only the other
+    changed pages are read and tokenized. sources is passed on to
+    SearchIndex.update(). Returns the paths changed.
+    """
+    index = SearchIndex.load(state_path)
+    for src_path, info in (infos or {}).items():
+        index.record(src_path, content_dir, info)
+    scanned = index.update(content_dir, sources)
+    changed = index.write(dest_dir, basepath)
+    index.save()
+    print(
+        f"Search index: {len(index.pages)} pages ({scanned} tokenized), "
+        f"{len(changed)} files changed"
+    )
+    return changed
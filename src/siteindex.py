@@ -0,0 +1,168 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from markdown_utils import PageInfo, extract_title, markdown_to_html_node
+from statefile import SourceStats, is_fresh, source_stats, write_json
+
+INDEX_VERSION = 2
+
+# Root-relative href/src attributes, as written in the page template
+TEMPLATE_REF_RE = re.compile(r'(?:href|src)="(/[^"]*)"')
+
+
+def scan_page(md: str) -> dict:
+    """
+    Collect the title, the summary and the outgoing link and image targets
+    of a page the build did not render, the way rendering gathers them
+    (see PageInfo). Code blocks are skipped since they are rendered
+    verbatim.
+    """
+    info = PageInfo()
+    markdown_to_html_node(md, info)
+    try:
+        title = extract_title(md)
+    except ValueError:
+        title = None
+    return {"title": title, "summary": info.summary, "links": info.links, "images": info.images}
+
+
+def template_references(source: str) -> List[str]:
+    return TEMPLATE_REF_RE.findall(source)
+
+
+def _site_path(target: str) -> Optional[str]:
+    # "/blog/post?x#y" -> "blog/post"; None for external or relative URLs
+    if not target.startswith("/") or target.startswith("//"):
+        return None
+    return target.split("#", 1)[0].split("?", 1)[0].lstrip("/")
+
+
+def _list_files(directory: str) -> Set[str]:
+    files = set()
+    for root, _, names in os.walk(directory):
+        for name in names:
+            rel = os.path.relpath(os.path.join(root, name), directory)
+            files.add(rel.replace(os.sep, "/"))
+    return files
+
+
+class IndexReport(NamedTuple):
+    broken: List[Tuple[str, str]]
+    orphans: List[str]
+
+
+class SiteIndex:
+    """
+    Persistent index of every page's title, summary, links and images.
+
+    Entries are keyed by source path and carry the size and mtime the
+    source had when it was scanned. The build records the pages it
+    renders with record(), so update() only reads pages that changed
+    without being rendered.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.pages: Dict[str, dict] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "SiteIndex":
+        """
+        Load an index from path. A missing, unreadable or outdated file
+        yields an empty index, which is rebuilt by the next update().
+        """
+        index = cls(path)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+        if data.get("version") == INDEX_VERSION:
+            index.pages = data.get("pages", {})
+        return index
+
+    def save(self) -> None:
+        if self.path is None:
+            raise ValueError("SiteIndex has no path to save to")
+        write_json(self.path, {"version": INDEX_VERSION, "pages": self.pages}, sort_keys=True)
+
+    def record(self, src_path: str, content_dir: str, info: dict) -> None:
+        """
+        Store the facts a build gathered while rendering src_path (see
+        PageInfo.to_dict), against the source's current size and mtime.
+        """
+        st = os.stat(src_path)
+        rel = os.path.relpath(src_path, content_dir)
+        entry = {key: info[key] for key in ("title", "summary", "links", "images")}
+        entry["output"] = (os.path.splitext(rel)[0] + ".html").replace(os.sep, "/")
+        entry["size"] = st.st_size
+        entry["mtime_ns"] = st.st_mtime_ns
+        self.pages[src_path] = entry
+
+    def update(self, content_dir: str, sources: Optional[SourceStats] = None) -> int:
+        """
+        Bring the index in line with the .md files under content_dir,
+        rescanning new and modified sources and dropping removed ones.
+        Pass the source_stats() of content_dir if the caller already has
+        them. Returns the number of pages scanned.
+        """
+        if sources is None:
+            sources = source_stats(content_dir)
+        seen = set()
+        scanned = 0
+        for src_path, st in sources:
+            seen.add(src_path)
+            if is_fresh(self.pages.get(src_path), st):
+                continue
+            with open(src_path, encoding="utf-8") as f:
+                entry = scan_page(f.read())
+            rel = os.path.relpath(src_path, content_dir)
+            entry["output"] = (os.path.splitext(rel)[0] + ".html").replace(os.sep, "/")
+            entry["size"] = st.st_size
+            entry["mtime_ns"] = st.st_mtime_ns
+            self.pages[src_path] = entry
+            scanned += 1
+        for src_path in set(self.pages) - seen:
+            del self.pages[src_path]
+        return scanned
+
+    def check(self, static_dir: str, extra_refs: Iterable[str] = ()) -> IndexReport:
+        """
+        Resolve every root-relative link and image against the generated
+        pages and the files in static_dir. Returns the (source, target)
+        pairs that resolve to nothing, and the static files that no page
+        (nor extra_refs, such as the template's stylesheet) refers to.
+        """
+        outputs = {entry["output"] for entry in self.pages.values()}
+        static_files = _list_files(static_dir)
+        targets = outputs | static_files
+        used: Set[str] = set()
+
+        def resolve(target: str) -> Optional[str]:
+            path = _site_path(target)
+            if path is None:
+                return ""
+            for candidate in (path, path.rstrip("/") + "/index.html" if path else "index.html"):
+                if candidate in targets:
+                    return candidate
+            return None
+
+        broken = []
+        for src_path in sorted(self.pages):
+            entry = self.pages[src_path]
+            for target in entry["links"] + entry["images"]:
+                found = resolve(target)
+                if found is None:
+                    broken.append((src_path, target))
+                else:
+                    used.add(found)
+        for target in extra_refs:
+            found = resolve(target)
+            if found:
+                used.add(found)
+        orphans = sorted(
+            os.path.join(static_dir, *rel.split("/")) for rel in static_files - used
+        )
+        return IndexReport(broken, orphans)
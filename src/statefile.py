@@ -0,0 +1,42 @@
+"""
+Helpers shared by the JSON state files the build keeps between runs.
+"""
+import json
+import os
+from typing import List, Optional, Tuple
+
+# (source path, os.stat result) pairs, as returned by source_stats()
+SourceStats = List[Tuple[str, os.stat_result]]
+
+
+def write_json(path: str, data, **dump_kwargs) -> None:
+    """
+    Write data to path as JSON through a temporary file, so a build that
+    is interrupted never leaves a truncated state file behind.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, **dump_kwargs)
+    os.replace(tmp_path, path)
+
+
+def source_stats(content_dir: str) -> SourceStats:
+    """
+    Stat every .md file under content_dir, in a stable order. Indexes
+    that key their entries by source take this list, so one build walks
+    the content tree once however many of them it updates.
+    """
+    sources = []
+    for root, dirs, files in os.walk(content_dir):
+        dirs.sort()
+        for fname in sorted(files):
+            if fname.lower().endswith(".md"):
+                src_path = os.path.join(root, fname)
+                sources.append((src_path, os.stat(src_path)))
+    return sources
+
+
+def is_fresh(entry: Optional[dict], st: os.stat_result) -> bool:
+    # Entries record the size and mtime their source had when indexed
+    return bool(entry) and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
@@ -0,0 +1,221 @@
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from markdown_utils import markdown_to_html_node
+
+SLOT_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+PARTIAL_RE = re.compile(r'\{\{>\s*([\w-]+)\s*\}\}')
+# Partials are looked up in this order; .md partials are rendered as markdown
+PARTIAL_EXTS = (".md", ".html")
+SRCSET_RE = re.compile(r'srcset="([^"]*)"')
+URL_ATTR_RE = re.compile(r'\b(href|src|srcset)="([^"]*)"')
+
+# A slot value is either the text to insert or a callable that streams its
+# text to the write function it is given.
+SlotValue = Union[str, Callable[[Callable[[str], object]], None]]
+
+
+# Fingerprinted names of static files keyed by site URL, such as
+# "/index.css" -> "/index.3f2a9c1e.css"; see set_asset_map
+_asset_map: Dict[str, str] = {}
+
+
+def set_asset_map(mapping: Dict[str, str]) -> None:
+    global _asset_map
+    _asset_map = dict(mapping)
+
+
+def asset_map() -> Dict[str, str]:
+    return _asset_map
+
+
+def asset_url(url: str) -> str:
+    """
+    Return the fingerprinted form of a root-relative URL, keeping any
+    query or fragment, or url itself if it names no fingerprinted asset.
+    """
+    cut = min((i for i in (url.find("?"), url.find("#")) if i >= 0), default=len(url))
+    mapped = _asset_map.get(url[:cut])
+    return url if mapped is None else mapped + url[cut:]
+
+
+def needs_rewrite(basepath: str) -> bool:
+    """
+    True if rewrite_basepath can change anything for this basepath.
+    """
+    return basepath != "/" or bool(_asset_map)
+
+
+def rewrite_basepath(text: str, basepath: str) -> str:
+    """
+    Prefix root-relative href/src attributes with basepath. With an
+    asset map, fingerprinted names are substituted in the same pass.
+    """
+    if _asset_map:
+        return URL_ATTR_RE.sub(lambda m: _rewrite_attr(m, basepath), text)
+    if basepath == "/":
+        return text
+    text = text.replace('href="/', f'href="{basepath}').replace('src="/', f'src="{basepath}')
+    if 'srcset="' in text:
+        text = SRCSET_RE.sub(lambda m: _prefix_srcset(m, basepath), text)
+    return text
+
+
+def _rewrite_url(url: str, basepath: str) -> str:
+    if not url.startswith("/") or url.startswith("//"):
+        return url
+    return basepath + asset_url(url)[1:]
+
+
+def _rewrite_attr(match: re.Match, basepath: str) -> str:
+    attr, value = match.group(1), match.group(2)
+    if attr == "srcset":
+        value = ", ".join(
+            _rewrite_url(url, basepath) + rest
+            for url, rest in (_split_candidate(c) for c in value.split(", "))
+        )
+    else:
+        value = _rewrite_url(value, basepath)
+    return f'{attr}="{value}"'
+
+
+def _split_candidate(candidate: str):
+    # "url 480w" -> ("url", " 480w")
+    url, space, descriptor = candidate.partition(" ")
+    return url, space + descriptor
+
+
+def _prefix_srcset(match: re.Match, basepath: str) -> str:
+    # Each comma-separated candidate is "url descriptor"
+    candidates = []
+    for candidate in match.group(1).split(", "):
+        if candidate.startswith("/") and not candidate.startswith("//"):
+            candidate = basepath + candidate[1:]
+        candidates.append(candidate)
+    return f'srcset="{", ".join(candidates)}"'
+
+
+def partials_dir(template_path: str) -> str:
+    """
+    Directory the partials of a template are loaded from: partials/ next
+    to the template file.
+    """
+    return os.path.join(os.path.dirname(template_path), "partials")
+
+
+def find_partial(name: str, directory: str) -> str:
+    for ext in PARTIAL_EXTS:
+        path = os.path.join(directory, name + ext)
+        if os.path.isfile(path):
+            return path
+    raise ValueError(f"No partial named {name!r} in {directory}")
+
+
+def partial_paths(source: str, directory: str) -> List[str]:
+    """
+    Return the files of the partials source includes, without rendering them.
+    """
+    return sorted({find_partial(name, directory) for name in PARTIAL_RE.findall(source)})
+
+
+def render_partial(path: str) -> str:
+    """
+    Return the HTML of a partial file: .md partials go through the
+    markdown renderer, .html partials are used as written.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".md"):
+        return markdown_to_html_node(text).to_html()
+    return text.rstrip("\n")
+
+
+def load_partials(source: str, directory: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Render each partial source includes once. Returns the HTML keyed by
+    partial name and the files it came from.
+    """
+    partials = {}
+    paths = []
+    for name in sorted(set(PARTIAL_RE.findall(source))):
+        path = find_partial(name, directory)
+        partials[name] = render_partial(path)
+        paths.append(path)
+    return partials, paths
+
+
+class Template:
+    """
+    A page template compiled into literal segments and named slots.
+
+    `{{ Name }}` placeholders become slots; the text around them is kept as
+    literal segments with the BASEPATH rewrite already applied, so rendering
+    a page is a single pass over the segments with no full-page scans.
+    `{{> name }}` includes are replaced by the rendered partials before the
+    template is split, so every page gets them by reference to the same
+    segments and a partial is rendered once per compile.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        basepath: str = "/",
+        partials: Optional[Dict[str, str]] = None,
+        includes: Optional[List[str]] = None,
+    ):
+        self.basepath = basepath
+        partials = partials or {}
+
+        def splice(match: re.Match) -> str:
+            try:
+                return partials[match.group(1)]
+            except KeyError:
+                raise ValueError(f"Unknown partial {match.group(1)!r}") from None
+
+        # The template with partials spliced in, before any URL rewriting
+        self.source = PARTIAL_RE.sub(splice, source)
+        # Partial files the template was compiled from
+        self.includes: List[str] = list(includes or [])
+        parts = SLOT_RE.split(rewrite_basepath(self.source, basepath))
+        # re.split alternates literal text and captured slot names
+        self.segments: List[str] = parts[0::2]
+        self.slots: List[str] = parts[1::2]
+
+    @classmethod
+    def load(
+        cls, path: str, basepath: str = "/", partials: Optional[str] = None
+    ) -> "Template":
+        """
+        Compile the template at path, with its partials loaded from the
+        partials directory (partials/ next to the template by default).
+        """
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        rendered, includes = load_partials(source, partials or partials_dir(path))
+        return cls(source, basepath, rendered, includes)
+
+    def render(self, values: Dict[str, str]) -> str:
+        """
+        Fill the slots from values and return the page. Slots without a
+        value render as empty strings.
+        """
+        out = [self.segments[0]]
+        for name, segment in zip(self.slots, self.segments[1:]):
+            out.append(values.get(name, ""))
+            out.append(segment)
+        return "".join(out)
+
+    def render_to(self, write: Callable[[str], object], values: Dict[str, SlotValue]) -> None:
+        """
+        Like render(), but pass each piece to write(). Callable values are
+        called with write so large slots such as the content can stream.
+        """
+        write(self.segments[0])
+        for name, segment in zip(self.slots, self.segments[1:]):
+            value = values.get(name, "")
+            if callable(value):
+                value(write)
+            else:
+                write(value)
+            write(segment)
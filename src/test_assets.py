@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from assets import (
+    fingerprint_assets, fingerprinted_name, record_rewrites, sync_directory, transfer_file,
+)
+from fixtures import write
+
+
+class TestSyncDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.static = os.path.join(root, "static")
+        self.docs = os.path.join(root, "docs")
+        self.state = os.path.join(root, ".build", "assets.json")
+        write(os.path.join(self.static, "index.css"), b"body {}")
+        write(os.path.join(self.static, "images", "a.png"), b"\x89PNG" + b"0" * 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sync(self, **kwargs):
+        with redirect_stdout(StringIO()):
+            return sync_directory(self.static, self.docs, self.state, **kwargs)
+
+    def test_first_sync_copies_everything(self):
+        self.assertEqual(self.sync(), {"copied": 2, "unchanged": 0, "removed": 0})
+        with open(os.path.join(self.docs, "images", "a.png"), "rb") as f:
+            self.assertTrue(f.read().startswith(b"\x89PNG"))
+
+    def test_second_sync_copies_nothing(self):
+        self.sync()
+        self.assertEqual(self.sync(), {"copied": 0, "unchanged": 2, "removed": 0})
+
+    def test_changed_file_is_copied(self):
+        self.sync()
+        write(os.path.join(self.static, "index.css"), b"body { margin: 0 }")
+        self.assertEqual(self.sync()["copied"], 1)
+
+    def test_checksum_skips_touched_but_identical_file(self):
+        self.sync()
+        css = os.path.join(self.static, "index.css")
+        st = os.stat(css)
+        os.utime(css, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        self.assertEqual(self.sync(checksum=True)["copied"], 0)
+        self.assertEqual(self.sync()["copied"], 0)
+
+    def test_recorded_rewrites_are_kept(self):
+        self.sync()
+        css = os.path.join(self.docs, "index.css")
+        write(css, b"body{}")
+        self.assertEqual(record_rewrites(self.static, self.docs, self.state), 1)
+        self.assertEqual(self.sync()["copied"], 0)
+        with open(css, "rb") as f:
+            self.assertEqual(f.read(), b"body{}")
+        write(os.path.join(self.static, "index.css"), b"body { margin: 0 }")
+        self.assertEqual(self.sync()["copied"], 1)
+
+    def test_prunes_only_stale_synced_files(self):
+        self.sync()
+        page = os.path.join(self.docs, "index.html")
+        write(page, b"<html></html>")
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        self.assertEqual(self.sync()["removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "images", "a.png")))
+        self.assertTrue(os.path.exists(page))
+
+    def test_skipped_files_are_left_alone_but_pruned(self):
+        png = os.path.join(self.docs, "images", "a.png")
+        write(png, b"optimized")
+
+        def skip(rel_path):
+            return rel_path.endswith(".png")
+
+        self.assertEqual(self.sync(skip=skip), {"copied": 1, "unchanged": 0, "removed": 0})
+        with open(png, "rb") as f:
+            self.assertEqual(f.read(), b"optimized")
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        self.assertEqual(self.sync(skip=skip)["removed"], 1)
+        self.assertFalse(os.path.exists(png))
+
+    def test_hardlink(self):
+        self.sync(link="hardlink")
+        src = os.stat(os.path.join(self.static, "index.css"))
+        dst = os.stat(os.path.join(self.docs, "index.css"))
+        self.assertEqual(src.st_ino, dst.st_ino)
+
+    def test_unknown_link_mode(self):
+        with self.assertRaises(ValueError):
+            self.sync(link="symlink")
+
+
+class TestTransferFile(unittest.TestCase):
+    def test_replaces_existing_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, "a.txt")
+            dst = os.path.join(root, "out", "a.txt")
+            write(src, b"new")
+            write(dst, b"old")
+            self.assertIn(transfer_file(src, dst), ("copy", "reflink"))
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read(), b"new")
+
+
+class TestFingerprintAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.static = os.path.join(root, "static")
+        self.docs = os.path.join(root, "docs")
+        self.manifest = os.path.join(root, ".build", "asset-manifest.json")
+        write(os.path.join(self.static, "index.css"), b"body {}")
+        write(os.path.join(self.static, "images", "a.png"), b"png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fingerprint(self, generated=()):
+        with redirect_stdout(StringIO()):
+            sync_directory(self.static, self.docs)
+            return fingerprint_assets(self.static, self.docs, self.manifest, generated=generated)
+
+    def test_twins_and_mapping(self):
+        self.assertEqual(fingerprinted_name("images/a.png", "0123456789abcdef"),
+                         "images/a.0123456789.png")
+        mapping = self.fingerprint()
+        self.assertEqual(sorted(mapping), ["/images/a.png", "/index.css"])
+        twin = os.path.join(self.docs, *mapping["/index.css"].lstrip("/").split("/"))
+        with open(twin, "rb") as f:
+            self.assertEqual(f.read(), b"body {}")
+
+    def test_changed_asset_replaces_twin(self):
+        old = self.fingerprint()["/index.css"]
+        write(os.path.join(self.static, "index.css"), b"body { margin: 0 }")
+        new = self.fingerprint()["/index.css"]
+        self.assertNotEqual(old, new)
+        self.assertFalse(os.path.exists(os.path.join(self.docs, old.lstrip("/"))))
+        self.assertTrue(os.path.exists(os.path.join(self.docs, new.lstrip("/"))))
+
+
+    def test_generated_files_get_twins(self):
+        write(os.path.join(self.docs, "images", "a-480w.png"), b"small")
+        mapping = self.fingerprint(["images/a-480w.png", "images/gone-480w.png"])
+        self.assertEqual(sorted(mapping), ["/images/a-480w.png", "/images/a.png", "/index.css"])
+        self.assertRegex(mapping["/images/a-480w.png"], r"^/images/a-480w\.[0-9a-f]{10}\.png$")
+
+
+if __name__ == "__main__":
+    unittest.main()
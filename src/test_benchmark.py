@@ -0,0 +1,47 @@
+import os
+import random
+import tempfile
+import unittest
+
+from benchmark import (
+    STAGES,
+    generate_corpus,
+    generate_page_markdown,
+    node_memory,
+    run_benchmark,
+)
+from markdown_utils import extract_title, markdown_to_html_node
+
+
+class TestCorpus(unittest.TestCase):
+    def test_page_is_deterministic_and_parses(self):
+        mix = {"paragraph": 1, "code": 1, "unordered_list": 1, "ordered_list": 1}
+        first = generate_page_markdown(random.Random(7), 20, mix)
+        self.assertEqual(first, generate_page_markdown(random.Random(7), 20, mix))
+        self.assertTrue(extract_title(first))
+        self.assertTrue(markdown_to_html_node(first).to_html().startswith("<div><h1>"))
+
+    def test_generate_corpus(self):
+        with tempfile.TemporaryDirectory() as root:
+            size = generate_corpus(root, 5, blocks=3)
+            files = [f for _, _, names in os.walk(root) for f in names]
+            self.assertEqual(files, ["index.md"] * 5)
+            self.assertGreater(size, 0)
+
+
+class TestRunBenchmark(unittest.TestCase):
+    def test_results_shape(self):
+        results = run_benchmark(pages=3, blocks=5)
+        self.assertEqual(set(results["stages"]), set(STAGES))
+        self.assertEqual(results["corpus"]["pages"], 3)
+        self.assertGreater(results["full_build"]["seconds"], 0)
+
+    def test_node_memory_slots_are_smaller(self):
+        md = generate_page_markdown(random.Random(1), 50, {"paragraph": 1, "unordered_list": 1})
+        results = node_memory(md)
+        for kind in ("html_bytes_per_node", "text_bytes_per_node"):
+            self.assertLess(results[kind]["after"], results[kind]["before"])
+
+
+if __name__ == "__main__":
+    unittest.main()
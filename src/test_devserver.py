@@ -0,0 +1,131 @@
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+from contextlib import redirect_stdout
+from io import StringIO
+
+from devserver import (
+    LIVERELOAD_SCRIPT,
+    ReloadNotifier,
+    SiteWatcher,
+    inject_livereload,
+    make_server,
+)
+from fixtures import read, touch, write
+from main import SiteBuilder
+
+
+class TestSiteWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.docs = os.path.join(root, "docs")
+        self.template = os.path.join(root, "template.html")
+        write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        write(os.path.join(self.content, "about", "index.md"), "# About\n\nUs")
+        write(os.path.join(self.static, "index.css"), "body {}")
+        self.builder = SiteBuilder(
+            self.content, self.static, self.docs, self.template,
+            state_dir=os.path.join(root, ".build"),
+        )
+        self.watcher = SiteWatcher(self.builder)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def poll(self):
+        with redirect_stdout(StringIO()):
+            return self.watcher.poll()
+
+    def test_no_changes(self):
+        self.assertEqual(self.poll(), [])
+
+    def test_changed_page_rebuilds_only_that_page(self):
+        touch(os.path.join(self.content, "index.md"), "# Home\n\nEdited")
+        self.assertEqual(self.poll(), [os.path.join(self.docs, "index.html")])
+        self.assertIn("Edited", read(os.path.join(self.docs, "index.html")))
+
+    def test_static_asset_is_copied_and_removed(self):
+        css = os.path.join(self.static, "extra.css")
+        touch(css, "p {}")
+        self.assertEqual(self.poll(), [os.path.join(self.docs, "extra.css")])
+        os.remove(css)
+        self.assertEqual(self.poll(), [os.path.join(self.docs, "extra.css")])
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "extra.css")))
+
+    def test_template_change_rebuilds_every_page(self):
+        touch(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(
+            sorted(self.poll()),
+            [
+                os.path.join(self.docs, "about", "index.html"),
+                os.path.join(self.docs, "index.html"),
+            ],
+        )
+
+    def test_partial_change_rebuilds_every_page(self):
+        touch(self.template, "{{> nav }}{{ Content }}")
+        partial = os.path.join(self.tmp.name, "partials", "nav.html")
+        touch(partial, "<nav>one</nav>")
+        self.poll()
+        touch(partial, "<nav>two</nav>")
+        self.assertEqual(len(self.poll()), 2)
+        self.assertIn("<nav>two</nav>", read(os.path.join(self.docs, "index.html")))
+
+    def test_removed_page_is_deleted(self):
+        touch(os.path.join(self.content, "about", "index.md"), "# About\n\nUs")
+        self.poll()
+        os.remove(os.path.join(self.content, "about", "index.md"))
+        self.poll()
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "about", "index.html")))
+
+    def test_fingerprinted_css_edit_updates_pages(self):
+        touch(self.template, '<link href="/index.css">{{ Content }}')
+        self.builder.fingerprint = True
+        self.builder.incremental = True
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        old = self.builder.asset_map["/index.css"]
+        touch(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        outputs = self.poll()
+        new = self.builder.asset_map["/index.css"]
+        self.assertNotEqual(old, new)
+        self.assertIn(os.path.join(self.docs, "index.html"), outputs)
+        self.assertIn(f'href="{new}"', read(os.path.join(self.docs, "index.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.docs, *old.lstrip("/").split("/"))))
+
+
+class TestLiveReload(unittest.TestCase):
+    def test_inject_before_body_close(self):
+        self.assertEqual(
+            inject_livereload("<body>x</body>"),
+            f"<body>x{LIVERELOAD_SCRIPT}</body>",
+        )
+
+    def test_notifier_wakes_waiters(self):
+        notifier = ReloadNotifier()
+        threading.Timer(0.05, notifier.notify).start()
+        self.assertEqual(notifier.wait(0, timeout=5), 1)
+
+    def test_server_injects_script(self):
+        with tempfile.TemporaryDirectory() as docs:
+            write(os.path.join(docs, "index.html"), "<body>hi</body>")
+            server = make_server(docs, 0, ReloadNotifier())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                port = server.server_address[1]
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/") as resp:
+                    body = resp.read().decode("utf-8")
+            finally:
+                server.shutdown()
+                server.server_close()
+        self.assertIn(LIVERELOAD_SCRIPT, body)
+
+
+if __name__ == "__main__":
+    unittest.main()
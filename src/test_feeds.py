@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from feeds import absolute_url, blog_posts, page_url, write_feeds
+from fixtures import read, write
+from siteindex import SiteIndex
+from template import Template
+
+
+class TestUrls(unittest.TestCase):
+    def test_page_url(self):
+        self.assertEqual(page_url("index.html"), "/")
+        self.assertEqual(page_url("blog/tom/index.html"), "/blog/tom/")
+        self.assertEqual(page_url("about.html"), "/about.html")
+
+    def test_absolute_url(self):
+        self.assertEqual(
+            absolute_url("https://x.test/", "/repo/", "/blog/"), "https://x.test/repo/blog/"
+        )
+
+
+class TestWriteFeeds(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.docs = os.path.join(root, "docs")
+        write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome", 1_700_000_000)
+        write(os.path.join(self.content, "blog", "old", "index.md"),
+              "# Old & gold\n\n[< Back](/)\n\nFirst [post](/x).", 1_700_000_000)
+        write(os.path.join(self.content, "blog", "new", "index.md"),
+              "# New\n\nSecond post.", 1_700_086_400)
+        self.index = SiteIndex(os.path.join(root, ".build", "siteindex.json"))
+        self.index.update(self.content)
+        self.template = Template("<title>{{ Title }}</title>{{ Content }}", "/repo/")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_feeds(self):
+        with redirect_stdout(StringIO()):
+            return write_feeds(self.index, self.docs, self.template, "https://x.test", "/repo/")
+
+    def test_posts_newest_first(self):
+        self.assertEqual([p["title"] for p in blog_posts(self.index)], ["New", "Old & gold"])
+
+    def test_blog_index_feed_and_sitemap(self):
+        self.assertEqual(len(self.run_feeds()), 3)
+        listing = read(os.path.join(self.docs, "blog", "index.html"))
+        self.assertTrue(listing.startswith("<title>Blog</title><div><h1>Blog</h1><ul><li>"))
+        self.assertIn('<a href="/repo/blog/old/">Old &amp; gold</a>', listing)
+        self.assertIn('<p>First <a href="/repo/x">post</a>.</p>', listing)
+        self.assertLess(listing.index("New"), listing.index("Old"))
+
+        feed = ET.parse(os.path.join(self.docs, "feed.xml")).getroot()
+        items = feed.findall("channel/item")
+        self.assertEqual([item.findtext("title") for item in items], ["New", "Old & gold"])
+        self.assertEqual(items[0].findtext("link"), "https://x.test/repo/blog/new/")
+        self.assertEqual(items[0].findtext("description"), "<p>Second post.</p>")
+        self.assertEqual(items[0].findtext("pubDate"), "Wed, 15 Nov 2023 22:13:20 +0000")
+
+        ns = {"s": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+        sitemap = ET.parse(os.path.join(self.docs, "sitemap.xml")).getroot()
+        self.assertEqual(
+            [url.findtext("s:loc", namespaces=ns) for url in sitemap.findall("s:url", ns)],
+            [
+                "https://x.test/repo/blog/",
+                "https://x.test/repo/blog/new/",
+                "https://x.test/repo/blog/old/",
+                "https://x.test/repo/",
+            ],
+        )
+
+    def test_feed_summaries_have_absolute_urls(self):
+        write(os.path.join(self.content, "blog", "new", "index.md"),
+              "# New\n\nRead [the intro](/blog/old) ![i](/i.png)", 1_700_086_400)
+        self.index.update(self.content)
+        self.run_feeds()
+        description = ET.parse(os.path.join(self.docs, "feed.xml")).getroot().findtext(
+            "channel/item/description"
+        )
+        self.assertEqual(
+            description,
+            '<p>Read <a href="https://x.test/repo/blog/old">the intro</a> '
+            '<img src="https://x.test/repo/i.png" alt="i"></img></p>',
+        )
+
+    def test_unchanged_corpus_rewrites_nothing(self):
+        self.run_feeds()
+        self.assertEqual(self.run_feeds(), [])
+        # Only the changed post is scanned again, and no source is read
+        # to build the outputs
+        write(os.path.join(self.content, "index.md"), "# Home page\n\nWelcome", 1_700_000_001)
+        self.assertEqual(self.index.update(self.content), 1)
+        with mock.patch("builtins.open", wraps=open) as opened:
+            written = self.run_feeds()
+        self.assertFalse(any(call.args[0].endswith(".md") for call in opened.call_args_list))
+        self.assertEqual(written, [os.path.join(self.docs, "sitemap.xml")])
+
+    def test_state_ignores_outputs_rewritten_later(self):
+        state = os.path.join(self.tmp.name, ".build", "feeds.json")
+        with redirect_stdout(StringIO()):
+            write_feeds(self.index, self.docs, self.template, "https://x.test", "/repo/", state)
+            # As --minify does after this step
+            write(os.path.join(self.docs, "blog", "index.html"), "<title>Blog</title>")
+            written = write_feeds(
+                self.index, self.docs, self.template, "https://x.test", "/repo/", state
+            )
+        self.assertEqual(written, [])
+
+    def test_content_blog_index_is_kept(self):
+        write(os.path.join(self.content, "blog", "index.md"), "# My blog", 1_700_000_000)
+        self.index.update(self.content)
+        self.run_feeds()
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "index.html")))
+        self.assertIn("<title>New</title>", read(os.path.join(self.docs, "feed.xml")))
+
+
+if __name__ == "__main__":
+    unittest.main()
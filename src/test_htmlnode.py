@@ -19,6 +19,10 @@ class TestHTMLNode(unittest.TestCase):
         self.assertIn(' href="https://example.com"', html)
         self.assertIn(' target="_blank"', html)
 
+    def test_no_instance_dict(self):
+        for node in (HTMLNode("p"), LeafNode("b", "x"), ParentNode("div", [])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
     def test_repr(self):
         node = HTMLNode(tag="p", value="text", children=[], props={"id": "para1"})
         expected = (
@@ -69,6 +73,17 @@ class TestParentNode(unittest.TestCase):
         with self.assertRaises(ValueError):
             parent.to_html()
 
+    def test_render_to_streams_chunks(self):
+        parent = ParentNode("p", [LeafNode(None, "a "), LeafNode("b", "bold")], {"id": "x"})
+        chunks = []
+        parent.render_to(chunks.append)
+        self.assertEqual(chunks, ['<p id="x">', "a ", "<b>bold</b>", "</p>"])
+        self.assertEqual("".join(chunks), parent.to_html())
+
+    def test_render_to_no_children(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", None).render_to(lambda chunk: None)
+
 class TestTextNodeToHtmlNode(unittest.TestCase):
     def test_text(self):
         node = TextNode("This is a text node", TextType.PLAIN)
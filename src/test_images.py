@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from fixtures import gradient_png
+from htmlnode import set_image_hints, text_node_to_html_node
+from images import (
+    _chunk,
+    decode_png,
+    image_size_hints,
+    optimize_images,
+    png_size,
+    recompress_png,
+    resize_rows,
+    variant_name,
+    variant_paths,
+)
+from rendercache import RenderCache
+from textnode import TextNode, TextType
+
+
+class TestPngCodec(unittest.TestCase):
+    def test_round_trip(self):
+        data, rows = gradient_png(20, 10)
+        self.assertEqual(png_size(data), (20, 10))
+        width, height, color_type, decoded, _ = decode_png(data)
+        self.assertEqual((width, height, color_type), (20, 10, 2))
+        self.assertEqual([bytes(row) for row in decoded], rows)
+
+    def test_recompress_drops_metadata(self):
+        data, rows = gradient_png(20, 10, _chunk(b"tEXt", b"Comment\0" + b"x" * 200))
+        smaller = recompress_png(data)
+        self.assertLess(len(smaller), len(data))
+        self.assertNotIn(b"tEXt", smaller)
+        self.assertEqual([bytes(row) for row in decode_png(smaller)[3]], rows)
+
+    def test_resize_averages_blocks(self):
+        rows = [bytes([0, 100, 200, 40]), bytes([50, 150, 0, 0])]
+        height, small = resize_rows(rows, 4, 2, 1, 2)
+        self.assertEqual(height, 1)
+        self.assertEqual(small, [bytes([75, 60])])
+
+    def test_not_png(self):
+        self.assertIsNone(png_size(b"GIF89a"))
+
+
+class TestSizeHints(unittest.TestCase):
+    def tearDown(self):
+        set_image_hints({})
+
+    def test_variant_name_and_hints(self):
+        self.assertEqual(variant_name("/images/a.png", 480), "/images/a-480w.png")
+        self.assertEqual(
+            image_size_hints("/a.png", {"width": 1000, "height": 500, "variants": [480]}),
+            {"width": "1000", "height": "500", "srcset": "/a-480w.png 480w, /a.png 1000w"},
+        )
+        self.assertNotIn("srcset", image_size_hints("/a.png", {"width": 9, "height": 9, "variants": []}))
+
+    def test_img_node_uses_hints(self):
+        node = TextNode("alt", TextType.IMAGE, "/a.png")
+        self.assertEqual(text_node_to_html_node(node).props, {"src": "/a.png", "alt": "alt"})
+        set_image_hints({"/a.png": {"width": "9", "height": "4"}})
+        self.assertIn('width="9" height="4"', text_node_to_html_node(node).to_html())
+
+    def test_hints_change_render_cache_key(self):
+        cache = RenderCache("unused")
+        key = cache.key("# T")
+        set_image_hints({"/a.png": {"width": "9", "height": "4"}})
+        self.assertNotEqual(cache.key("# T"), key)
+
+
+class TestOptimizeImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.static = os.path.join(root, "static")
+        self.docs = os.path.join(root, "docs")
+        self.cache = os.path.join(root, ".build", "images")
+        os.makedirs(os.path.join(self.static, "images"))
+        data, _ = gradient_png(600, 30)
+        with open(os.path.join(self.static, "images", "wide.png"), "wb") as f:
+            f.write(data)
+        with open(os.path.join(self.static, "images", "broken.png"), "wb") as f:
+            f.write(b"not really a png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_optimize(self):
+        with redirect_stdout(StringIO()) as out:
+            hints = optimize_images(self.static, self.docs, self.cache, workers=2)
+        return hints, out.getvalue()
+
+    def test_variants_hints_and_cache(self):
+        hints, log = self.run_optimize()
+        self.assertIn("2 processed", log)
+        self.assertEqual(
+            hints,
+            {"/images/wide.png": {
+                "width": "600", "height": "30",
+                "srcset": "/images/wide-480w.png 480w, /images/wide.png 600w",
+            }},
+        )
+        self.assertEqual(variant_paths(hints), ["images/wide-480w.png"])
+        with open(os.path.join(self.docs, "images", "wide-480w.png"), "rb") as f:
+            self.assertEqual(png_size(f.read()), (480, 24))
+        with open(os.path.join(self.docs, "images", "broken.png"), "rb") as f:
+            self.assertEqual(f.read(), b"not really a png")
+        with mock.patch("images.derive_image", side_effect=AssertionError):
+            self.assertEqual(self.run_optimize()[0], hints)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,379 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+import main
+from fixtures import gradient_png, write
+from images import _chunk
+from main import (
+    SiteBuilder,
+    collect_pages,
+    generate_pages_recursive,
+    render_page,
+    shard_pages,
+    write_page_streaming,
+)
+from manifest import BuildManifest
+from markdown_utils import inline_parser, set_inline_parser
+from template import Template
+
+
+def read_tree(root):
+    pages = {}
+    for dirpath, _, files in os.walk(root):
+        for fname in files:
+            path = os.path.join(dirpath, fname)
+            with open(path, encoding="utf-8") as f:
+                pages[os.path.relpath(path, root)] = f.read()
+    return pages
+
+
+class TestRenderPage(unittest.TestCase):
+    def test_render_page(self):
+        tpl = '<title>{{ Title }}</title><link href="/index.css">{{ Content }}'
+        md = "# Hello\n\n![pic](/images/a.png)"
+        page = render_page(md, Template(tpl, "/repo/"))
+        self.assertEqual(
+            page,
+            '<title>Hello</title><link href="/repo/index.css">'
+            '<div><h1>Hello</h1><p><img src="/repo/images/a.png" alt="pic"></img></p></div>',
+        )
+
+    def test_streaming_matches_render_page(self):
+        md = "# Big\n\n" + "\n\n".join(
+            f"Para {i} with [link](/p{i}) and ![img](/i{i}.png)" for i in range(50)
+        ) + "\n\n```\ncode\n\nmore\n```\n"
+        template = Template('<title>{{ Title }}</title><a href="/">{{ Content }}</a>', "/repo/")
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, "big.md")
+            dest = os.path.join(root, "out", "big.html")
+            write(src, md)
+            write_page_streaming(src, dest, template)
+            with open(dest, encoding="utf-8") as f:
+                self.assertEqual(f.read(), render_page(md, template))
+
+
+def worker_settings():
+    return main.STREAM_THRESHOLD, inline_parser()
+
+
+class TestParallelBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.template = os.path.join(root, "template.html")
+        write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(6):
+            write(
+                os.path.join(self.content, f"post{i}", "index.md"),
+                f"# Post {i}\n\nSome **bold** text [home](/)",
+            )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, dest, jobs, io_threads=0, manifest=None):
+        out = StringIO()
+        with redirect_stdout(out):
+            generate_pages_recursive(
+                self.content, self.template, dest, "/", manifest, jobs, None, io_threads
+            )
+        return out.getvalue()
+
+    def test_collect_pages_is_sorted(self):
+        dest = os.path.join(self.tmp.name, "docs")
+        pages = collect_pages(self.content, dest)
+        self.assertEqual(pages, sorted(pages))
+        self.assertEqual(len(pages), 6)
+
+    def test_parallel_matches_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        parallel = os.path.join(self.tmp.name, "parallel")
+        serial_log = self.build(serial, 1)
+        parallel_log = self.build(parallel, 3)
+        self.assertEqual(read_tree(serial), read_tree(parallel))
+        self.assertIn("speedup", parallel_log)
+        # Per-page log lines come out in the same order as a serial build
+        self.assertEqual(
+            [line for line in parallel_log.splitlines() if line.startswith("Generating")],
+            [line.replace(serial, parallel) for line in serial_log.splitlines()],
+        )
+
+    def test_spawned_workers_get_parent_settings(self):
+        template = Template("{{ Content }}")
+        set_inline_parser("chained")
+        try:
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                initializer=main._init_page_worker,
+                initargs=(template, None, {}, {}, 0, 0, inline_parser()),
+            ) as pool:
+                self.assertEqual(pool.submit(worker_settings).result(), (0, "chained"))
+        finally:
+            set_inline_parser("scan")
+
+    def test_pipeline_matches_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        piped = os.path.join(self.tmp.name, "piped")
+        serial_log = self.build(serial, 1)
+        piped_log = self.build(piped, 1, io_threads=3)
+        self.assertEqual(read_tree(serial), read_tree(piped))
+        self.assertEqual(piped_log, serial_log.replace(serial, piped))
+
+    def test_pipeline_small_queue_and_streaming(self):
+        dest = os.path.join(self.tmp.name, "piped")
+        with mock.patch.object(main, "STREAM_THRESHOLD", 0), redirect_stdout(StringIO()):
+            main.generate_pages_async(
+                collect_pages(self.content, dest), self.template, "/", 2, queue_size=1
+            )
+        serial = os.path.join(self.tmp.name, "serial")
+        self.build(serial, 1)
+        self.assertEqual(read_tree(serial), read_tree(dest))
+
+    def test_pipeline_skips_fresh_pages(self):
+        dest = os.path.join(self.tmp.name, "piped")
+        manifest = BuildManifest(os.path.join(self.tmp.name, "manifest.json"))
+        self.build(dest, 1, 2, manifest)
+        self.assertEqual(len(manifest.pages), 6)
+        write(os.path.join(self.content, "post3", "index.md"), "# Changed")
+        log = self.build(dest, 1, 2, manifest)
+        self.assertIn("Generated 1 pages, 5 unchanged", log)
+
+
+class TestSiteBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.template = os.path.join(root, "template.html")
+        write(self.template, '<link href="/index.css"><title>{{ Title }}</title>{{ Content }}')
+        write(os.path.join(root, "content", "index.md"), "# Home\n\n[post](/blog/post)")
+        write(os.path.join(root, "static", "index.css"), "body {}")
+        self.builder = SiteBuilder(
+            os.path.join(root, "content"), os.path.join(root, "static"),
+            os.path.join(root, "docs"), self.template, "/repo/",
+            state_dir=os.path.join(root, ".build"), incremental=True,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_render_pages_in_memory(self):
+        with mock.patch("builtins.open", side_effect=AssertionError), \
+                mock.patch.object(self.builder, "template", return_value=Template(
+                    '<title>{{ Title }}</title>{{ Content }}', "/repo/")):
+            pages = self.builder.render_pages({"blog/post/index.md": "# Post\n\n[home](/)"})
+        self.assertEqual(
+            pages,
+            {"blog/post/index.html": '<title>Post</title><div><h1>Post</h1>'
+                                     '<p><a href="/repo/">home</a></p></div>'},
+        )
+        self.assertEqual(len(self.builder.memory_cache), 1)
+
+    def test_template_compiled_once(self):
+        first = self.builder.template()
+        self.assertIs(self.builder.template(), first)
+        write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        os.utime(self.template, ns=(0, 0))
+        self.assertIsNot(self.builder.template(), first)
+        self.assertEqual(self.builder.render("# T"), "<h1>T</h1><div><h1>T</h1></div>")
+
+    def test_repeated_builds_reuse_state(self):
+        with redirect_stdout(StringIO()) as out:
+            self.builder.build()
+            self.builder.build()
+        self.assertIn("Generated 0 pages, 1 unchanged", out.getvalue())
+        with open(os.path.join(self.tmp.name, "docs", "index.html"), encoding="utf-8") as f:
+            self.assertIn('<a href="/repo/blog/post">', f.read())
+
+    def test_minified_outputs_stay_fresh(self):
+        self.builder.minify = True
+        with redirect_stdout(StringIO()) as out:
+            self.builder.build()
+            self.builder.build()
+        self.assertIn("Generated 0 pages, 1 unchanged", out.getvalue())
+
+    def test_minified_assets_are_not_copied_again(self):
+        write(os.path.join(self.tmp.name, "static", "index.css"), "body {\n  margin: 0;\n}\n")
+        self.builder.minify = True
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        with redirect_stdout(StringIO()) as out:
+            self.builder.build()
+        self.assertIn("0 copied, 1 unchanged", out.getvalue())
+        self.assertIn("Post-processed", out.getvalue())
+        self.assertIn(": 0 processed", out.getvalue())
+        with open(os.path.join(self.tmp.name, "docs", "index.css"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "body{margin:0}")
+
+    def test_optimized_images_are_not_copied_again(self):
+        data, _ = gradient_png(600, 30, _chunk(b"tEXt", b"Comment\0" + b"x" * 200))
+        write(os.path.join(self.tmp.name, "static", "images", "wide.png"), data)
+        self.builder.optimize_images = True
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        with redirect_stdout(StringIO()) as out:
+            self.builder.build()
+        self.assertIn("0 copied, 1 unchanged", out.getvalue())
+        self.assertLess(
+            os.path.getsize(os.path.join(self.tmp.name, "docs", "images", "wide.png")), len(data)
+        )
+
+    def test_fingerprinted_srcset(self):
+        data, _ = gradient_png(600, 30)
+        write(os.path.join(self.tmp.name, "static", "images", "wide.png"), data)
+        write(os.path.join(self.tmp.name, "content", "index.md"), "# Home\n\n![w](/images/wide.png)")
+        self.builder.optimize_images = True
+        self.builder.fingerprint = True
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        with open(os.path.join(self.tmp.name, "docs", "index.html"), encoding="utf-8") as f:
+            self.assertRegex(
+                f.read(),
+                r'srcset="/repo/images/wide-480w\.[0-9a-f]{10}\.png 480w, '
+                r'/repo/images/wide\.[0-9a-f]{10}\.png 600w"',
+            )
+
+    def test_fingerprint_build_then_plain_build(self):
+        self.builder.fingerprint = True
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        self.assertRegex(self.builder.render("# T"), r'href="/repo/index\.[0-9a-f]{10}\.css"')
+        plain = SiteBuilder(template_path=self.template)
+        self.assertIn('href="/index.css"', plain.render("# T"))
+
+    def test_feeds(self):
+        self.builder.feeds = True
+        self.builder.site_url = "https://x.test"
+        with redirect_stdout(StringIO()):
+            self.builder.build()
+        docs = os.path.join(self.tmp.name, "docs")
+        with open(os.path.join(docs, "sitemap.xml"), encoding="utf-8") as f:
+            self.assertIn("<loc>https://x.test/repo/</loc>", f.read())
+        self.assertTrue(os.path.exists(os.path.join(docs, "feed.xml")))
+        self.assertTrue(os.path.exists(os.path.join(docs, "blog", "index.html")))
+
+    def test_search_uses_terms_gathered_while_rendering(self):
+        self.builder.search = True
+        with redirect_stdout(StringIO()) as out, \
+                mock.patch("search.page_terms", side_effect=AssertionError):
+            self.builder.build()
+        self.assertIn("Search index: 1 pages (0 tokenized)", out.getvalue())
+        with open(os.path.join(self.tmp.name, "docs", "search", "ho.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"home": [0, 1]})
+
+    def test_indexes_share_one_walk_of_content(self):
+        self.builder.feeds = self.builder.search = self.builder.check_links = True
+        self.builder.site_url = "https://x.test"
+        with redirect_stdout(StringIO()) as out, \
+                mock.patch("main.source_stats", wraps=main.source_stats) as stats, \
+                mock.patch("siteindex.source_stats", side_effect=AssertionError), \
+                mock.patch("search.source_stats", side_effect=AssertionError):
+            self.builder.build()
+        self.assertEqual(stats.call_count, 1)
+        self.assertIn("Search index: 1 pages", out.getvalue())
+
+    def test_feeds_use_facts_gathered_while_rendering(self):
+        write(os.path.join(self.tmp.name, "content", "blog", "post", "index.md"),
+              "# Post\n\n[< Back](/)\n\nFirst **post**.")
+        self.builder.feeds = True
+        self.builder.minify = True
+        self.builder.site_url = "https://x.test"
+        with redirect_stdout(StringIO()), \
+                mock.patch("siteindex.scan_page", side_effect=AssertionError):
+            self.builder.build()
+        with open(os.path.join(self.tmp.name, "docs", "feed.xml"), encoding="utf-8") as f:
+            self.assertIn("&lt;p&gt;First &lt;b&gt;post&lt;/b&gt;.&lt;/p&gt;", f.read())
+        with redirect_stdout(StringIO()) as out:
+            self.builder.build()
+        self.assertIn("(0 of 3 files changed)", out.getvalue())
+
+
+class TestShardedBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        write(os.path.join(self.root, "template.html"), "<title>{{ Title }}</title>{{ Content }}")
+        write(os.path.join(self.root, "static", "index.css"), "body {}")
+        for i in range(12):
+            write(os.path.join(self.root, "content", f"p{i}", "index.md"), f"# Page {i}\n\nBody")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def builder(self, shard=None, **kwargs):
+        root = self.root
+        return SiteBuilder(
+            os.path.join(root, "content"), os.path.join(root, "static"),
+            os.path.join(root, "docs"), os.path.join(root, "template.html"),
+            state_dir=os.path.join(root, ".build"), shard=shard, **kwargs,
+        )
+
+    def test_shards_partition_pages(self):
+        pages = collect_pages(os.path.join(self.root, "content"), "docs")
+        shares = [shard_pages(pages, os.path.join(self.root, "content"), i, 3) for i in range(3)]
+        self.assertEqual(sorted(sum(shares, [])), pages)
+        self.assertTrue(all(shares))
+        # Adding a page never moves the others
+        write(os.path.join(self.root, "content", "new.md"), "# New")
+        more = collect_pages(os.path.join(self.root, "content"), "docs")
+        for i, share in enumerate(shares):
+            self.assertTrue(set(share) <= set(shard_pages(more, os.path.join(self.root, "content"), i, 3)))
+
+    def test_build_shards_then_merge(self):
+        with redirect_stdout(StringIO()):
+            for i in range(3):
+                self.builder((i, 3)).build()
+            self.builder().merge_shards(3)
+        docs = os.path.join(self.root, "docs")
+        self.assertEqual(len([p for p in read_tree(docs) if p.endswith(".html")]), 12)
+        self.assertTrue(os.path.exists(os.path.join(docs, "index.css")))
+        merged = BuildManifest.load(os.path.join(self.root, ".build", "manifest.json"))
+        self.assertEqual(len(merged.pages), 12)
+        self.assertIsNone(merged.shard)
+
+        # A removed page is only deleted by the merge step
+        os.remove(os.path.join(self.root, "content", "p3", "index.md"))
+        with redirect_stdout(StringIO()):
+            for i in range(3):
+                self.builder((i, 3), incremental=True).build()
+            self.assertTrue(os.path.exists(os.path.join(docs, "p3", "index.html")))
+            self.builder().merge_shards(3)
+        self.assertFalse(os.path.exists(os.path.join(docs, "p3", "index.html")))
+
+    def test_merge_requires_every_shard(self):
+        with redirect_stdout(StringIO()):
+            self.builder((0, 2)).build()
+            with self.assertRaisesRegex(ValueError, "manifest-1-of-2"):
+                self.builder().merge_shards(2)
+
+    def test_shards_as_local_processes(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(main.__file__)), "main.py")
+
+        def run(*args):
+            return subprocess.Popen(
+                [sys.executable, script, *args], cwd=self.root,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+
+        procs = [run("--shard", f"{i}/4") for i in range(4)]
+        for proc in procs:
+            self.assertEqual(proc.wait(), 0, proc.stderr.read())
+            proc.stderr.close()
+        merge = run("--merge-shards", "4")
+        self.assertEqual(merge.wait(), 0, merge.stderr.read())
+        merge.stderr.close()
+        pages = [p for p in read_tree(os.path.join(self.root, "docs")) if p.endswith(".html")]
+        self.assertEqual(len(pages), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
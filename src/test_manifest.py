@@ -0,0 +1,181 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from fixtures import write
+from manifest import BuildManifest, image_dependencies, scan_urls
+from main import generate_pages_recursive
+from rendercache import RenderCache
+
+
+class TestIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.docs = os.path.join(root, "docs")
+        self.template = os.path.join(root, "template.html")
+        self.static = os.path.join(root, "static")
+        self.manifest_path = os.path.join(root, ".build", "manifest.json")
+        write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        write(os.path.join(self.content, "index.md"), "# Home\n\nWelcome")
+        write(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nBody")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, basepath="/", explain=False, cache=None):
+        manifest = BuildManifest.load(self.manifest_path, self.static, explain)
+        out = StringIO()
+        with redirect_stdout(out):
+            generate_pages_recursive(
+                self.content, self.template, self.docs, basepath, manifest, cache=cache
+            )
+        manifest.save()
+        return out.getvalue()
+
+    def test_unchanged_pages_are_skipped(self):
+        self.assertIn("Generated 2 pages, 0 unchanged", self.build())
+        self.assertIn("Generated 0 pages, 2 unchanged", self.build())
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        write(os.path.join(self.content, "index.md"), "# Home\n\nChanged")
+        log = self.build()
+        self.assertIn("Generated 1 pages, 1 unchanged", log)
+        with open(os.path.join(self.docs, "index.html"), encoding="utf-8") as f:
+            self.assertIn("Changed", f.read())
+
+    def test_template_or_basepath_change_rebuilds_all(self):
+        self.build()
+        write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertIn("Generated 2 pages, 0 unchanged", self.build())
+        self.assertIn("Generated 2 pages, 0 unchanged", self.build("/repo/"))
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        log = self.build()
+        self.assertIn("Removing stale page", log)
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog")))
+        self.assertTrue(os.path.exists(os.path.join(self.docs, "index.html")))
+
+    def test_partial_change_resplices_without_reparsing(self):
+        write(self.template, "{{> nav }}{{ Content }}")
+        write(os.path.join(self.tmp.name, "partials", "nav.md"), "[Home](/)")
+        cache = RenderCache(os.path.join(self.tmp.name, ".build", "cache"))
+        self.build(cache=cache)
+        self.assertIn("Generated 0 pages, 2 unchanged", self.build(cache=cache))
+        write(os.path.join(self.tmp.name, "partials", "nav.md"), "[Start](/)")
+        with mock.patch("main.markdown_to_html_node", side_effect=AssertionError):
+            log = self.build(explain=True, cache=cache)
+        self.assertIn("Generated 2 pages, 0 unchanged", log)
+        self.assertIn("partials/nav.md changed", log)
+        with open(os.path.join(self.docs, "index.html"), encoding="utf-8") as f:
+            self.assertIn('<a href="/">Start</a>', f.read())
+
+    def test_missing_output_is_rebuilt(self):
+        self.build()
+        os.remove(os.path.join(self.docs, "index.html"))
+        self.assertIn("Generated 1 pages, 1 unchanged", self.build())
+
+    def test_output_overwritten_by_plain_build_is_rebuilt(self):
+        self.build("/repo/")
+        with redirect_stdout(StringIO()):
+            generate_pages_recursive(self.content, self.template, self.docs, "/")
+        log = self.build("/repo/", explain=True)
+        self.assertIn("Generated 2 pages, 0 unchanged", log)
+        self.assertIn("output was overwritten", log)
+
+    def test_corrupt_manifest_forces_full_build(self):
+        write(self.manifest_path, "not json")
+        self.assertIn("Generated 2 pages, 0 unchanged", self.build())
+
+    def test_image_change_rebuilds_only_pages_embedding_it(self):
+        write(os.path.join(self.static, "images", "a.png"), "one")
+        write(os.path.join(self.content, "blog", "post", "index.md"),
+              "# Post\n\n![a](/images/a.png)")
+        self.build()
+        write(os.path.join(self.static, "images", "a.png"), "two")
+        log = self.build(explain=True)
+        self.assertIn("Generated 1 pages, 1 unchanged", log)
+        self.assertIn(os.path.join(self.static, "images", "a.png") + " changed", log)
+        self.assertNotIn(os.path.join(self.docs, "index.html"), log)
+
+    def test_missing_image_added_later_rebuilds(self):
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![x](/images/x.png)")
+        self.build()
+        write(os.path.join(self.static, "images", "x.png"), "new")
+        log = self.build(explain=True)
+        self.assertIn("images/x.png added", log)
+        self.assertIn("Generated 1 pages, 1 unchanged", log)
+
+    def test_explain_reasons(self):
+        log = self.build(explain=True)
+        self.assertIn(f"Rebuilding {os.path.join(self.docs, 'index.html')}: new page", log)
+        write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertIn(f"{self.template} changed", self.build(explain=True))
+        self.assertIn("basepath changed to /repo/", self.build("/repo/", explain=True))
+
+
+class TestMergeShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def shard(self, index, count, pages):
+        name = f"shard-{len(os.listdir(self.tmp.name))}.json"
+        manifest = BuildManifest(os.path.join(self.tmp.name, name))
+        manifest.shard = (index, count)
+        manifest.pages = {src: {"output": out} for src, out in pages.items()}
+        manifest.save()
+        return manifest.path
+
+    def test_merge(self):
+        paths = [self.shard(0, 2, {"a.md": "a.html"}), self.shard(1, 2, {"b.md": "b.html"})]
+        merged = BuildManifest.merge(paths, os.path.join(self.tmp.name, "manifest.json"))
+        self.assertEqual(sorted(merged.pages), ["a.md", "b.md"])
+
+    def test_conflicts_are_all_reported(self):
+        paths = [
+            self.shard(0, 3, {"a.md": "a.html", "x/index.md": "x.html"}),
+            self.shard(1, 3, {"a.md": "a.html", "x.md": "x.html"}),
+            self.shard(0, 3, {}),
+        ]
+        with self.assertRaises(ValueError) as ctx:
+            BuildManifest.merge(paths, os.path.join(self.tmp.name, "manifest.json"))
+        problems = str(ctx.exception).splitlines()
+        self.assertEqual(len(problems), 3)
+        self.assertIn("a.md was built by more than one shard", problems)
+        self.assertIn("output collision: x.html is written by x/index.md and x.md", problems)
+        self.assertIn("is not shard 2/3", problems[2])
+
+
+class TestImageDependencies(unittest.TestCase):
+    def test_site_absolute_images_only(self):
+        md = ("![a](/images/a.png) ![b](https://x.test/b.png) ![c](rel.png) "
+              "![d](/images/a.png?v=2) ![e](/img/e.jpg#top)")
+        self.assertEqual(
+            image_dependencies(md, "static"),
+            [os.path.join("static", "images", "a.png"), os.path.join("static", "img", "e.jpg")],
+        )
+
+    def test_scan_urls_reads_lines_lazily(self):
+        consumed = []
+
+        def lines():
+            for line in ["![a](/a.png)\n", "\n", "[b](/b/) [c](https://x.test/)\n", "\n", "end\n"]:
+                consumed.append(line)
+                yield line
+
+        self.assertEqual(scan_urls(lines()), (["/a.png"], ["/b/"]))
+        self.assertEqual(len(consumed), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,5 @@
+import random
+import tracemalloc
 import unittest
 
 from textnode import TextNode, TextType
@@ -8,11 +10,21 @@ from markdown_utils import (
     split_nodes_image,
     split_nodes_link,
     text_to_textnodes,
+    scan_textnodes,
+    set_inline_parser,
     markdown_to_blocks,
+    iter_markdown_blocks,
+    extract_title_from_lines,
+    Block,
+    BlockInfo,
     BlockType,
     block_to_block_type,
+    parse_block,
     markdown_to_html_node,
+    set_fragment_cache,
 )
+from htmlnode import set_image_hints
+from rendercache import FragmentCache
 
 
 class TestSplitNodesDelimiter(unittest.TestCase):
@@ -140,6 +152,54 @@ class TestTextToTextNodes(unittest.TestCase):
         ]
         self.assertEqual(result, expected)
 
+class TestScanTextNodes(unittest.TestCase):
+    """Differential tests: the single-pass scanner must match the chained passes."""
+
+    CASES = [
+        "",
+        "plain text only",
+        "This is **text** with an _italic_ word and a `code block`"
+        " and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg)"
+        " and a [link](https://boot.dev)",
+        "![img](a.png)[link](b)",
+        "[a ![b](c)](d)",
+        "!![x](y) and ![](empty-alt)",
+        "unbalanced `code and **bold",
+        "`code with **bold** inside` then _it_",
+        "**_nested_** and _**other**_",
+        "[link with `code`](url) [x](y)[z](w)",
+        "snake_case_name and __dunder__",
+        "trailing delimiter **",
+    ]
+
+    TOKENS = [
+        "a", " ", "`", "**", "*", "_", "!", "[", "]", "(", ")",
+        "![alt](/img.png)", "[text](/url)", "word", "\n",
+    ]
+
+    def test_cases(self):
+        for text in self.CASES:
+            with self.subTest(text=text):
+                self.assertEqual(scan_textnodes(text), text_to_textnodes(text))
+
+    def test_random_markup(self):
+        rng = random.Random(1234)
+        for _ in range(2000):
+            text = "".join(rng.choice(self.TOKENS) for _ in range(rng.randint(0, 20)))
+            with self.subTest(text=text):
+                self.assertEqual(scan_textnodes(text), text_to_textnodes(text))
+
+    def test_select_parser(self):
+        md = "Some **bold** and [a link](/x) here"
+        set_inline_parser("chained")
+        try:
+            chained = markdown_to_html_node(md).to_html()
+        finally:
+            set_inline_parser("scan")
+        self.assertEqual(markdown_to_html_node(md).to_html(), chained)
+        with self.assertRaises(ValueError):
+            set_inline_parser("bogus")
+
 class TestMarkdownToBlocks(unittest.TestCase):
     def test_markdown_to_blocks(self):
         md = """
@@ -161,6 +221,43 @@ This is the same paragraph on a new line
             ],
         )
 
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "# T\n\n```\nfirst\n\nsecond\n```\n\nafter"
+        self.assertEqual(
+            markdown_to_blocks(md),
+            ["# T", "```\nfirst\n\nsecond\n```", "after"],
+        )
+        html = markdown_to_html_node(md).to_html()
+        self.assertIn("<pre><code>first\n\nsecond\n</code></pre><p>after</p>", html)
+
+    def test_inline_fence_line_does_not_open_fence(self):
+        md = "```code```\n\nnext"
+        self.assertEqual(markdown_to_blocks(md), ["```code```", "next"])
+
+
+class TestIterMarkdownBlocks(unittest.TestCase):
+    def test_matches_markdown_to_blocks(self):
+        md = "\n  para one\nline\n\n\n\n- a\n- b\n \nstill list\n\n  \n\nlast  \n"
+        lines = (line + "\n" for line in md.split("\n"))
+        self.assertEqual(list(iter_markdown_blocks(lines)), markdown_to_blocks(md))
+
+    def test_is_lazy(self):
+        def lines():
+            yield "# Title\n"
+            yield "\n"
+            raise AssertionError("read past the first block")
+
+        self.assertEqual(next(iter_markdown_blocks(lines())), "# Title")
+
+    def test_extract_title_from_lines_stops_early(self):
+        def lines():
+            yield "intro\n"
+            yield "# Title \n"
+            raise AssertionError("read past the title")
+
+        self.assertEqual(extract_title_from_lines(lines()), "Title")
+
+
 class TestBlockType(unittest.TestCase):
     def test_heading(self):
         block = "## Heading level 2"
@@ -187,6 +284,33 @@ class TestBlockType(unittest.TestCase):
         self.assertEqual(block_to_block_type(block), BlockType.PARAGRAPH)
 
 
+class TestParseBlock(unittest.TestCase):
+    def test_heading(self):
+        self.assertEqual(parse_block("### Title **x**"), Block(BlockType.HEADING, "Title **x**", 3))
+
+    def test_code(self):
+        self.assertEqual(
+            parse_block("```\n    a\n      b\n```"),
+            Block(BlockType.CODE, "a\n  b\n"),
+        )
+
+    def test_quote(self):
+        self.assertEqual(parse_block("> one \n> two"), Block(BlockType.QUOTE, "one\ntwo"))
+
+    def test_lists(self):
+        self.assertEqual(
+            parse_block("- a\n- b"), Block(BlockType.UNORDERED_LIST, ["a", "b"])
+        )
+        self.assertEqual(
+            parse_block("1. a\n2.  b"), Block(BlockType.ORDERED_LIST, ["a", "b"])
+        )
+
+    def test_misnumbered_list_is_paragraph(self):
+        self.assertEqual(
+            parse_block("1. a\n3. b"), Block(BlockType.PARAGRAPH, "1. a 3. b")
+        )
+
+
 class TestMarkdownToHtmlNode(unittest.TestCase):
     def test_paragraphs(self):
         md = """
@@ -220,6 +344,58 @@ class TestMarkdownToHtmlNode(unittest.TestCase):
             "<div><pre><code>This is text that _should_ remain\nthe **same** even with inline stuff\n</code></pre></div>",
         )
 
+class TestFragmentCache(unittest.TestCase):
+    def tearDown(self):
+        set_fragment_cache(None)
+        set_image_hints({})
+
+    def test_cached_render_matches_uncached(self):
+        md = "# T\n\n- same **item**\n\nsame para\n\n- same **item**\n\nsame para\n\n```\ncode\n```"
+        expected = markdown_to_html_node(md).to_html()
+        cache = FragmentCache()
+        set_fragment_cache(cache)
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (8, 4))
+        self.assertIn("8 hits, 4 misses (67% hit rate), 4 fragments", cache.stats())
+
+    def test_image_hints_are_part_of_the_key(self):
+        set_fragment_cache(FragmentCache())
+        md = "![a](/a.png)"
+        markdown_to_html_node(md)
+        set_image_hints({"/a.png": {"width": "3", "height": "2"}})
+        self.assertIn('width="3"', markdown_to_html_node(md).to_html())
+
+    def test_memory_budget_evicts_least_recently_used(self):
+        cache = FragmentCache()
+        cache.put("a", "<p>a</p>")
+        cache.max_bytes = cache.size * 2
+        cache.put("b", "<p>b</p>")
+        cache.get("a")
+        cache.put("c", "<p>c</p>")
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "<p>a</p>")
+
+    def test_memory_budget_counts_block_facts(self):
+        cache = FragmentCache(500_000)
+        tracemalloc.start()
+        try:
+            for i in range(1000):
+                terms = {f"word{i}x{j}": 1 for j in range(40)}
+                links = tuple(f"/p/{i}/{j}" for j in range(40))
+                block = " ".join(terms)
+                cache.put(block, f"<p>{block}</p>", BlockInfo(links, (), True, terms))
+            del terms, links, block
+            retained, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        self.assertLess(retained, cache.max_bytes * 1.25)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,77 @@
+import gzip
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+from fixtures import read, write
+from postprocess import minify_css, minify_html, postprocess_directory
+
+
+class TestMinify(unittest.TestCase):
+    def test_html_keeps_pre_and_tags(self):
+        html = (
+            "<html>\n    <body>\n      <p>a   b\n   c</p>\n"
+            "<pre><code>x\n    y  z</code></pre>  <img alt=\"a  b\">\n</body>\n</html>\n"
+        )
+        self.assertEqual(
+            minify_html(html),
+            "<html>\n<body>\n<p>a b\nc</p>\n"
+            "<pre><code>x\n    y  z</code></pre> <img alt=\"a  b\">\n</body>\n</html>\n",
+        )
+
+    def test_html_keeps_script(self):
+        html = "<script>var s = 'a    b';</script>"
+        self.assertEqual(minify_html(html), html + "\n")
+
+    def test_css(self):
+        css = (
+            "/* header */\nbody {\n  color: #fff;\n  font-family: \"A  B\", serif;\n}\n"
+            "a :hover > b,\ni { content: \"/* not a comment */\"; }\n"
+        )
+        self.assertEqual(
+            minify_css(css),
+            'body{color:#fff;font-family:"A  B",serif}'
+            'a :hover>b,i{content:"/* not a comment */"}',
+        )
+
+
+class TestPostprocessDirectory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.docs = os.path.join(self.tmp.name, "docs")
+        self.state = os.path.join(self.tmp.name, ".build", "postprocess.json")
+        write(os.path.join(self.docs, "index.html"), "<p>\n    " + "hello world " * 50 + "</p>\n")
+        write(os.path.join(self.docs, "blog", "index.html"), "<p>   post   </p>" * 40)
+        write(os.path.join(self.docs, "index.css"), "body {\n  margin: 0;\n}\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_post(self):
+        with redirect_stdout(StringIO()):
+            return postprocess_directory(self.docs, self.state, workers=2)
+
+    def test_minifies_and_writes_sidecars(self):
+        self.assertEqual(self.run_post(), {"processed": 3, "unchanged": 0, "removed": 0})
+        index = os.path.join(self.docs, "index.html")
+        self.assertTrue(read(index).startswith("<p>\nhello world"))
+        with gzip.open(index + ".gz", "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read(), read(index))
+        self.assertEqual(read(os.path.join(self.docs, "index.css")), "body{margin:0}")
+        # Compressing a 14-byte file would only make it larger
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "index.css.gz")))
+
+    def test_skips_unchanged_and_removes_stale_sidecars(self):
+        self.run_post()
+        self.assertEqual(self.run_post(), {"processed": 0, "unchanged": 3, "removed": 0})
+        write(os.path.join(self.docs, "index.html"), "<p>changed</p>")
+        os.remove(os.path.join(self.docs, "blog", "index.html"))
+        counts = self.run_post()
+        self.assertEqual(counts, {"processed": 1, "unchanged": 1, "removed": 1})
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "blog", "index.html.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
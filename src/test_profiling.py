@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+import main
+import markdown_utils
+from fixtures import write
+from htmlnode import ParentNode
+from profiling import BuildProfiler
+
+
+class TestBuildProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.docs = os.path.join(root, "docs")
+        self.template = os.path.join(root, "template.html")
+        write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n- a **b**\n- c")
+        write(os.path.join(self.content, "big", "index.md"),
+              "# Big\n\n" + "\n\n".join("para _x_ `y`" for _ in range(200)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_build(self, profiler):
+        profiler.instrument(main)
+        profiler.start()
+        try:
+            with redirect_stdout(StringIO()):
+                main.generate_pages_recursive(self.content, self.template, self.docs)
+        finally:
+            profiler.stop()
+            profiler.restore()
+
+    def test_records_stages_and_pages(self):
+        profiler = BuildProfiler()
+        self.run_build(profiler)
+        for stage in ("read", "markdown_to_blocks", "parse_block",
+                      "inline_parse", "block_parse", "to_html", "template_fill", "write"):
+            self.assertIn(stage, profiler.stage_calls)
+        self.assertEqual(profiler.stage_calls["read"], 2)
+        self.assertEqual(profiler.stage_calls["to_html"], 2)
+        slowest = profiler.slowest_pages(1)
+        self.assertEqual(slowest[0][0], os.path.join(self.content, "big", "index.md"))
+        self.assertIn("Slowest 1 pages:", profiler.report(1))
+        with open(os.path.join(self.docs, "index.html"), encoding="utf-8") as f:
+            self.assertIn("<li>a <b>b</b></li>", f.read())
+
+    def test_restore_unpatches(self):
+        originals = (main.generate_page, main.write_page, ParentNode.render_to,
+                     markdown_utils._inline_parser)
+        self.run_build(BuildProfiler(track_allocations=False))
+        self.assertEqual(
+            (main.generate_page, main.write_page, ParentNode.render_to,
+             markdown_utils._inline_parser),
+            originals,
+        )
+
+    def test_dump_json(self):
+        profiler = BuildProfiler(track_allocations=False)
+        self.run_build(profiler)
+        out = os.path.join(self.tmp.name, "profile.json")
+        profiler.dump(out)
+        with open(out, encoding="utf-8") as f:
+            data = json.load(f)
+        self.assertEqual(len(data["pages"]), 2)
+        self.assertIn("inline_parse", data["stages"])
+
+
+if __name__ == "__main__":
+    unittest.main()
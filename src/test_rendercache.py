@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import main
+from main import render_page
+from markdown_utils import PageInfo
+from rendercache import RenderCache
+from template import Template
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_miss_then_hit(self):
+        self.assertIsNone(self.cache.get("# T\n\nbody"))
+        self.cache.put("# T\n\nbody", "T", "<div><p>body</p></div>")
+        self.assertEqual(self.cache.get("# T\n\nbody"), ("T", "<div><p>body</p></div>", None))
+        self.assertIsNone(self.cache.get("# T\n\nother"))
+
+    def test_page_info_is_cached_with_the_content(self):
+        md = "# T\n\n[home](/) Hello"
+        template = Template("{{ Content }}")
+        first = PageInfo()
+        render_page(md, template, self.cache, first)
+        second = PageInfo()
+        with mock.patch("main.markdown_to_html_node", side_effect=AssertionError):
+            render_page(md, template, self.cache, second)
+        self.assertEqual(second.to_dict(), first.to_dict())
+        self.assertEqual(first.to_dict()["summary"], '<p><a href="/">home</a> Hello</p>')
+
+    def test_key_depends_on_parser_version(self):
+        key = self.cache.key("# T")
+        with mock.patch("rendercache.PARSER_VERSION", "next"):
+            self.assertNotEqual(self.cache.key("# T"), key)
+
+    def test_entry_from_older_parser_is_not_reused(self):
+        md = "# T\n\n```\na\n\nb\n```"
+        # Parser version 1 split fenced code at blank lines
+        with mock.patch("rendercache.PARSER_VERSION", "1"):
+            stale = "<div><h1>T</h1><p><code></code><code> a</code></p><p>b</p></div>"
+            self.cache.put(md, "T", stale)
+        self.assertIsNone(self.cache.get(md))
+        template = Template("{{ Content }}")
+        self.assertEqual(
+            render_page(md, template, self.cache),
+            "<div><h1>T</h1><pre><code>a\n\nb\n</code></pre></div>",
+        )
+
+    def test_evict_least_recently_used(self):
+        self.cache.max_bytes = 1
+        self.cache.put("a", "A", "x" * 100)
+        old = self.cache._path(self.cache.key("a"))
+        os.utime(old, (time.time() - 60, time.time() - 60))
+        self.cache.put("b", "B", "y" * 100)
+        entry_size = os.path.getsize(self.cache._path(self.cache.key("b")))
+        self.cache.max_bytes = entry_size
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertIsNone(self.cache.get("a"))
+        self.assertIsNotNone(self.cache.get("b"))
+
+    def test_clear(self):
+        self.cache.put("a", "A", "x")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_hit_skips_parsing(self):
+        md = "# Title\n\nSome **bold** [link](/x)"
+        template = Template("<title>{{ Title }}</title>{{ Content }}", "/repo/")
+        first = render_page(md, template, self.cache)
+        with mock.patch.object(main, "markdown_to_html_node", side_effect=AssertionError):
+            self.assertEqual(render_page(md, template, self.cache), first)
+        self.assertEqual(first, render_page(md, template))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from fixtures import touch
+from search import SearchIndex, build_search_index, page_terms, shard_name
+from textnode import TextNode, TextType
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TestTerms(unittest.TestCase):
+    def test_page_terms_from_text_nodes(self):
+        md = (
+            "# The Ring\n\n[Back home](/index) and **the ring**\n\n"
+            "![ring image](/ring.png)\n\n```\nignored code\n```\n\n- a list item"
+        )
+        self.assertEqual(
+            page_terms(md),
+            {"the": 2, "ring": 3, "back": 1, "home": 1, "and": 1, "image": 1, "list": 1, "item": 1},
+        )
+
+    def test_page_terms_use_the_active_inline_parser(self):
+        def parser(text):
+            return [TextNode("parsed " + text, TextType.PLAIN)]
+
+        with mock.patch("markdown_utils._inline_parser", parser):
+            self.assertEqual(page_terms("**bold**"), {"parsed": 1, "bold": 1})
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name("tolkien"), "to")
+        self.assertEqual(shard_name("élan"), "_e9l")
+        self.assertEqual(shard_name("x"), "x")
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.docs = os.path.join(root, "docs")
+        self.state = os.path.join(root, ".build", "search.json")
+        touch(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the shire")
+        touch(os.path.join(self.content, "blog", "tom", "index.md"),
+              "# Tom\n\nTom sings in the shire")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self):
+        with redirect_stdout(StringIO()):
+            return build_search_index(self.content, self.docs, self.state, "/repo/")
+
+    def search_file(self, name):
+        return load(os.path.join(self.docs, "search", name))
+
+    def test_documents_and_postings(self):
+        self.build()
+        self.assertEqual(
+            self.search_file("index.json"),
+            {"prefix_length": 2, "docs": [["/repo/", "Home"], ["/repo/blog/tom/", "Tom"]]},
+        )
+        self.assertEqual(self.search_file("sh.json"), {"shire": [0, 1, 1, 1]})
+        self.assertEqual(self.search_file("to.json"), {"to": [0, 1], "tom": [1, 2]})
+
+    def test_only_changed_shards_are_rewritten(self):
+        self.build()
+        self.assertEqual(self.build(), [])
+        touch(os.path.join(self.content, "index.md"), "# Home\n\nWelcome to the valley")
+        with mock.patch("search.page_terms", wraps=page_terms) as tokenized:
+            changed = self.build()
+        self.assertEqual(tokenized.call_count, 1)
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in changed), ["sh.json", "va.json"]
+        )
+        self.assertEqual(self.search_file("sh.json"), {"shire": [1, 1]})
+
+    def test_removed_page_frees_its_id_and_shards(self):
+        self.build()
+        os.remove(os.path.join(self.content, "index.md"))
+        self.build()
+        self.assertEqual(self.search_file("index.json")["docs"], [None, ["/repo/blog/tom/", "Tom"]])
+        self.assertFalse(os.path.exists(os.path.join(self.docs, "search", "we.json")))
+        touch(os.path.join(self.content, "about.md"), "# About")
+        self.build()
+        self.assertEqual(self.search_file("index.json")["docs"][0], ["/repo/about.html", "About"])
+
+    def test_missing_output_shards_are_restored(self):
+        self.build()
+        os.remove(os.path.join(self.docs, "search", "to.json"))
+        index = SearchIndex.load(self.state)
+        index.update(self.content)
+        self.assertEqual(
+            index.write(self.docs, "/repo/"), [os.path.join(self.docs, "search", "to.json")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from fixtures import write
+from main import check_links
+from siteindex import SiteIndex, scan_page, template_references
+
+
+class TestScanPage(unittest.TestCase):
+    def test_collects_title_links_and_images(self):
+        md = "# Home\n\n[a](/a) ![i](/i.png)\n\n```\n[not](/code)\n```\n\n- [b](https://x.test)"
+        self.assertEqual(
+            scan_page(md),
+            {"title": "Home", "summary": None, "links": ["/a", "https://x.test"],
+             "images": ["/i.png"]},
+        )
+
+    def test_summary_skips_link_only_paragraphs(self):
+        md = "# Post\n\n[< Back](/)\n\n![i](/i.png)\n\n> quote\n\nFirst  **real**\ntext.\n\nMore."
+        self.assertEqual(scan_page(md)["summary"], "<p>First <b>real</b> text.</p>")
+
+    def test_missing_title(self):
+        self.assertIsNone(scan_page("no title")["title"])
+
+    def test_template_references(self):
+        source = '<link href="/index.css" /><a href="https://x.test"></a><script src="/a.js">'
+        self.assertEqual(template_references(source), ["/index.css", "/a.js"])
+
+
+class TestSiteIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.index_path = os.path.join(root, ".build", "siteindex.json")
+        write(os.path.join(self.content, "index.md"),
+              "# Home\n\n[post](/blog/post) [gone](/missing) ![p](/images/p.png?v=1)")
+        write(os.path.join(self.content, "blog", "post", "index.md"),
+              "# Post\n\n[home](/) [self](/blog/post/#top)")
+        write(os.path.join(self.static, "images", "p.png"), "png")
+        write(os.path.join(self.static, "images", "unused.png"), "png")
+        write(os.path.join(self.static, "index.css"), "css")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_check_reports_broken_links_and_orphans(self):
+        index = SiteIndex()
+        self.assertEqual(index.update(self.content), 2)
+        report = index.check(self.static, ["/index.css"])
+        self.assertEqual(report.broken, [(os.path.join(self.content, "index.md"), "/missing")])
+        self.assertEqual(report.orphans, [os.path.join(self.static, "images", "unused.png")])
+
+    def test_update_is_incremental_and_persisted(self):
+        index = SiteIndex(self.index_path)
+        index.update(self.content)
+        index.save()
+        index = SiteIndex.load(self.index_path)
+        with mock.patch("siteindex.scan_page", side_effect=AssertionError):
+            self.assertEqual(index.update(self.content), 0)
+        write(os.path.join(self.content, "blog", "post", "index.md"), "# Renamed")
+        self.assertEqual(index.update(self.content), 1)
+        os.remove(os.path.join(self.content, "index.md"))
+        index.update(self.content)
+        self.assertEqual(
+            [entry["title"] for entry in index.pages.values()], ["Renamed"]
+        )
+
+    def test_check_links_summary(self):
+        template = os.path.join(self.tmp.name, "template.html")
+        write(template, '<link href="/index.css" />{{ Content }}')
+        out = StringIO()
+        with redirect_stdout(out):
+            broken = check_links(self.content, self.static, template, self.index_path)
+        self.assertEqual(broken, 1)
+        self.assertIn("Broken link in", out.getvalue())
+        self.assertIn("2 pages (2 rescanned): 1 broken links, 1 orphaned assets", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
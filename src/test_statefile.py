@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from fixtures import write
+from statefile import is_fresh, source_stats, write_json
+
+
+class TestWriteJson(unittest.TestCase):
+    def test_creates_parents_and_leaves_no_temp_file(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, ".build", "state.json")
+            write_json(path, {"b": 1, "a": [2]}, sort_keys=True)
+            write_json(path, {"a": 3})
+            with open(path, encoding="utf-8") as f:
+                self.assertEqual(json.load(f), {"a": 3})
+            self.assertEqual(os.listdir(os.path.dirname(path)), ["state.json"])
+
+
+class TestSourceStats(unittest.TestCase):
+    def test_markdown_sources_in_walk_order(self):
+        with tempfile.TemporaryDirectory() as root:
+            for rel in ("b.md", "a/z.MD", "a/notes.txt", "c/index.md"):
+                write(os.path.join(root, rel), "# T")
+            sources = source_stats(root)
+            self.assertEqual(
+                [os.path.relpath(path, root) for path, _ in sources],
+                ["b.md", os.path.join("a", "z.MD"), os.path.join("c", "index.md")],
+            )
+            path, st = sources[0]
+            self.assertEqual(st.st_size, os.stat(path).st_size)
+
+    def test_is_fresh(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, "a.md")
+            write(path, "# T")
+            st = os.stat(path)
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self.assertTrue(is_fresh(entry, st))
+            self.assertFalse(is_fresh(None, st))
+            self.assertFalse(is_fresh(dict(entry, size=0), st))
+
+
+if __name__ == "__main__":
+    unittest.main()
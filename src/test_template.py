@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+
+from template import (
+    Template,
+    asset_url,
+    needs_rewrite,
+    partial_paths,
+    rewrite_basepath,
+    set_asset_map,
+)
+
+
+class TestRewriteBasepath(unittest.TestCase):
+    def test_rewrite(self):
+        text = '<a href="/x">x</a><img src="/y.png"><a href="https://z">z</a>'
+        self.assertEqual(
+            rewrite_basepath(text, "/repo/"),
+            '<a href="/repo/x">x</a><img src="/repo/y.png"><a href="https://z">z</a>',
+        )
+
+    def test_rewrite_srcset(self):
+        text = '<img src="/a.png" srcset="/a-480w.png 480w, /a.png 900w">'
+        self.assertEqual(
+            rewrite_basepath(text, "/repo/"),
+            '<img src="/repo/a.png" srcset="/repo/a-480w.png 480w, /repo/a.png 900w">',
+        )
+
+    def test_asset_map_rewritten_in_same_pass(self):
+        set_asset_map({"/a.css": "/a.1234.css", "/i.png": "/i.5678.png"})
+        try:
+            self.assertTrue(needs_rewrite("/"))
+            self.assertEqual(asset_url("/a.css?v=1#x"), "/a.1234.css?v=1#x")
+            text = ('<link href="/a.css"><img src="/i.png" srcset="/i-480w.png 480w, /i.png 900w">'
+                    '<a href="/other">o</a><a href="https://x/a.css">x</a>')
+            self.assertEqual(
+                rewrite_basepath(text, "/repo/"),
+                '<link href="/repo/a.1234.css"><img src="/repo/i.5678.png" '
+                'srcset="/repo/i-480w.png 480w, /repo/i.5678.png 900w">'
+                '<a href="/repo/other">o</a><a href="https://x/a.css">x</a>',
+            )
+            tpl = Template('<link href="/a.css">{{ Content }}')
+            self.assertEqual(tpl.segments[0], '<link href="/a.1234.css">')
+        finally:
+            set_asset_map({})
+        self.assertFalse(needs_rewrite("/"))
+
+    def test_root_basepath_is_identity(self):
+        text = '<a href="/x">x</a>'
+        self.assertEqual(rewrite_basepath(text, "/"), text)
+
+
+class TestTemplate(unittest.TestCase):
+    def test_compile_segments_and_slots(self):
+        tpl = Template("<title>{{ Title }}</title><main>{{Content}}</main>")
+        self.assertEqual(tpl.slots, ["Title", "Content"])
+        self.assertEqual(tpl.segments, ["<title>", "</title><main>", "</main>"])
+
+    def test_render(self):
+        tpl = Template("{{ Title }}|{{ Date }}|{{ Content }}")
+        self.assertEqual(
+            tpl.render({"Title": "T", "Date": "2024-01-01", "Content": "C"}),
+            "T|2024-01-01|C",
+        )
+
+    def test_missing_slot_renders_empty(self):
+        tpl = Template("<nav>{{ Nav }}</nav>{{ Content }}")
+        self.assertEqual(tpl.render({"Content": "C"}), "<nav></nav>C")
+
+    def test_basepath_applied_to_template_once(self):
+        tpl = Template('<link href="/index.css">{{ Content }}', "/repo/")
+        # Slot values are inserted verbatim; only the template is rewritten
+        self.assertEqual(
+            tpl.render({"Content": '<a href="/x">'}),
+            '<link href="/repo/index.css"><a href="/x">',
+        )
+
+    def test_render_to_streams_callable_values(self):
+        tpl = Template("<p>{{ Content }}</p>")
+        chunks = []
+
+        def content(write):
+            write("a")
+            write("b")
+
+        tpl.render_to(chunks.append, {"Content": content})
+        self.assertEqual(chunks, ["<p>", "a", "b", "</p>"])
+
+
+class TestPartials(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.partials = os.path.join(self.tmp.name, "partials")
+        os.makedirs(self.partials)
+        self.write("template.html", "{{> nav }}<main>{{ Content }}</main>{{>footer}}")
+        self.write("partials/nav.md", "[Home](/) and [Blog](/blog)")
+        self.write("partials/footer.html", '<footer><img src="/logo.png"></footer>\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel, text):
+        with open(os.path.join(self.tmp.name, rel), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def test_partials_spliced_into_segments(self):
+        tpl = Template.load(self.template, "/repo/")
+        self.assertEqual(tpl.slots, ["Content"])
+        self.assertEqual(
+            tpl.segments,
+            [
+                '<div><p><a href="/repo/">Home</a> and <a href="/repo/blog">Blog</a></p></div><main>',
+                '</main><footer><img src="/repo/logo.png"></footer>',
+            ],
+        )
+        self.assertEqual(
+            tpl.includes,
+            [os.path.join(self.partials, "footer.html"), os.path.join(self.partials, "nav.md")],
+        )
+        # The spliced source keeps the URLs as written
+        self.assertIn('<a href="/blog">', tpl.source)
+
+    def test_partial_paths_without_rendering(self):
+        with open(self.template, encoding="utf-8") as f:
+            source = f.read()
+        self.assertEqual(
+            partial_paths(source, self.partials),
+            [os.path.join(self.partials, "footer.html"), os.path.join(self.partials, "nav.md")],
+        )
+
+    def test_unknown_partial(self):
+        self.write("template.html", "{{> missing }}{{ Content }}")
+        with self.assertRaises(ValueError):
+            Template.load(self.template)
+        with self.assertRaises(ValueError):
+            Template("{{> nav }}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,6 +34,12 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("link text", TextType.LINK, "http://b.com")
         self.assertNotEqual(node1, node2)
 
+    def test_no_instance_dict(self):
+        node = TextNode("abc", TextType.PLAIN)
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.extra = 1
+
     def test_repr(self):
         # repr should return the exact string format
         node = TextNode("abc", TextType.ITALIC)
@@ -12,6 +12,9 @@ class TextType(Enum):
     QUOTE = "quote"
 
 class TextNode:
+    # Pages produce many of these; slots avoid a per-instance __dict__
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text: str, text_type: TextType, url: str = None):
         self.text = text
         self.text_type = text_type